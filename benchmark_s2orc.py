@@ -0,0 +1,103 @@
+from module.benchmark import ShardGenerator, PipelineBenchmark, STAGES
+from module.benchmark import report_results, store_results
+from pathlib import Path
+import argparse
+import json
+
+if __name__ == "__main__":
+    # Design argument parser
+    parser = argparse.ArgumentParser(
+        description="""Benchmark the pipeline stages (scan, extract,
+        tabulate, mine) on synthetic S2ORC shards""")
+    parser.add_argument('-d',
+                        '--data_dir',
+                        metavar='',
+                        required=True,
+                        help='Provide PATH to synthetic shards (generated '
+                        'if the directory has none)')
+    parser.add_argument('-o',
+                        '--work_dir',
+                        metavar='',
+                        required=True,
+                        help='Provide PATH for the intermediate files')
+    parser.add_argument('-n',
+                        '--shards',
+                        metavar='',
+                        type=int,
+                        default=4,
+                        help='Provide number of shards (default: 4)')
+    parser.add_argument('-r',
+                        '--records',
+                        metavar='',
+                        type=int,
+                        default=1000,
+                        help='Provide number of entries per shard '
+                        '(default: 1000)')
+    parser.add_argument('-p',
+                        '--paragraphs',
+                        metavar='',
+                        type=int,
+                        default=20,
+                        help='Provide number of body text paragraphs '
+                        'per entry (default: 20)')
+    parser.add_argument('-hr',
+                        '--hit_rate',
+                        metavar='',
+                        type=float,
+                        default=0.05,
+                        help='Provide share of the entries of interest '
+                        '(default: 0.05)')
+    parser.add_argument('-s',
+                        '--seed',
+                        metavar='',
+                        type=int,
+                        default=0,
+                        help='Provide random seed (default: 0)')
+    parser.add_argument('-w',
+                        '--workers',
+                        metavar='',
+                        type=int,
+                        required=False,
+                        help='Provide number of worker processes')
+    parser.add_argument('-m',
+                        '--model',
+                        metavar='',
+                        default='en_core_sci_sm',
+                        help='Provide spaCy model for the mining stage')
+    parser.add_argument('-t',
+                        '--taxonomy',
+                        action='store_true',
+                        help='Mine taxonomic data too (needs NCBI taxonomy)')
+    parser.add_argument('-st',
+                        '--stages',
+                        metavar='',
+                        default=','.join(STAGES),
+                        help='Provide comma separated stages to run '
+                        f"(default: {','.join(STAGES)})")
+    parser.add_argument('-rf',
+                        '--results_file',
+                        metavar='',
+                        default='benchmark_results.jsonl',
+                        help='Provide jsonl FILE to store the results '
+                        '(default: benchmark_results.jsonl)')
+    args = parser.parse_args()
+
+    # Generate synthetic shards (once per data directory)
+    generator = ShardGenerator(args.data_dir, args.shards, args.records,
+                               args.paragraphs, args.hit_rate, seed=args.seed)
+    scale_file = Path(args.data_dir) / 'scale.json'
+    if scale_file.exists():
+        with open(scale_file) as f:
+            scale = json.load(f)
+    else:
+        generator.generate()
+        scale = generator.scale
+    # Run and measure the stages
+    benchmark = PipelineBenchmark(args.data_dir, args.work_dir, args.workers,
+                                  args.model, args.taxonomy)
+    results = benchmark.run(args.stages.split(','))
+    # Store the results and compare them with the previous run
+    scale.update(workers=args.workers, model=args.model,
+                 taxonomy=args.taxonomy)
+    previous = store_results(args.results_file, scale, results)
+    report_results(results, previous)
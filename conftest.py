@@ -3,6 +3,7 @@ from module.mv_data_mine import ExtractData
 from hypothesis import strategies as st
 from pytest import fixture
 import pandas as pd
+import spacy  # type: ignore
 
 
 @fixture(scope='module')
@@ -57,3 +58,44 @@ def tab_df_merged():
         'pmid': [2344, 4532, 5634],
         'doi': ['doi1', 'doi2', 'doi3']
     })
+
+
+@fixture(scope='session')
+def blank_model(tmp_path_factory):
+    model_path = tmp_path_factory.mktemp('model') / 'blank_en'
+    spacy.blank('en').to_disk(model_path)
+    return str(model_path)
+
+
+@fixture(scope='module')
+def cls_mv_miner(blank_model):
+    return ExtractData(
+        st.characters(),
+        st.characters(),
+        st.characters(),
+        blank_model,
+    )
+
+
+@fixture(scope='module')
+def mine_df():
+    return pd.DataFrame({
+        's2orc_id': [11, 12, 13],
+        'text': [
+            'Methane and sulfate were measured. Methane seeps everywhere.',
+            'The marine mud volcano cone emits thermogenic gas.',
+            'Nothing of interest here.',
+        ],
+    })
+
+
+@fixture(scope='module')
+def taxa_df():
+    return pd.DataFrame({
+        's2orc_id': [21, 22, 23],
+        'text': [
+            'Escherichia and Methanobrevibacter within Proteobacteria.',
+            'Euryarchaeota dominate, Escherichia bacterium is rare.',
+            'Nothing of interest here.',
+        ],
+    })
@@ -1,4 +1,5 @@
 from module.extract_data import ExtractInfo
+from module.metrics import PipelineMetrics, count_records, files_size
 import argparse
 
 if __name__ == "__main__":
@@ -24,9 +25,21 @@ if __name__ == "__main__":
         '-op',
         '--pdf_output',
         help='Provide output FILE PATH for the extracted metadata fields')
+    parser.add_argument('-mt',
+                        '--metrics',
+                        metavar='',
+                        required=False,
+                        help='Provide FILE PATH for json report of the stage '
+                        'timings, throughput and peak RSS')
+    parser.add_argument('-pf',
+                        '--profile',
+                        metavar='',
+                        required=False,
+                        help='Provide PATH for cProfile dumps of the stages')
     args = parser.parse_args()
 
     # Pipeline per se
+    metrics = PipelineMetrics(args.metrics, args.profile)
     # Init ExtractInfo class
     record = ExtractInfo(args.metadata_input, args.pdf_input, args.meta_output,
                          args.pdf_output)
@@ -38,6 +51,15 @@ if __name__ == "__main__":
     meta_extracted = record.extract_metadata(articles_meta)
     # Extract fields of interest from pdf_parse
     body_extracted = record.extract_body_text(articles_pdf)
-    # Write to files
-    write_meta = record.write_to_files(meta_extracted, record.output_meta)
-    write_pdf = record.write_to_files(body_extracted, record.output_pdf)
+    # Write to files (generators are consumed here)
+    with metrics.stage('extract_metadata') as stats:
+        write_meta = record.write_to_files(
+            count_records(meta_extracted, stats), record.output_meta)
+        stats['bytes'] = files_size(args.metadata_input)
+        stats['output_bytes'] = files_size(args.meta_output)
+    with metrics.stage('extract_pdf') as stats:
+        write_pdf = record.write_to_files(count_records(body_extracted, stats),
+                                          record.output_pdf)
+        stats['bytes'] = files_size(args.pdf_input)
+        stats['output_bytes'] = files_size(args.pdf_output)
+    metrics.write()
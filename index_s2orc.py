@@ -0,0 +1,42 @@
+from module.query_archives import ArchiveIndex, BLOCK_LINES
+import argparse
+import typer
+
+if __name__ == "__main__":
+    # Design parser
+    parser = argparse.ArgumentParser(
+        description="""Index S2ORC archives (metadata or pdf_parse) once,
+        so that entries can be fetched by paper_id, pubmed_id or doi
+        without scanning all the archives""")
+    parser.add_argument('-a',
+                        '--archives_path',
+                        metavar='',
+                        required=True,
+                        help='Provide PATH to S2ORC archives')
+    parser.add_argument('-x',
+                        '--index',
+                        metavar='',
+                        required=True,
+                        help='Provide output PATH for the archive index')
+    parser.add_argument('-w',
+                        '--workers',
+                        metavar='',
+                        type=int,
+                        required=False,
+                        help='Provide number of worker processes '
+                        '(default: all CPUs)')
+    parser.add_argument('-b',
+                        '--block_lines',
+                        metavar='',
+                        type=int,
+                        default=BLOCK_LINES,
+                        help='Provide number of entries per gzip member')
+    args = parser.parse_args()
+
+    # Pipeline per se
+    typer.secho('Indexing archives (it could take a while): ', bold=True)
+    index = ArchiveIndex(args.index)
+    indexed = index.build(args.archives_path, args.workers, args.block_lines)
+    header = typer.style('Indexed entries #: ', bold=True)
+    entries = typer.style(f"{indexed}", fg=typer.colors.GREEN, bold=True)
+    typer.echo(header + entries)
@@ -1,4 +1,5 @@
-from module.mine_data_pipeline import MineData
+from module.mine_data_pipeline import MineData, parse_section_filter
+from module.metrics import PipelineMetrics
 import argparse
 
 if __name__ == "__main__":
@@ -9,7 +10,8 @@ if __name__ == "__main__":
                         '--input_table',
                         metavar='',
                         required=True,
-                        help='Provide csv table with texts to mine')
+                        help='Provide table with texts to mine '
+                        '(.csv, .parquet or .arrow)')
     parser.add_argument(
         '-mv',
         '--output_mv',
@@ -22,20 +24,97 @@ if __name__ == "__main__":
         metavar='',
         required=True,
         help='Provide output PATH for taxonomic specific data table')
+    parser.add_argument('-b',
+                        '--batch_size',
+                        metavar='',
+                        type=int,
+                        default=256,
+                        help='Provide number of texts per spaCy batch')
+    parser.add_argument('-w',
+                        '--workers',
+                        metavar='',
+                        type=int,
+                        default=1,
+                        help='Provide number of mining worker processes')
+    parser.add_argument('-c',
+                        '--cache_dir',
+                        metavar='',
+                        required=False,
+                        help='Provide PATH for the cache of tokenized texts '
+                        '(reused by the next runs)')
+    parser.add_argument('-cs',
+                        '--cache_size',
+                        metavar='',
+                        type=int,
+                        default=2048,
+                        help='Provide size limit of the cache in MB '
+                        '(default: 2048)')
+    parser.add_argument('-inc',
+                        '--incremental',
+                        action='store_true',
+                        help='Mine only new or changed texts and merge them '
+                        'into the existing output tables')
+    parser.add_argument('-ch',
+                        '--chunk_size',
+                        metavar='',
+                        type=int,
+                        required=False,
+                        help='Provide number of table rows read and mined at '
+                        'once (bounded memory; not with --incremental)')
+    parser.add_argument('-pg',
+                        '--paragraphs',
+                        action='store_true',
+                        help='Mine body text paragraphs as separate docs '
+                        '(bounded memory per doc)')
+    parser.add_argument('-sf',
+                        '--section_filter',
+                        metavar='',
+                        action='append',
+                        type=parse_section_filter,
+                        help='Provide section filter of the body texts, '
+                        'PREFIX:SECTION,!SECTION (e.g. methods:method,result '
+                        'or Bacteria:!reference); PREFIX is chemistry, '
+                        'geology, mv, methods, Bacteria or Archaea')
+    parser.add_argument('-mt',
+                        '--metrics',
+                        metavar='',
+                        required=False,
+                        help='Provide FILE PATH for json report of the stage '
+                        'timings, throughput and peak RSS')
+    parser.add_argument('-pf',
+                        '--profile',
+                        metavar='',
+                        required=False,
+                        help='Provide PATH for cProfile dumps of the stages')
     args = parser.parse_args()
 
+    metrics = PipelineMetrics(args.metrics, args.profile)
+
     # Init MineData class (dedicated to data mining)
-    record = MineData(args.input_table, args.output_mv, args.output_taxa)
+    record = MineData(args.input_table, args.output_mv, args.output_taxa,
+                      args.batch_size, args.workers, args.cache_dir,
+                      args.cache_size * 1024**2, args.incremental,
+                      paragraphs=args.paragraphs,
+                      section_filters=dict(args.section_filter or []),
+                      chunk_size=args.chunk_size)
 
     # Init terminology dataclasses
     record.load_mining
 
     # Mine article chemical data
-    record.mine_chemical_data('text')
+    with metrics.stage('mine_chemistry') as stats:
+        since = record.mining_progress
+        record.mine_chemical_data('text')
+        stats.update(record.mining_stats(since))
 
     # Mine article Bacterial and Archaea data
-    record.mine_taxonomic_data('text', 'Bacteria', 'art_bacteria')
-    record.mine_taxonomic_data('text', 'Archaea', 'art_archaea')
+    with metrics.stage('mine_taxonomy') as stats:
+        since = record.mining_progress
+        record.mine_all_taxonomic_data('text', {
+            'Bacteria': 'art_bacteria',
+            'Archaea': 'art_archaea'
+        })
+        stats.update(record.mining_stats(since))
 
     # UNCOMMENT THE LINES BELOW IF YOU WANT TO EXTRACT INFO FROM THE ABSTRACTS
 
@@ -43,5 +122,11 @@ if __name__ == "__main__":
     # record.mine_chemical_data('abstract')
 
     # Mine abstract Bacterial and Archaea data
-    # record.mine_taxonomic_data('abstract', 'Bacteria', 'abs_bacteria')
-    # record.mine_taxonomic_data('abstract', 'Archaea', 'abs_archaea')
+    # record.mine_all_taxonomic_data('abstract', {
+    #     'Bacteria': 'abs_bacteria',
+    #     'Archaea': 'abs_archaea'
+    # })
+
+    # Trim the token cache and report its hits / misses
+    record.finish_mining()
+    metrics.write()
@@ -0,0 +1,450 @@
+from fastcore.utils import store_attr  # type: ignore
+from typing import Any, Callable, Dict, List, Optional, Tuple
+from .query_metadata import GettingPMID
+from .query_pdf import GettingPDFs
+from .extract_data import ExtractInfo
+from .tabulate_data import TabulateData
+from .mine_data_pipeline import MineData
+from .metrics import peak_rss_mb
+from pathlib import Path
+import multiprocessing
+import traceback
+import subprocess
+import datetime
+import hashlib
+import random
+import shutil
+import pandas as pd  # type: ignore
+import typer
+import gzip
+import json
+import time
+
+# Pipeline stages in the order of the five-step flow
+STAGES = ['scan_meta', 'scan_pdf', 'extract', 'tabulate', 'mine']
+# Archives scanned by the scan stages
+STAGE_ARCHIVES = {'scan_meta': 'metadata', 'scan_pdf': 'pdf_parse'}
+# Input files (in the working directory) of the extract and tabulate stages
+STAGE_FILES = {
+    'extract': ['meta_raw.jsonl', 'pdf_raw.jsonl'],
+    'tabulate': ['meta_extracted.jsonl', 'pdf_extracted.jsonl']
+}
+# Vocabulary of the synthetic texts, terms of interest and filler words
+TERMS = [
+    'methane', 'sulfate', 'chloride', 'iron', 'mud volcano', 'gryphon',
+    'terrestrial', 'marine', 'pliocene', 'miocene', 'illite', 'smectite',
+    'Escherichia', 'Methanobrevibacter', 'Proteobacteria', 'Euryarchaeota',
+    '16S rRNA', 'PCR', 'western blot', 'GC-MS'
+]
+FILLER = [
+    'the', 'of', 'and', 'in', 'samples', 'were', 'collected', 'from',
+    'sediment', 'fluid', 'analysis', 'community', 'showed', 'high', 'low',
+    'concentration', 'activity', 'site', 'core', 'depth', 'was', 'observed',
+    'with', 'a', 'to', 'at', 'by', 'between', 'microbial', 'gas', 'water'
+]
+# Share of the terms of interest in the synthetic texts
+TERM_RATE = 0.05
+
+
+class ShardGenerator:
+    """Synopsis: ShardGenerator class is dedicated to the generation of
+    synthetic S2ORC shards (gzip metadata / pdf_parse jsonl archives),
+    shaped like the sample_data archives
+    Input: output directory and scale (shards, records per shard, etc.)
+    Output: metadata/ and pdf_parse/ archives, pmids.json (PMIDs of the
+    entries of interest), sizes.json (# entries and bytes of the
+    uncompressed archives) and scale.json"""
+    def __init__(self,
+                 output_dir: str,
+                 n_shards: int = 4,
+                 records: int = 1000,
+                 paragraphs: int = 20,
+                 hit_rate: float = 0.05,
+                 pdf_rate: float = 0.6,
+                 seed: int = 0) -> None:
+        store_attr('n_shards, records, paragraphs, hit_rate, pdf_rate, seed')
+        self.output_dir = Path(output_dir)
+
+    @property
+    def scale(self) -> Dict[str, Any]:
+        """Synopsis: Parameters of the synthetic corpus"""
+        return {
+            'n_shards': self.n_shards,
+            'records': self.records,
+            'paragraphs': self.paragraphs,
+            'hit_rate': self.hit_rate,
+            'pdf_rate': self.pdf_rate,
+            'seed': self.seed
+        }
+
+    def generate(self) -> List[str]:
+        """Synopsis: Write the synthetic shards
+        Output: List of PMIDs of the entries of interest"""
+        rng = random.Random(self.seed)
+        (self.output_dir / 'metadata').mkdir(parents=True, exist_ok=True)
+        (self.output_dir / 'pdf_parse').mkdir(parents=True, exist_ok=True)
+        pmids: List[str] = []
+        sizes = {'metadata': [0, 0], 'pdf_parse': [0, 0]}
+        for shard in range(self.n_shards):
+            meta_file = (self.output_dir / 'metadata' /
+                         f'metadata_{shard}.jsonl.gz')
+            pdf_file = (self.output_dir / 'pdf_parse' /
+                        f'pdf_parses_{shard}.jsonl.gz')
+            with gzip.open(meta_file, 'wt') as f_meta, gzip.open(
+                    pdf_file, 'wt') as f_pdf:
+                for record in range(self.records):
+                    paper_id = str(shard * self.records + record + 1000)
+                    pubmed_id = str(int(paper_id) + 10**7)
+                    has_pdf = rng.random() < self.pdf_rate
+                    if rng.random() < self.hit_rate:
+                        pmids.append(pubmed_id)
+                    entries = [('metadata', f_meta,
+                                self._metadata(rng, paper_id, pubmed_id,
+                                               has_pdf))]
+                    if has_pdf:
+                        entries.append(('pdf_parse', f_pdf,
+                                        self._pdf_parse(rng, paper_id)))
+                    for kind, f, entry in entries:
+                        line = json.dumps(entry) + '\n'
+                        f.write(line)
+                        sizes[kind][0] += 1
+                        sizes[kind][1] += len(line.encode())
+        with open(self.output_dir / 'pmids.json', 'w') as f:
+            json.dump(pmids, f)
+        with open(self.output_dir / 'sizes.json', 'w') as f:
+            json.dump(sizes, f)
+        with open(self.output_dir / 'scale.json', 'w') as f:
+            json.dump(self.scale, f)
+        return pmids
+
+    def _text(self, rng: random.Random, words: int) -> str:
+        """Dependency: Helper for _metadata and _pdf_parse methods
+        Synopsis: Synthetic sentence with some terms of interest"""
+        return ' '.join(
+            rng.choice(TERMS) if rng.random() < TERM_RATE else rng.
+            choice(FILLER) for _ in range(words)) + '.'
+
+    def _metadata(self, rng: random.Random, paper_id: str, pubmed_id: str,
+                  has_pdf: bool) -> Dict[str, Any]:
+        """Dependency: Helper for generate method
+        Synopsis: Synthetic S2ORC metadata entry"""
+        citations = [str(rng.randrange(10**8)) for _ in range(30)]
+        return {
+            'paper_id': paper_id,
+            'title': self._text(rng, 12),
+            'authors': [{
+                'first': rng.choice('ABCDEFGH') + '.',
+                'middle': [],
+                'last': rng.choice(['Smith', 'Ivanov', 'Rossi', 'Tanaka']),
+                'suffix': ''
+            } for _ in range(rng.randint(1, 6))],
+            'abstract': self._text(rng, 200),
+            'year': rng.randint(1970, 2020),
+            'arxiv_id': None,
+            'acl_id': None,
+            'pmc_id': None,
+            'pubmed_id': pubmed_id,
+            'doi': f'10.0000/{paper_id}',
+            'venue': 'Synthetic Journal',
+            'journal': 'Synthetic Journal',
+            'has_pdf_body_text': has_pdf,
+            'mag_id': None,
+            'mag_field_of_study': ['Biology'],
+            'outbound_citations': citations,
+            'inbound_citations': citations[:5],
+            'has_outbound_citations': True,
+            'has_inbound_citations': True,
+            'has_pdf_parse': has_pdf,
+            'has_pdf_parsed_abstract': has_pdf,
+            'has_pdf_parsed_body_text': has_pdf,
+            'has_pdf_parsed_bib_entries': has_pdf,
+            'has_pdf_parsed_ref_entries': has_pdf,
+            's2_url': f'https://api.semanticscholar.org/CorpusID:{paper_id}'
+        }
+
+    def _pdf_parse(self, rng: random.Random,
+                   paper_id: str) -> Dict[str, Any]:
+        """Dependency: Helper for generate method
+        Synopsis: Synthetic S2ORC pdf_parse entry"""
+        def paragraph(section: str) -> Dict[str, Any]:
+            return {
+                'section': section,
+                'text': self._text(rng, rng.randint(20, 180)),
+                'cite_spans': [],
+                'ref_spans': []
+            }
+
+        return {
+            'paper_id': paper_id,
+            '_pdf_hash': hashlib.sha1(paper_id.encode()).hexdigest(),
+            'abstract': [paragraph('Abstract')],
+            'body_text': [
+                paragraph(rng.choice(['Introduction', 'Methods', 'Results']))
+                for _ in range(self.paragraphs)
+            ],
+            'bib_entries': {
+                f'BIBREF{i}': {
+                    'title': self._text(rng, 10),
+                    'authors': [],
+                    'year': rng.randint(1950, 2020),
+                    'venue': 'Synthetic Journal',
+                    'link': None
+                }
+                for i in range(10)
+            },
+            'ref_entries': {}
+        }
+
+
+class PipelineBenchmark:
+    """Synopsis: PipelineBenchmark class is dedicated to the measurement of
+    the pipeline stages (scan, extract, tabulate, mine) on synthetic shards;
+    each stage runs in a fresh process, so the peak RSS is per stage
+    Input: directory of ShardGenerator output, working directory
+    Output: Dict '{stage: {records, bytes, seconds, records/sec, MB/sec,
+    peak RSS}}'"""
+    def __init__(self,
+                 data_dir: str,
+                 work_dir: str,
+                 n_workers: Optional[int] = None,
+                 core_model: str = 'en_core_sci_sm',
+                 taxonomy: bool = False,
+                 isolate: bool = True) -> None:
+        store_attr('isolate')
+        self.settings = {
+            'data_dir': str(data_dir),
+            'work_dir': str(work_dir),
+            'n_workers': n_workers,
+            'core_model': core_model,
+            'taxonomy': taxonomy
+        }
+
+    def run(self, stages: List[str] = STAGES) -> Dict[str, Dict[str, float]]:
+        """Synopsis: Run the stages in the pipeline order"""
+        Path(self.settings['work_dir']).mkdir(parents=True, exist_ok=True)
+        results = dict()
+        for stage in [stage for stage in STAGES if stage in stages]:
+            typer.secho(f'Benchmark stage: {stage}', bold=True)
+            results[stage] = (self._run_isolated(stage) if self.isolate else
+                              run_stage(stage, self.settings))
+        return results
+
+    def _run_isolated(self, stage: str) -> Dict[str, float]:
+        """Dependency: Helper for run method
+        Synopsis: Run the stage in a spawned (not forked) process"""
+        context = multiprocessing.get_context('spawn')
+        receiver, sender = context.Pipe(duplex=False)
+        process = context.Process(target=_stage_process,
+                                  args=(stage, self.settings, sender))
+        process.start()
+        sender.close()
+        status, result = receiver.recv()
+        process.join()
+        if status == 'error':
+            raise RuntimeError(f'Benchmark stage {stage} failed:\n{result}')
+        return result
+
+
+def run_stage(stage: str, settings: Dict[str, Any]) -> Dict[str, float]:
+    """Synopsis: Run and measure a pipeline stage
+    Output: Dict '{records, bytes, seconds, records_per_sec, mb_per_sec,
+    peak_rss_mb}'"""
+    records, n_bytes = _stage_input(stage, settings)
+    start = time.perf_counter()
+    STAGE_RUNNERS[stage](settings)
+    seconds = time.perf_counter() - start
+    return {
+        'records': records,
+        'bytes': n_bytes,
+        'seconds': round(seconds, 4),
+        'records_per_sec': round(records / seconds, 2) if seconds else 0.0,
+        'mb_per_sec': round(n_bytes / 1024**2 / seconds, 3) if seconds else
+        0.0,
+        'peak_rss_mb': peak_rss_mb()
+    }
+
+
+def _stage_process(stage: str, settings: Dict[str, Any], sender) -> None:
+    """Dependency: Helper for PipelineBenchmark._run_isolated method
+    Synopsis: Send the stage result (or traceback) to the parent"""
+    try:
+        sender.send(('ok', run_stage(stage, settings)))
+    except Exception:
+        sender.send(('error', traceback.format_exc()))
+    finally:
+        sender.close()
+
+
+def _work_file(settings: Dict[str, Any], name: str) -> Path:
+    """Dependency: Helper for the stage runners
+    Synopsis: Fresh output file of the stage in the working directory"""
+    work_file = Path(settings['work_dir']) / name
+    if work_file.is_dir():
+        shutil.rmtree(work_file)
+    elif work_file.exists():
+        work_file.unlink()
+    return work_file
+
+
+def _line_count(file: Path) -> int:
+    """Dependency: Helper for the stage runners
+    Synopsis: Number of lines (jsonl entries) of the file"""
+    with open(file, 'rb') as f:
+        return sum(1 for _ in f)
+
+
+def _stage_input(stage: str, settings: Dict[str, Any]) -> Tuple[int, int]:
+    """Dependency: Helper for run_stage function
+    Synopsis: Number of input entries (rows) and bytes of the stage"""
+    data_dir = Path(settings['data_dir'])
+    work_dir = Path(settings['work_dir'])
+    if stage.startswith('scan_'):
+        with open(data_dir / 'sizes.json') as f:
+            records, n_bytes = json.load(f)[STAGE_ARCHIVES[stage]]
+        return records, n_bytes
+    if stage == 'mine':
+        merged = work_dir / 'merged_tbl.csv'
+        texts = pd.read_csv(merged, usecols=['text'])['text'].notna().sum()
+        return int(texts), merged.stat().st_size
+    inputs = [work_dir / name for name in STAGE_FILES[stage]]
+    return (sum(map(_line_count, inputs)),
+            sum(file.stat().st_size for file in inputs))
+
+
+def _scan_meta(settings: Dict[str, Any]) -> None:
+    """Dependency: Helper for run_stage function
+    Synopsis: Scan metadata archives for the PMIDs of interest"""
+    data_dir = Path(settings['data_dir'])
+    with open(data_dir / 'pmids.json') as f:
+        pmids = json.load(f)
+    output = _work_file(settings, 'meta_raw.jsonl')
+    _work_file(settings, 'meta_raw.jsonl.parts')
+    GettingPMID('benchmark@example.org', str(data_dir / 'metadata'),
+                str(output)).scan_archives(pmids, settings['n_workers'])
+
+
+def _scan_pdf(settings: Dict[str, Any]) -> None:
+    """Dependency: Helper for run_stage function
+    Synopsis: Scan pdf_parse archives for the paper_ids of interest"""
+    data_dir = Path(settings['data_dir'])
+    meta_raw = Path(settings['work_dir']) / 'meta_raw.jsonl'
+    output = _work_file(settings, 'pdf_raw.jsonl')
+    _work_file(settings, 'pdf_raw.jsonl.parts')
+    record = GettingPDFs(str(meta_raw), str(data_dir / 'pdf_parse'),
+                         str(output))
+    record.scan_archives(record.open_input, settings['n_workers'])
+
+
+def _extract(settings: Dict[str, Any]) -> None:
+    """Dependency: Helper for run_stage function
+    Synopsis: Extract fields of interest from the scanned entries"""
+    work_dir = Path(settings['work_dir'])
+    inputs = [work_dir / name for name in STAGE_FILES['extract']]
+    meta_out = _work_file(settings, 'meta_extracted.jsonl')
+    pdf_out = _work_file(settings, 'pdf_extracted.jsonl')
+    record = ExtractInfo(*map(str, inputs), str(meta_out), str(pdf_out))
+    record.write_to_files(
+        record.extract_metadata(record.read_jsonl(record.input_meta)),
+        record.output_meta)
+    record.write_to_files(
+        record.extract_body_text(record.read_jsonl(record.input_pdf)),
+        record.output_pdf)
+
+
+def _tabulate(settings: Dict[str, Any]) -> None:
+    """Dependency: Helper for run_stage function
+    Synopsis: Merge the extracted metadata and pdf_parse data"""
+    work_dir = Path(settings['work_dir'])
+    inputs = [work_dir / name for name in STAGE_FILES['tabulate']]
+    output = _work_file(settings, 'merged_tbl.csv')
+    record = TabulateData(*map(str, inputs), str(output))
+    record.write_table(
+        record.merge_df(record.read_jsonl(record.extract_meta),
+                        record.read_jsonl(record.extract_pdf)))
+
+
+def _mine(settings: Dict[str, Any]) -> None:
+    """Dependency: Helper for run_stage function
+    Synopsis: Mine mud volcano (and taxonomic) data from the texts"""
+    merged = Path(settings['work_dir']) / 'merged_tbl.csv'
+    output_dir = _work_file(settings, 'mining')
+    output_dir.mkdir()
+    record = MineData(str(merged),
+                      str(output_dir / 'mv'),
+                      str(output_dir / 'taxa'),
+                      workers=settings['n_workers'] or 1,
+                      core_model=settings['core_model'])
+    record.load_mining
+    record.mine_chemical_data('text')
+    if settings['taxonomy']:
+        record.mine_all_taxonomic_data('text', {
+            'Bacteria': 'art_bacteria',
+            'Archaea': 'art_archaea'
+        })
+    record.finish_mining()
+
+
+STAGE_RUNNERS: Dict[str, Callable[[Dict[str, Any]], None]] = {
+    'scan_meta': _scan_meta,
+    'scan_pdf': _scan_pdf,
+    'extract': _extract,
+    'tabulate': _tabulate,
+    'mine': _mine
+}
+
+
+def store_results(results_file: str, scale: Dict[str, Any],
+                  results: Dict[str, Dict[str, float]]) -> Optional[Dict]:
+    """Synopsis: Append the benchmark results (with commit and scale) to
+    jsonl file
+    Output: previous results of the same scale (None if there are none)"""
+    results_path = Path(results_file)
+    previous = None
+    if results_path.exists():
+        with open(results_path) as f:
+            for line in f:
+                entry = json.loads(line)
+                if entry['scale'] == scale:
+                    previous = entry
+    with open(results_path, 'a') as f:
+        f.write(
+            json.dumps({
+                'timestamp': datetime.datetime.now().isoformat(
+                    timespec='seconds'),
+                'commit': git_commit(),
+                'scale': scale,
+                'stages': results
+            }) + '\n')
+    return previous
+
+
+def git_commit() -> Optional[str]:
+    """Synopsis: Current git commit of the repository (if any)"""
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'],
+                              cwd=Path(__file__).parent,
+                              capture_output=True,
+                              text=True,
+                              check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def report_results(results: Dict[str, Dict[str, float]],
+                   previous: Optional[Dict] = None) -> None:
+    """Synopsis: Print the results per stage (and records/sec change
+    against the previous results of the same scale)"""
+    for stage, result in results.items():
+        header = typer.style(f'{stage}: ', bold=True)
+        numbers = (f"{result['records_per_sec']} records/sec, "
+                   f"{result['mb_per_sec']} MB/sec, "
+                   f"peak RSS {result['peak_rss_mb']} MB")
+        change = ''
+        if previous and stage in previous['stages']:
+            before = previous['stages'][stage]['records_per_sec']
+            if before:
+                delta = (result['records_per_sec'] / before - 1) * 100
+                change = typer.style(
+                    f" ({delta:+.1f}% vs {previous['commit']})",
+                    fg=typer.colors.GREEN if delta >= 0 else typer.colors.RED)
+        typer.echo(header + numbers + change)
@@ -0,0 +1,130 @@
+from fastcore.utils import store_attr  # type: ignore
+from typing import Dict, Iterable, List, Optional
+from spacy.tokens import DocBin  # type: ignore
+from pathlib import Path
+import hashlib
+import sqlite3
+import typer
+import time
+
+# Default size limit of the token cache (bytes)
+DOC_CACHE_SIZE = 2 * 1024**3
+# Seconds to wait for the cache lock held by another mining process
+DOC_CACHE_TIMEOUT = 60
+
+
+class DocCache:
+    """Synopsis: DocCache class is dedicated to on-disk caching of the
+    tokenized texts (spaCy DocBin), so a rerun of the mining with other
+    terminology only matches the tokens
+    Input: cache directory, size limit in bytes
+    Output: serialized docs keyed by hash of (text, model name, version);
+    the least recently used docs are evicted beyond the size limit"""
+    def __init__(self,
+                 cache_dir: str,
+                 max_bytes: int = DOC_CACHE_SIZE) -> None:
+        store_attr('max_bytes')
+        self.cache_dir = Path(cache_dir)
+        self.hits, self.misses = 0, 0
+        self._db: Optional[sqlite3.Connection] = None
+
+    @property
+    def db(self) -> sqlite3.Connection:
+        """Synopsis: Open the cache database once per process"""
+        if self._db is None:
+            self.cache_dir.mkdir(parents=True, exist_ok=True)
+            self._db = sqlite3.connect(str(self.cache_dir / 'docs.sqlite'),
+                                       timeout=DOC_CACHE_TIMEOUT)
+            # Several mining workers read and write at once
+            self._db.execute('PRAGMA journal_mode=WAL')
+            self._db.execute('CREATE TABLE IF NOT EXISTS docs (key TEXT '
+                             'PRIMARY KEY, data BLOB, size INTEGER, '
+                             'used REAL)')
+            self._db.execute(
+                'CREATE INDEX IF NOT EXISTS docs_used ON docs (used)')
+        return self._db
+
+    def key(self, text: str, model_id: str) -> str:
+        """Synopsis: Cache key of the text tokenized by the model"""
+        return hashlib.sha1(f"{model_id}\n{text}".encode()).hexdigest()
+
+    def get_many(self, keys: Iterable[str]) -> Dict[str, bytes]:
+        """Synopsis: Look up serialized docs and count hits / misses
+        Output: Dict '{key: serialized doc}' of the cached docs"""
+        keys = list(dict.fromkeys(keys))
+        found: Dict[str, bytes] = dict()
+        # Stay below SQLite limit of host parameters
+        for start in range(0, len(keys), 900):
+            chunk = keys[start:start + 900]
+            found.update(
+                self.db.execute(
+                    f"SELECT key, data FROM docs WHERE key IN "
+                    f"({', '.join('?' * len(chunk))})", chunk))
+        with self.db:
+            self.db.executemany('UPDATE docs SET used = ? WHERE key = ?',
+                                ((time.time(), key) for key in found))
+        self.hits += len(found)
+        self.misses += len(keys) - len(found)
+        return found
+
+    def put_many(self, docs: Dict[str, bytes]) -> None:
+        """Synopsis: Store serialized docs"""
+        with self.db:
+            self.db.executemany(
+                'INSERT OR REPLACE INTO docs VALUES (?, ?, ?, ?)',
+                ((key, data, len(data), time.time())
+                 for key, data in docs.items()))
+
+    def evict(self) -> int:
+        """Synopsis: Drop the least recently used docs beyond the size
+        limit
+        Output: # evicted docs"""
+        total = self.db.execute(
+            'SELECT COALESCE(SUM(size), 0) FROM docs').fetchone()[0]
+        evicted: List[str] = []
+        rows = self.db.execute('SELECT key, size FROM docs ORDER BY used')
+        for key, size in rows:
+            if total <= self.max_bytes:
+                break
+            evicted.append(key)
+            total -= size
+        with self.db:
+            self.db.executemany('DELETE FROM docs WHERE key = ?',
+                                ((key, ) for key in evicted))
+        if evicted:
+            self.db.execute('VACUUM')
+        return len(evicted)
+
+    def close(self) -> None:
+        """Synopsis: Close the cache database"""
+        if self._db is not None:
+            self._db.close()
+            self._db = None
+
+    def report(self, evicted: int = 0) -> None:
+        """Synopsis: Report cache hits / misses (and evicted docs)"""
+        header = typer.style('Doc cache hits / misses: ', bold=True)
+        counts = typer.style(f"{self.hits} / {self.misses}",
+                             fg=typer.colors.GREEN,
+                             bold=True)
+        typer.echo(header + counts + (f" ({evicted} evicted)"
+                                      if evicted else ''))
+
+    def __getstate__(self) -> Dict:
+        """Synopsis: Send DocCache to worker processes without
+        the database connection"""
+        state = self.__dict__.copy()
+        state['_db'] = None
+        return state
+
+
+def serialize_doc(doc) -> bytes:
+    """Synopsis: Serialize the tokens (text and whitespace) of a doc"""
+    doc_bin = DocBin(attrs=['ORTH'], store_user_data=False)
+    doc_bin.add(doc)
+    return doc_bin.to_bytes()
+
+
+def deserialize_doc(data: bytes, vocab):
+    """Synopsis: Restore the doc serialized with serialize_doc"""
+    return next(DocBin().from_bytes(data).get_docs(vocab))
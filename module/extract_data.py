@@ -1,10 +1,86 @@
 from fastcore.utils import store_attr  # type: ignore
-from typing import Dict, Generator
+from typing import Dict, Generator, List, Tuple
+from functools import lru_cache
 import jmespath as jp  # type: ignore
 import jsonlines as js  # type: ignore
 import json
 import typer
 
+# jmespath compiler with memory, each expression is compiled only once
+compile_expression = lru_cache(maxsize=None)(jp.compile)
+# Compiled expressions of the fields of interest
+PAPER_ID = compile_expression('paper_id')
+TITLE = compile_expression('title')
+ABSTRACT = compile_expression('abstract')
+FIRST_AUTHOR = compile_expression('authors[0].[first, last]')
+YEAR = compile_expression('year')
+DOI = compile_expression('doi')
+PUBMED_ID = compile_expression('pubmed_id')
+# Separator of the body_text paragraphs in the extracted text; it is
+# whitespace to the tokenizer, so whole texts are mined as before, and
+# the paragraphs can be mined one by one (see split_paragraphs)
+PARAGRAPH_SEPARATOR = '\n\n'
+
+
+def project_metadata(article: Dict) -> Dict:
+    """Synopsis: Project S2ORC metadata entry onto the fields of interest
+    (paper_id, title, abstract, authors, year, doi, pubmed_id)"""
+    return {
+        's2orc_id': PAPER_ID.search(article),
+        'title': TITLE.search(article),
+        'abstract': ABSTRACT.search(article),
+        'authors': ' '.join(name for name in FIRST_AUTHOR.search(article) or []
+                            if name is not None),
+        'year': YEAR.search(article),
+        'doi': DOI.search(article),
+        'pmid': PUBMED_ID.search(article),
+    }
+
+
+def project_body_text(article: Dict) -> Dict:
+    """Synopsis: Project S2ORC pdf_parse entry onto the fields of interest
+    (paper_id, body_text paragraphs joined into one text, paragraph
+    boundaries are kept as PARAGRAPH_SEPARATOR, and the section names of
+    the paragraphs as json list, see paragraph_sections)"""
+    paragraphs = [
+        paragraph for paragraph in article.get('body_text') or []
+        if paragraph.get('text') is not None
+    ]
+    return {
+        's2orc_id': PAPER_ID.search(article),
+        'text': PARAGRAPH_SEPARATOR.join(
+            _paragraph_text(paragraph['text']) for paragraph in paragraphs),
+        'sections': json.dumps([
+            paragraph.get('section') or '' for paragraph in paragraphs
+        ]),
+    }
+
+
+def _paragraph_text(text: str) -> str:
+    """Dependency: Helper for project_body_text function
+    Synopsis: Paragraph text without line breaks (whitespace to the
+    tokenizer too), so the joined text splits back into the paragraphs"""
+    return text.replace('\n', ' ')
+
+
+def paragraph_sections(text: str, sections: str) -> List[Tuple[str, str]]:
+    """Synopsis: Pair the paragraphs of extracted text with their section
+    names (json list of project_body_text, '' if unknown)
+    Output: List of (paragraph, section name)"""
+    paragraphs = text.split(PARAGRAPH_SEPARATOR)
+    names = json.loads(sections) if isinstance(sections, str) else []
+    if len(names) != len(paragraphs):
+        names = [''] * len(paragraphs)
+    return list(zip(paragraphs, names))
+
+
+def split_paragraphs(text: str) -> List[str]:
+    """Synopsis: Split extracted text into its (non-blank) paragraphs"""
+    return [
+        paragraph for paragraph in text.split(PARAGRAPH_SEPARATOR)
+        if paragraph.strip()
+    ]
+
 
 class ExtractInfo:
     """Synopsis: ExtractInfo class is dedicated to extraction of specific
@@ -29,24 +105,7 @@ class ExtractInfo:
         typer.secho('Extracting fields of interest from metadata jsonl',
                     bold=True)
         for article in articles:
-            yield {
-                's2orc_id':
-                self.fmt_output('paper_id').search(article),
-                'title':
-                self.fmt_output('title').search(article),
-                'abstract':
-                self.fmt_output('abstract').search(article),
-                'authors':
-                ' '.join(
-                    self.fmt_output('authors[0].[first, last]').search(
-                        article)),
-                'year':
-                self.fmt_output('year').search(article),
-                'doi':
-                self.fmt_output('doi').search(article),
-                'pmid':
-                self.fmt_output('pubmed_id').search(article),
-            }
+            yield project_metadata(article)
 
     def extract_body_text(self,
                           articles: Generator) -> Generator[Dict, None, None]:
@@ -55,17 +114,11 @@ class ExtractInfo:
         typer.secho('Extracting fields of interest from pdf parse jsonl',
                     bold=True)
         for article in articles:
-            yield {
-                's2orc_id':
-                self.fmt_output('paper_id').search(article),
-                'text':
-                ' '.join(self.fmt_output('body_text[*].text').search(article)),
-            }
+            yield project_body_text(article)
 
     def fmt_output(self, data):
-        """Dependecy: Helper for extract_* methods
-        Synopsis: jmespath compiler"""
-        return jp.compile(data)
+        """Synopsis: jmespath compiler (compiled expressions are reused)"""
+        return compile_expression(data)
 
     def write_to_files(self, data, output_file):
         """Synopsis: Write extracted fields of interest to files"""
@@ -1,6 +1,12 @@
 from dataclasses import dataclass, field
-from typing import List
+from typing import Dict, FrozenSet, List, Optional, Tuple
 from ete3 import NCBITaxa  # type: ignore
+from pathlib import Path
+import pickle
+import os
+
+# Number of taxids per get_taxid_translator call (one SQLite query each)
+TRANSLATOR_BATCH = 5000
 
 
 def default_field(obj):
@@ -58,8 +64,12 @@ class SynChem:
 
 class SynTax:
     """Synopsis: SynTax class contains all the relevant taxonomy to mine"""
-    def __init__(self):
+    def __init__(self, cache_dir: Optional[str] = None):
         self.ncbi = NCBITaxa()
+        # Lexicons are cached next to the ete3 taxonomy database by default
+        self.cache_dir = Path(cache_dir) if cache_dir else Path(
+            self.ncbi.dbfile).parent / 'muddy_mine_lexicons'
+        self.lexicons: Dict[Tuple[str, str], FrozenSet[str]] = dict()
 
     def get_descendants(self, domain: str, taxon_rank: str) -> List[str]:
         """Synopsis: Fetch all the available taxids"""
@@ -67,9 +77,47 @@ class SynTax:
         taxids = self.ncbi.get_descendant_taxa(domain,
                                                rank_limit=taxon_rank,
                                                collapse_subspecies=True)
-        taxa_names = (self.ncbi.get_taxid_translator([taxa])
-                      for taxa in taxids)
-        return [values for i in taxa_names for key, values in i.items()]
+        translator: Dict[int, str] = dict()
+        for i in range(0, len(taxids), TRANSLATOR_BATCH):
+            translator.update(
+                self.ncbi.get_taxid_translator(taxids[i:i + TRANSLATOR_BATCH]))
+        return [translator[taxa] for taxa in taxids if taxa in translator]
+
+    @property
+    def db_version(self) -> str:
+        """Synopsis: Fingerprint of the local NCBI taxonomy database,
+        it changes every time ete3 updates the database"""
+        db_stat = os.stat(self.ncbi.dbfile)
+        return f"{db_stat.st_mtime_ns}-{db_stat.st_size}"
+
+    def get_lexicon(self, domain: str, taxon_rank: str) -> FrozenSet[str]:
+        """Synopsis: Get taxa names of the domain at the rank level
+        Cached in memory and on disk per (domain, rank, NCBI db version)"""
+        key = (domain, taxon_rank)
+        if key not in self.lexicons:
+            cache_file = self.cache_dir / (
+                f"{domain}_{taxon_rank}_{self.db_version}.pkl")
+            if cache_file.exists():
+                with open(cache_file, 'rb') as f:
+                    self.lexicons[key] = frozenset(pickle.load(f))
+            else:
+                names = self.get_descendants(domain, taxon_rank)
+                self._write_lexicon(cache_file, domain, taxon_rank, names)
+                self.lexicons[key] = frozenset(names)
+        return self.lexicons[key]
+
+    def _write_lexicon(self, cache_file: Path, domain: str, taxon_rank: str,
+                       names: List[str]) -> None:
+        """Dependency: Helper for get_lexicon method
+        Synopsis: Write lexicon to the cache and drop its stale versions"""
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+        for stale in self.cache_dir.glob(f"{domain}_{taxon_rank}_*.pkl"):
+            stale.unlink()
+        tmp_file = cache_file.with_suffix('.tmp')
+        with open(tmp_file, 'wb') as f:
+            pickle.dump(sorted(set(names)), f,
+                        protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp_file, cache_file)
 
 
 @dataclass
@@ -0,0 +1,215 @@
+from typing import Any, Dict, Generator, Iterable, Optional, Union
+from contextlib import contextmanager
+from pathlib import Path
+import threading
+import resource
+import datetime
+import cProfile
+import typer
+import json
+import time
+import sys
+import os
+
+# Seconds between the RSS samples of a stage
+RSS_INTERVAL = 0.05
+
+
+class PipelineMetrics:
+    """Synopsis: PipelineMetrics class is dedicated to the measurement of
+    the pipeline stages of a script (wall / CPU time, records and bytes,
+    hits per shard, docs/sec, peak RSS) and to the optional cProfile
+    dumps of the stages; with neither report nor profile directory the
+    stages are not measured at all
+    Input: json report FILE, PATH for the cProfile dumps ('{stage}.prof')
+    Output: json report '{script, started, finished, peak_rss_mb,
+    stages: {stage: {wall_sec, cpu_sec, peak_rss_mb, ...}}}'; the peak
+    RSS of the report is the high-water mark of the whole run, the one
+    of a stage is sampled during the stage (RssSampler), or, without
+    /proc, reported as cumulative_peak_rss_mb (high-water mark so far)"""
+    def __init__(self,
+                 report_file: Optional[str] = None,
+                 profile_dir: Optional[str] = None,
+                 script: Optional[str] = None) -> None:
+        self.report_file = Path(report_file) if report_file else None
+        self.profile_dir = Path(profile_dir) if profile_dir else None
+        self.script = script or Path(sys.argv[0]).name
+        self.started = datetime.datetime.now().isoformat(timespec='seconds')
+        self.stages: Dict[str, Dict[str, Any]] = dict()
+
+    @property
+    def enabled(self) -> bool:
+        """Synopsis: Whether the stages are measured"""
+        return self.report_file is not None or self.profile_dir is not None
+
+    @contextmanager
+    def stage(self, name: str) -> Generator[Dict[str, Any], None, None]:
+        """Synopsis: Measure the stage run in the with block; the block
+        fills the yielded Dict with the counts of the stage (records,
+        bytes, hits_per_shard, etc.)"""
+        stats: Dict[str, Any] = self.stages.setdefault(name, dict())
+        if not self.enabled:
+            yield stats
+            return
+        profiler = cProfile.Profile() if self.profile_dir else None
+        sampler = RssSampler()
+        sampler.start()
+        wall, cpu = time.perf_counter(), cpu_seconds()
+        if profiler:
+            profiler.enable()
+        try:
+            yield stats
+        finally:
+            if profiler:
+                profiler.disable()
+                self.profile_dir.mkdir(parents=True, exist_ok=True)
+                profiler.dump_stats(str(self.profile_dir / f"{name}.prof"))
+            stats.update(wall_sec=round(time.perf_counter() - wall, 4),
+                         cpu_sec=round(cpu_seconds() - cpu, 4))
+            peak = sampler.stop()
+            if peak is None:
+                stats['cumulative_peak_rss_mb'] = peak_rss_mb()
+            else:
+                stats['peak_rss_mb'] = peak
+            stats.update(throughput(stats))
+
+    def write(self) -> None:
+        """Synopsis: Write the json report (atomically) and report its
+        location"""
+        if self.report_file is None:
+            return
+        report = {
+            'script': self.script,
+            'started': self.started,
+            'finished': datetime.datetime.now().isoformat(timespec='seconds'),
+            'peak_rss_mb': peak_rss_mb(),
+            'stages': self.stages
+        }
+        self.report_file.parent.mkdir(parents=True, exist_ok=True)
+        tmp_file = self.report_file.with_suffix('.tmp')
+        with open(tmp_file, 'w') as f:
+            json.dump(report, f, indent=2)
+        os.replace(tmp_file, self.report_file)
+        header = typer.style('Metrics report: ', bold=True)
+        typer.echo(header + typer.style(f"{self.report_file}",
+                                        fg=typer.colors.GREEN,
+                                        bold=True))
+
+
+class RssSampler:
+    """Synopsis: RssSampler class is dedicated to the peak RSS of a
+    single stage: RSS of the process and of its live (worker) children
+    is summed up and sampled in a background thread (Linux /proc), as
+    ru_maxrss is the high-water mark of the whole process lifetime
+    Input: seconds between the samples
+    Output: peak RSS (MB) of the stage, None without /proc"""
+    def __init__(self, interval: float = RSS_INTERVAL) -> None:
+        self.interval = interval
+        self.peak_kb: Optional[int] = None
+        self.stopped = threading.Event()
+        self.thread = threading.Thread(target=self._sample, daemon=True)
+
+    def start(self) -> None:
+        """Synopsis: Take the first sample and keep sampling"""
+        self.peak_kb = tree_rss_kb(os.getpid())
+        if self.peak_kb is not None:
+            self.thread.start()
+
+    def stop(self) -> Optional[float]:
+        """Synopsis: Stop sampling (after a last sample)
+        Output: peak RSS (MB) of the stage"""
+        if self.peak_kb is None:
+            return None
+        self.stopped.set()
+        self.thread.join()
+        self._update()
+        return round(self.peak_kb / 1024, 1)
+
+    def _sample(self) -> None:
+        """Dependency: Helper for start method
+        Synopsis: Sample RSS until stopped"""
+        while not self.stopped.wait(self.interval):
+            self._update()
+
+    def _update(self) -> None:
+        """Dependency: Helper for _sample and stop methods
+        Synopsis: Keep the highest RSS sample"""
+        rss = tree_rss_kb(os.getpid())
+        if rss is not None and self.peak_kb is not None:
+            self.peak_kb = max(self.peak_kb, rss)
+
+
+def tree_rss_kb(pid: int) -> Optional[int]:
+    """Synopsis: Current RSS (KB) of the process and its descendants
+    (None without /proc, 0 for the processes, which have exited)"""
+    proc = Path('/proc') / str(pid)
+    try:
+        with open(proc / 'status') as f:
+            rss = next((int(line.split()[1])
+                        for line in f if line.startswith('VmRSS:')), 0)
+    except FileNotFoundError:
+        return None if pid == os.getpid() else 0
+    except OSError:
+        return 0
+    for children in proc.glob('task/*/children'):
+        try:
+            child_pids = children.read_text().split()
+        except OSError:
+            continue
+        rss += sum(tree_rss_kb(int(child)) or 0 for child in child_pids)
+    return rss
+
+
+def throughput(stats: Dict[str, Any]) -> Dict[str, float]:
+    """Dependency: Helper for PipelineMetrics.stage method
+    Synopsis: Records/sec and MB/sec of the stage (if counted)"""
+    seconds = stats['wall_sec']
+    if not seconds:
+        return dict()
+    rates = dict()
+    if 'records' in stats:
+        rates['records_per_sec'] = round(stats['records'] / seconds, 2)
+    if 'bytes' in stats:
+        rates['mb_per_sec'] = round(stats['bytes'] / 1024**2 / seconds, 3)
+    return rates
+
+
+def cpu_seconds() -> float:
+    """Synopsis: CPU time (user + system) of the process and of its
+    finished (worker) children"""
+    children = resource.getrusage(resource.RUSAGE_CHILDREN)
+    return time.process_time() + children.ru_utime + children.ru_stime
+
+
+def peak_rss_mb() -> float:
+    """Synopsis: Peak RSS of the process and of its (worker) children"""
+    # ru_maxrss is in KB on Linux
+    return round(
+        max(
+            resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+            resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss) / 1024,
+        1)
+
+
+def files_size(*paths: Union[str, Path, None], pattern: str = '**/*') -> int:
+    """Synopsis: Total size (bytes) of the files; directories are
+    searched for the files matching the pattern"""
+    size = 0
+    for path in filter(None, paths):
+        path = Path(path)
+        if path.is_dir():
+            size += sum(file.stat().st_size for file in path.glob(pattern)
+                        if file.is_file())
+        elif path.exists():
+            size += path.stat().st_size
+    return size
+
+
+def count_records(items: Iterable[Any],
+                  stats: Dict[str, Any],
+                  key: str = 'records') -> Generator[Any, None, None]:
+    """Synopsis: Pass the items through and count them into stats[key]"""
+    stats.setdefault(key, 0)
+    for item in items:
+        stats[key] += 1
+        yield item
@@ -1,23 +1,120 @@
 from .mv_data_mine import ExtractData  # type: ignore
 from .get_dict_terms import SynChemDict, SynGeoDict  # type: ignore
 from .get_dict_terms import SynMudDict, SynMethodDict  # type: ignore
+from .get_dict_terms import SynTaxaDict  # type: ignore
+from .doc_cache import DOC_CACHE_SIZE
+from .term_matrix import MatrixRun, MatrixWriter, TermMatrix, merge_runs
+from .extract_data import PARAGRAPH_SEPARATOR, paragraph_sections
+from .tabulate_data import SECTIONS_COLUMN
 from fastcore.utils import compose, store_attr  # type: ignore
-from typing import Dict, List
+from typing import Any, Callable, Dict, Iterable, List, Optional, Set
+from typing import Tuple
+from collections import defaultdict
+from itertools import chain
 import pathlib  # type: ignore
 import pandas as pd  # type: ignore
+import tempfile
+import hashlib
+import typer
+import json
+import csv
+import io
+import os
+
+# Taxonomic ranks (columns of the taxonomy tables)
+TAXA_RANKS = ['phylum', 'class', 'order', 'family', 'genus', 'species']
+# Terminology prefixes and domains of the section filters
+FILTER_PREFIXES = [
+    'chemistry', 'geology', 'mv', 'methods', 'Bacteria', 'Archaea'
+]
+
+
+class MiningManifest:
+    """Synopsis: MiningManifest class is dedicated to the bookkeeping of
+    incremental mining; it keeps the fingerprint of the mining setup
+    (text level, terminology, spaCy model) and the text hashes of the
+    s2orc_ids, which are already mined into the output table
+    Input: output csv table
+    Output: manifest json file next to the table ('<table>.manifest.json')"""
+    def __init__(self, output_table: pathlib.Path) -> None:
+        self.output_table = output_table
+        self.matrix_file = output_table.with_suffix('.npz')
+        self.manifest_file = output_table.with_name(output_table.stem +
+                                                    '.manifest.json')
+
+    def load(self, fingerprint: str) -> Optional[Dict[str, str]]:
+        """Synopsis: Text hashes of the mined s2orc_ids, None if the
+        table has to be rebuilt (no table / manifest, or the mining setup
+        has changed)
+        Output: Dict '{s2orc_id: text hash}'"""
+        if not all(file.exists() for file in (self.output_table,
+                                               self.matrix_file,
+                                               self.manifest_file)):
+            return None
+        with open(self.manifest_file) as f:
+            manifest = json.load(f)
+        if manifest['fingerprint'] != fingerprint:
+            return None
+        return manifest['texts']
+
+    def save(self, fingerprint: str, texts: Dict[str, str]) -> None:
+        """Synopsis: Write the manifest of the mined table (atomically)"""
+        tmp_file = self.manifest_file.with_suffix('.tmp')
+        with open(tmp_file, 'w') as f:
+            json.dump({'fingerprint': fingerprint, 'texts': texts}, f)
+        os.replace(tmp_file, self.manifest_file)
+
+
+def fingerprint(*setup: Any) -> str:
+    """Synopsis: Hash of the mining setup (json serializable parts)"""
+    return hashlib.sha1(
+        json.dumps(setup, sort_keys=True, default=sorted).encode()).hexdigest()
+
+
+def text_hash(text: str) -> str:
+    """Synopsis: Hash of the mined text"""
+    return hashlib.sha1(text.encode()).hexdigest()
 
 
 class MineData:
     """Synopsis: MineData class is dedicated to data mining
     Input: input table with all the relevant texts (abstracts/body texts)
     Output: csv tables with all the mined data"""
-    def __init__(self, input_table: str, mv_out: str, taxa_out: str) -> None:
-        store_attr('input_table, mv_out, taxa_out')
+    def __init__(self,
+                 input_table: str,
+                 mv_out: str,
+                 taxa_out: str,
+                 batch_size: int = 256,
+                 workers: int = 1,
+                 cache_dir: Optional[str] = None,
+                 cache_size: int = DOC_CACHE_SIZE,
+                 incremental: bool = False,
+                 core_model: str = 'en_core_sci_sm',
+                 paragraphs: bool = False,
+                 section_filters: Optional[Dict[str,
+                                                'SectionFilter']] = None,
+                 chunk_size: Optional[int] = None) -> None:
+        if incremental and chunk_size:
+            raise ValueError("Incremental mining reads the whole table, "
+                             "chunk_size is not supported")
+        store_attr('input_table, mv_out, taxa_out, batch_size, workers, '
+                   'cache_dir, cache_size, incremental, core_model, '
+                   'paragraphs, chunk_size')
+        # Section filters '{prefix (or domain): SectionFilter}'
+        self.section_filters = section_filters or dict()
 
     @property
     def load_mining(self) -> None:
         """Synopsis: Init ExtractData class to prepare mining methods"""
-        self.record = ExtractData(self.input_table, self.mv_out, self.taxa_out)
+        self.record = ExtractData(self.input_table,
+                                  self.mv_out,
+                                  self.taxa_out,
+                                  core_model=self.core_model,
+                                  batch_size=self.batch_size,
+                                  workers=self.workers,
+                                  cache_dir=self.cache_dir,
+                                  cache_size=self.cache_size,
+                                  paragraphs=self.paragraphs)
         # Init dataclasses w/ terminology to search for
         self.chemistry = SynChemDict().chemistry
         self.geology = SynGeoDict().geology
@@ -28,8 +125,8 @@ class MineData:
                                                       List]) -> pd.DataFrame:
         """Dependency: Helper for mining_pipeline method
         Synopsis: Mine non-taxonomic data"""
-        # Read table with text
-        table = self.record.read_table
+        # Read s2orc ids and texts (once per level)
+        table = self.record.read_text(level)
         # Get abstract or whole article to analyze
         self.record.get_data(table, level)
         # Extract mud volcano specific data
@@ -45,12 +142,192 @@ class MineData:
         ]
         return self.record.merge_dfs(*s2orc_dfs)
 
+    def mine_all_data(
+        self,
+        level: str,
+        terminologies: Dict[str, Dict[str, List]],
+        s2orc_ids: Optional[Set[str]] = None) -> Dict[str, pd.DataFrame]:
+        """Dependency: Helper for mine_chemical_data method
+        Synopsis: Mine non-taxonomic data for all the terminologies
+        in a single pass over the texts (of the s2orc_ids, if given)"""
+        return {
+            prefix: matrix.to_frame()
+            for prefix, matrix in self.count_all_data(
+                level, terminologies, s2orc_ids).items()
+        }
+
+    def count_all_data(
+        self,
+        level: str,
+        terminologies: Dict[str, Dict[str, List]],
+        s2orc_ids: Optional[Set[str]] = None) -> Dict[str, TermMatrix]:
+        """Synopsis: Same as mine_all_data method, but return document x
+        term count matrices (rows sorted by s2orc_id)"""
+        mined: Dict[str, TermMatrix] = dict()
+        # One pass per section filter (all categories at once)
+        for section_filter, prefixes in self._filter_groups(terminologies,
+                                                            level):
+            # Read s2orc ids and texts (once per level)
+            table = self._select_texts(level, s2orc_ids, section_filter)
+            # Get abstract or whole article to analyze
+            self.record.get_data(table, level)
+            # Count mud volcano specific data
+            mined.update(
+                self.record.count_mv_data(
+                    {prefix: terminologies[prefix]
+                     for prefix in prefixes}))
+        return {prefix: mined[prefix].sort_rows() for prefix in terminologies}
+
+    def mine_all_taxonomy(
+            self,
+            level: str,
+            domains: List[str],
+            s2orc_ids: Optional[Set[str]] = None) -> Dict[str, pd.DataFrame]:
+        """Dependency: Helper for mine_all_taxonomic_data method
+        Synopsis: Mine taxonomic data of all the domains and ranks
+        in a single pass over the texts (of the s2orc_ids, if given)"""
+        return {
+            domain: matrix.to_frame()
+            for domain, matrix in self.count_all_taxonomy(
+                level, domains, s2orc_ids).items()
+        }
+
+    def count_all_taxonomy(
+            self,
+            level: str,
+            domains: List[str],
+            s2orc_ids: Optional[Set[str]] = None) -> Dict[str, TermMatrix]:
+        """Synopsis: Same as mine_all_taxonomy method, but return document
+        x taxon count matrices (rows sorted by s2orc_id)"""
+        mined: Dict[str, TermMatrix] = dict()
+        # One pass per section filter (all domains and ranks at once)
+        for section_filter, group in self._filter_groups(domains, level):
+            # Read s2orc ids and texts (once per level)
+            table = self._select_texts(level, s2orc_ids, section_filter)
+            # Get abstract or whole article to analyze
+            self.record.get_data(table, level)
+            # Count taxonomy
+            mined.update(self.record.count_taxonomy(group, TAXA_RANKS))
+        return {domain: mined[domain].sort_rows() for domain in domains}
+
+    def _select_texts(
+            self,
+            level: str,
+            s2orc_ids: Optional[Set[str]],
+            section_filter: Optional['SectionFilter'] = None
+    ) -> pd.DataFrame:
+        """Dependency: Helper for mine_all_* methods
+        Synopsis: Texts of the level, restricted to the s2orc_ids (and to
+        the paragraphs selected by the section filter)"""
+        table = self.record.read_text(level)
+        if section_filter is not None:
+            table = select_sections(table, level, self._read_sections(),
+                                    section_filter)
+        if s2orc_ids is None:
+            return table
+        return table[table['s2orc_id'].astype(str).isin(s2orc_ids)]
+
+    def _read_sections(self) -> Optional[pd.Series]:
+        """Dependency: Helper for _select_texts method
+        Synopsis: Section names of the body texts (None for the tables
+        tabulated without them)"""
+        try:
+            return self.record.read_text(SECTIONS_COLUMN)[SECTIONS_COLUMN]
+        except (KeyError, ValueError):
+            return None
+
+    def _filter_groups(
+        self, prefixes: Iterable[str], level: str
+    ) -> List[Tuple[Optional['SectionFilter'], List[str]]]:
+        """Dependency: Helper for count_all_* and mine_batches methods
+        Synopsis: Group terminology prefixes (domains) by their section
+        filter, so the texts are read and tokenized once per filter;
+        section names describe the body text only, so the filters of
+        the other levels are ignored (with a warning)
+        Output: List of (section filter or None, prefixes)"""
+        prefixes = list(prefixes)
+        filtered = [p for p in prefixes if p in self.section_filters]
+        if filtered and level != 'text':
+            typer.secho(
+                f"Section filters ({', '.join(filtered)}) apply to the "
+                f"body text only, {level} is mined unfiltered",
+                fg=typer.colors.RED)
+            return [(None, prefixes)]
+        groups: Dict[str, Tuple[Optional[SectionFilter], List[str]]] = dict()
+        for prefix in prefixes:
+            section_filter = self.section_filters.get(prefix)
+            key = json.dumps(section_filter.setup if section_filter else None)
+            groups.setdefault(key, (section_filter, []))[1].append(prefix)
+        return list(groups.values())
+
+    def _section_setup(self, prefix: str) -> Optional[Dict[str, List[str]]]:
+        """Dependency: Helper for mine_incremental method
+        Synopsis: Section filter of the prefix (part of the fingerprint)"""
+        section_filter = self.section_filters.get(prefix)
+        return section_filter.setup if section_filter else None
+
+    def mine_incremental(
+        self, level: str, setups: Dict[str, Any], file_names: Dict[str, str],
+        output_file: str, mine: Callable[[Optional[Set[str]]],
+                                         Dict[str, TermMatrix]]
+    ) -> None:
+        """Synopsis: Mine only the new or changed texts and merge them
+        into the existing output tables; a table is rebuilt from scratch
+        when its mining setup (level, terminology, model) has changed
+        Input: Dicts '{prefix: terminology}' and '{prefix: file_name}',
+        counting function of the s2orc_ids (e.g. count_all_data)"""
+        table = self.record.read_text(level)[['s2orc_id', level]].dropna()
+        texts = {
+            str(s2orc_id): text_hash(text)
+            for s2orc_id, text in zip(table['s2orc_id'], table[level])
+        }
+        model_id = self.record.model_id
+        prints, mined_texts, to_mine = dict(), dict(), set()
+        for prefix, file_name in file_names.items():
+            output_table = pathlib.Path(output_file).with_name(file_name +
+                                                               '.csv')
+            prints[prefix] = fingerprint(level, setups[prefix], model_id,
+                                         self.paragraphs,
+                                         self._section_setup(prefix))
+            mined_texts[prefix] = MiningManifest(output_table).load(
+                prints[prefix])
+            known = mined_texts[prefix] or dict()
+            to_mine |= {
+                s2orc_id
+                for s2orc_id, hashed in texts.items()
+                if known.get(s2orc_id) != hashed
+            }
+        header = typer.style('Texts to mine (new / changed): ', bold=True)
+        typer.echo(header + typer.style(f"{len(to_mine)} / {len(texts)}",
+                                        fg=typer.colors.GREEN,
+                                        bold=True))
+        mined = mine(to_mine) if to_mine else dict()
+        for prefix, file_name in file_names.items():
+            output_table = pathlib.Path(output_file).with_name(file_name +
+                                                               '.csv')
+            manifest = MiningManifest(output_table)
+            matrices = [mined[prefix]] if prefix in mined else []
+            if mined_texts[prefix] is not None:
+                # Keep the rows, which are neither re-mined nor removed
+                kept = TermMatrix.load(manifest.matrix_file)
+                keep = set(texts) - to_mine
+                matrices.append(
+                    kept.select([
+                        str(s2orc_id) in keep for s2orc_id in kept.s2orc_ids
+                    ]))
+            if not matrices:
+                continue
+            self.write_mined(
+                TermMatrix.stack(matrices).sort_rows(), file_name,
+                output_file)
+            manifest.save(prints[prefix], texts)
+
     def mine_taxonomy(self, taxa_rank: str, level: str,
                       domain: str) -> pd.DataFrame:
         """Dependency: Helper for mine_taxonomic_data methods
         Synopsis: Mine taxonomic data"""
-        # Read table with text
-        table = self.record.read_table
+        # Read s2orc ids and texts (once per level)
+        table = self.record.read_text(level)
         # Get abstract or whole article to analyze
         self.record.get_data(table, level)
         # Mine taxonomy
@@ -65,6 +342,13 @@ class MineData:
         Synopsis: Export mined dataframes to csv table"""
         df.to_csv(pathlib.Path(output_file).with_name(prefix + ".csv"))
 
+    def write_mined(self, matrix: TermMatrix, prefix: str,
+                    output_file: str) -> None:
+        """Synopsis: Export document x term count matrix to npz file
+        and its rendering to csv table"""
+        matrix.save(pathlib.Path(output_file).with_name(prefix + ".npz"))
+        self.write_data(matrix.to_frame(), prefix, output_file)
+
     # Combine mine_data & write_data functions
     def mining_pipeline(self, level: str, terminology: Dict[str, List],
                         file_name: str, output_file: str):
@@ -72,16 +356,55 @@ class MineData:
         self.write_data(self.mine_data(level, terminology), file_name,
                         output_file)
 
+    @property
+    def chemical_terminologies(self) -> Dict[str, Dict[str, List]]:
+        """Synopsis: Terminologies of mine_chemical_data method
+        Output: Dict '{prefix: terminology}'"""
+        return {
+            'chemistry': self.chemistry,
+            'geology': self.geology,
+            'mv': self.mud_volcano,
+            'methods': self.methods
+        }
+
     def mine_chemical_data(self, text_type: str):
         """Synopsis: Mine chemical & mud volcano relevant data"""
-        self.mining_pipeline(text_type, self.chemistry, 'chemistry',
-                             self.mv_out)
-        self.mining_pipeline(text_type, self.geology, 'geology',
-                             self.mv_out)
-        self.mining_pipeline(text_type, self.mud_volcano, 'mv',
-                             self.mv_out)
-        self.mining_pipeline(text_type, self.methods, 'methods',
-                             self.mv_out)
+        terminologies = self.chemical_terminologies
+        if self.incremental:
+            self.mine_incremental(
+                text_type, terminologies, {p: p
+                                           for p in terminologies},
+                self.mv_out,
+                lambda ids: self.count_all_data(text_type, terminologies, ids))
+            return
+        if self.chunk_size:
+            self.mine_batches(
+                self.record.iter_text(text_type, self.chunk_size), text_type,
+                terminologies, dict())
+            return
+        for prefix, matrix in self.count_all_data(text_type,
+                                                  terminologies).items():
+            self.write_mined(matrix, prefix, self.mv_out)
+
+    @property
+    def mining_progress(self) -> Tuple[int, float]:
+        """Synopsis: Docs mined and seconds spent mining so far"""
+        return self.record.docs_mined, self.record.mining_seconds
+
+    def mining_stats(self, since: Tuple[int, float]) -> Dict[str, float]:
+        """Synopsis: Docs mined and docs/sec since the mining_progress
+        snapshot (e.g. of a mining category)
+        Output: Dict '{records, docs_per_sec}'"""
+        docs, seconds = (now - before
+                         for now, before in zip(self.mining_progress, since))
+        return {
+            'records': docs,
+            'docs_per_sec': round(docs / seconds, 2) if seconds else 0.0
+        }
+
+    def finish_mining(self) -> None:
+        """Synopsis: Trim the token cache and report its hits / misses"""
+        self.record.close_cache()
 
     def mine_taxonomic_data(self, text_type: str, org_domain: str,
                             type_prefix: str):
@@ -111,3 +434,239 @@ class MineData:
         # Write dataframes to file
         self.write_data(self.record.merge_dfs(*taxa_result), type_prefix,
                         self.taxa_out)
+
+    def mine_all_taxonomic_data(self, text_type: str, prefixes: Dict[str,
+                                                                      str]):
+        """Synopsis: Mine taxonomic data of several domains at once and
+        write to csv tables
+        Input: Dict '{domain: type_prefix}'
+        e.g. {'Bacteria': 'art_bacteria', 'Archaea': 'art_archaea'}"""
+        if self.incremental:
+            tax_class = SynTaxaDict().taxonomy.get('tax')
+            setups = {
+                domain: {
+                    taxa_rank: tax_class.get_lexicon(domain, taxa_rank)
+                    for taxa_rank in TAXA_RANKS
+                }
+                for domain in prefixes
+            }
+            self.mine_incremental(
+                text_type, setups, prefixes, self.taxa_out,
+                lambda ids: self.count_all_taxonomy(text_type, list(prefixes),
+                                                    ids))
+            return
+        if self.chunk_size:
+            self.mine_batches(
+                self.record.iter_text(text_type, self.chunk_size), text_type,
+                dict(), prefixes)
+            return
+        taxa_result = self.count_all_taxonomy(text_type, list(prefixes))
+        for domain, matrix in taxa_result.items():
+            self.write_mined(matrix, prefixes[domain], self.taxa_out)
+
+    def mine_stream(self, batches: Iterable[pd.DataFrame], level: str,
+                    prefixes: Dict[str, str]) -> int:
+        """Synopsis: Mine batches of texts as they arrive (streaming
+        pipeline) and write the same tables as mine_chemical_data and
+        mine_all_taxonomic_data methods once the batches run out; the
+        matchers are built once, only the count matrices are kept
+        Input: batches of the input table (s2orc_id and level columns,
+        s2orc_id as read by read_batch), Dict '{domain: type_prefix}'
+        Output: # mined texts"""
+        return self.mine_batches(batches, level, self.chemical_terminologies,
+                                 prefixes)
+
+    def write_merged(self, runs: List[MatrixRun], prefix: str,
+                     output_file: str) -> None:
+        """Dependency: Helper for mine_batches method
+        Synopsis: Export the merged runs (see merge_runs function) to npz
+        file and csv table, as write_mined does, one block of rows at a
+        time"""
+        categories = runs[0].read('categories').tolist()
+        terms, blocks = merge_runs(runs, categories)
+        path = pathlib.Path(output_file)
+        with MatrixWriter(path.with_name(prefix + ".npz"), terms,
+                          categories) as writer, \
+                open(path.with_name(prefix + ".csv"), 'w',
+                     newline='') as table:
+            n_rows = 0
+            for block in blocks:
+                writer.append(block)
+                df = block.to_frame()
+                df.index = pd.RangeIndex(n_rows, n_rows + len(df))
+                df.to_csv(table, header=n_rows == 0)
+                n_rows += len(df)
+
+    def mine_batches(self, batches: Iterable[pd.DataFrame], level: str,
+                     terminologies: Dict[str, Dict[str, List]],
+                     prefixes: Dict[str, str]) -> int:
+        """Dependency: Helper for mine_stream method and chunked mining
+        (chunk_size) of mine_chemical_data and mine_all_taxonomic_data
+        methods
+        Synopsis: Mine the batches one by one with the matchers (and the
+        worker pool) set up once; the count matrices of every batch are
+        spilled to runs (see MatrixRun class), then merged into the tables
+        of the terminologies and domains, one block of rows at a time
+        Input: batches of the input table (see mine_stream method),
+        Dict '{prefix: terminology}', Dict '{domain: type_prefix}'
+        Output: # mined texts"""
+        taxonomy = self.record.taxonomy_terminologies(list(prefixes),
+                                                      TAXA_RANKS)
+        # Terminologies, lowercase matching, section filter and matcher
+        # of every pass over a batch
+        setups = []
+        # (taxonomy is matched case-sensitively, token by token)
+        for all_terms, lower, multi_token in ((terminologies, True, True),
+                                              (taxonomy, False, False)):
+            for section_filter, group in self._filter_groups(all_terms, level):
+                terms = {prefix: all_terms[prefix] for prefix in group}
+                setups.append((terms, lower, section_filter,
+                               self.record.build_matcher(
+                                   terms, lower, multi_token)))
+        outputs = {prefix: (prefix, self.mv_out) for prefix in terminologies}
+        outputs.update({
+            domain: (type_prefix, self.taxa_out)
+            for domain, type_prefix in prefixes.items()
+        })
+        spilled: Dict[str, List[MatrixRun]] = defaultdict(list)
+        n_texts, empty = 0, pd.DataFrame(columns=['s2orc_id', level])
+        with tempfile.TemporaryDirectory() as tmp_dir, \
+                self.record.worker_pool([setup[-1] for setup in setups]):
+            # Without any batch, the empty batch still writes (empty) tables
+            for batch in chain(batches, [empty]):
+                if spilled and batch is empty:
+                    continue
+                n_texts += len(batch[[level, 's2orc_id']].dropna())
+                for terms, lower, section_filter, matcher in setups:
+                    self.record.get_data(
+                        select_sections(batch, level,
+                                        batch.get(SECTIONS_COLUMN),
+                                        section_filter), level)
+                    for prefix, matrix in self.record.count_terms(
+                            terms, lower, matcher).items():
+                        spilled[prefix].append(
+                            MatrixRun.spill(
+                                matrix,
+                                pathlib.Path(
+                                    tmp_dir,
+                                    f"{prefix}-{len(spilled[prefix])}")))
+            for prefix, (file_name, output_file) in outputs.items():
+                convert = ids_converter(spilled[prefix])
+                for run in spilled[prefix]:
+                    run.sort(convert)
+                self.write_merged(spilled[prefix], file_name, output_file)
+        return n_texts
+
+
+def read_batch(csv_text: str, level: str) -> pd.DataFrame:
+    """Synopsis: Read s2orc_id, level (and sections) columns of csv table
+    text (with header) as read_text method does, s2orc_ids are kept as
+    str until infer_ids (dtype inference of a batch can differ from the
+    table's)"""
+    return pd.read_csv(
+        io.StringIO(csv_text),
+        usecols=lambda column: column in {'s2orc_id', level, SECTIONS_COLUMN},
+        dtype={'s2orc_id': str})
+
+
+def infer_ids(s2orc_ids: Iterable[str]) -> Any:
+    """Synopsis: s2orc_ids (str) of all the batches converted to the
+    dtype pandas infers for the s2orc_id column of the whole table"""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer, lineterminator='\n')
+    writer.writerow(['s2orc_id'])
+    writer.writerows([s2orc_id] for s2orc_id in s2orc_ids)
+    buffer.seek(0)
+    return pd.read_csv(buffer)['s2orc_id'].to_numpy()
+
+
+def ids_converter(runs: List[MatrixRun]) -> Callable[[Any], Any]:
+    """Synopsis: Function converting the s2orc_ids (str) of a run to the
+    dtype pandas infers for the s2orc_id column of the whole table (see
+    infer_ids function), with the ids of a single run in memory at a time
+    Input: runs of the batches"""
+    kinds = {
+        infer_ids(s2orc_ids).dtype.kind
+        for s2orc_ids in (run.read('s2orc_ids') for run in runs)
+        if len(s2orc_ids)
+    }
+    if len(kinds) == 1 and kinds != {'O'}:
+        return infer_ids
+    if kinds <= {'i', 'f'}:
+        return lambda s2orc_ids: s2orc_ids.astype(float)
+    return lambda s2orc_ids: s2orc_ids.astype(str)
+
+
+class SectionFilter:
+    """Synopsis: SectionFilter class is dedicated to the selection of the
+    body text paragraphs by their S2ORC section names (case-insensitive
+    substrings, e.g. 'method' selects 'Materials and Methods')
+    Input: section names to include (all the sections, if none) and
+    section names to exclude
+    Output: text of the selected paragraphs"""
+    def __init__(self,
+                 include: Iterable[str] = (),
+                 exclude: Iterable[str] = ()) -> None:
+        self.include = sorted({name.lower() for name in include})
+        self.exclude = sorted({name.lower() for name in exclude})
+
+    @property
+    def setup(self) -> Dict[str, List[str]]:
+        """Synopsis: Included and excluded section names"""
+        return {'include': self.include, 'exclude': self.exclude}
+
+    def selects(self, section: str) -> bool:
+        """Synopsis: Whether the paragraphs of the section are selected
+        (unknown sections only if no section is explicitly included)"""
+        section = section.lower()
+        if any(name in section for name in self.exclude):
+            return False
+        return not self.include or any(name in section
+                                       for name in self.include)
+
+    def select(self, text: Any, sections: Any) -> Any:
+        """Synopsis: Join the selected paragraphs of the text (missing
+        texts stay missing)
+        Input: text and its section names (see paragraph_sections)"""
+        if not isinstance(text, str):
+            return text
+        return PARAGRAPH_SEPARATOR.join(
+            paragraph for paragraph, section in paragraph_sections(
+                text, sections) if self.selects(section))
+
+
+def parse_section_filter(spec: str) -> Tuple[str, SectionFilter]:
+    """Synopsis: Parse section filter of the command line,
+    'prefix:section,!section' e.g. 'methods:method,result' or
+    'Bacteria:!reference' ('!' excludes the section)
+    Output: Tuple (prefix or domain, SectionFilter)"""
+    prefix, _, names = spec.partition(':')
+    names_list = [name.strip() for name in names.split(',') if name.strip()]
+    if not prefix or not names_list:
+        raise ValueError(f"Invalid section filter: {spec}")
+    if prefix not in FILTER_PREFIXES:
+        raise ValueError(f"Unknown section filter prefix: {prefix} "
+                         f"(one of {', '.join(FILTER_PREFIXES)})")
+    return prefix, SectionFilter(
+        [name for name in names_list if not name.startswith('!')],
+        [name[1:] for name in names_list if name.startswith('!')])
+
+
+def select_sections(table: pd.DataFrame, level: str, sections: Any,
+                    section_filter: Optional[SectionFilter]) -> pd.DataFrame:
+    """Synopsis: Restrict the body texts (level 'text') of the table to
+    the paragraphs selected by the section filter
+    Input: table with s2orc_id and level columns, section names of the
+    texts (aligned with the table rows, None if unknown)"""
+    # Section names describe the paragraphs of the body text only
+    if section_filter is None or level != 'text':
+        return table
+    if sections is None:
+        sections = [None] * len(table)
+    return table.assign(
+        **{
+            level: [
+                section_filter.select(text, names)
+                for text, names in zip(table[level], sections)
+            ]
+        })
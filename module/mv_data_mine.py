@@ -1,12 +1,88 @@
-from typing import List, Dict, Generator, Any
+from typing import List, Dict, Generator, Iterable, Any, Optional, Tuple
 from functools import reduce
-from collections import Counter
+from collections import Counter, defaultdict
+from contextlib import contextmanager
+from itertools import islice
 from .get_dict_terms import SynTaxaDict  # tope: ignore
+from .tabulate_data import SECTIONS_COLUMN, table_format
+from .extract_data import split_paragraphs
+from .doc_cache import DocCache, DOC_CACHE_SIZE
+from .doc_cache import deserialize_doc, serialize_doc
+from .term_matrix import TermMatrix
 from fastcore.utils import store_attr  # type: ignore
 from numpy import nan as NA  # type: ignore
 import typer  # type: ignore
 import pandas as pd  # type: ignore
+from multiprocessing import Pool
 import spacy  # type: ignore
+import math
+import time
+
+try:
+    # Optional, needed for the columnar (parquet / arrow) input tables
+    import pyarrow.feather as feather  # type: ignore
+    import pyarrow.parquet as parquet  # type: ignore
+except ImportError:
+    feather = parquet = None
+
+# Pipeline components, which are not needed for token matching
+DISABLED_PIPES = [
+    'tok2vec', 'tagger', 'parser', 'attribute_ruler', 'lemmatizer', 'ner'
+]
+# spaCy models loaded in the current process '{core_model: nlp}'
+LOADED_MODELS: Dict[str, Any] = dict()
+# State of the mining worker process '{record: ExtractData, matchers: ...}'
+WORKER_STATE: Dict[str, Any] = dict()
+# Number of shards per worker, smaller shards balance the load better
+SHARDS_PER_WORKER = 4
+# Trie key marking the end of a term
+TERM_END = None
+
+
+class TermMatcher:
+    """Synopsis: TermMatcher class is dedicated to matching single and
+    multi-token terms (e.g. 'western blot') in one linear pass per text
+    Input: terms split into tokens by the same tokenizer as the texts
+    Output: Dict '{(prefix, data_category): [matched terms]}'"""
+    def __init__(self, lower: bool = True) -> None:
+        self.lower = lower
+        # Token trie '{token: {token: ... {TERM_END: (term, categories)}}}'
+        self.trie: Dict[Any, Any] = dict()
+
+    def normalize(self, token: str) -> str:
+        """Synopsis: Normalize tokens (terms and texts alike)"""
+        return token.lower() if self.lower else token
+
+    def add(self, tokens: List[str], term: str, category: Tuple[str,
+                                                                str]) -> None:
+        """Synopsis: Add tokenized term of a (prefix, data_category)"""
+        if not tokens:
+            return
+        node = self.trie
+        for token in tokens:
+            node = node.setdefault(self.normalize(token), dict())
+        _, categories = node.setdefault(TERM_END, (term, []))
+        if category not in categories:
+            categories.append(category)
+
+    def match(self, tokens: List[str]) -> Dict[Tuple[str, str], List[str]]:
+        """Synopsis: Find all the terms (overlapping ones included)
+        in the token sequence and route them to their categories"""
+        hits: Dict[Tuple[str, str], List[str]] = defaultdict(list)
+        tokens = [self.normalize(token) for token in tokens]
+        for start in range(len(tokens)):
+            node = self.trie.get(tokens[start])
+            end = start + 1
+            while node is not None:
+                if TERM_END in node:
+                    term, categories = node[TERM_END]
+                    for category in categories:
+                        hits[category].append(term)
+                if end == len(tokens):
+                    break
+                node = node.get(tokens[end])
+                end += 1
+        return dict(hits)
 
 
 class ExtractData:
@@ -21,8 +97,105 @@ class ExtractData:
         mv_output: str,
         taxa_output: str,
         core_model: str = "en_core_sci_sm",
+        batch_size: int = 256,
+        workers: int = 1,
+        cache_dir: Optional[str] = None,
+        cache_size: int = DOC_CACHE_SIZE,
+        paragraphs: bool = False,
     ) -> None:
-        store_attr("input_table, mv_output, taxa_output, core_model")
+        store_attr("input_table, mv_output, taxa_output, core_model, "
+                   "batch_size, workers, paragraphs")
+        self.docs_per_sec = 0.0
+        # Docs mined and seconds spent mining by the instance (all runs)
+        self.docs_mined, self.mining_seconds = 0, 0.0
+        # On-disk cache of the tokenized texts (None: no caching)
+        self.doc_cache = DocCache(cache_dir,
+                                  cache_size) if cache_dir else None
+        # Text columns read from the input table '{query: dataframe}'
+        self.text_tables: Dict[str, pd.DataFrame] = dict()
+        # Worker pool kept open by worker_pool and its matchers
+        self.pool: Optional[Any] = None
+        self.pool_matchers: List[TermMatcher] = []
+
+    @property
+    def nlp(self) -> Any:
+        """Synopsis: Load spaCy model once per process, keeping only
+        the tokenizer (parser, NER, etc. are disabled)"""
+        if self.core_model not in LOADED_MODELS:
+            LOADED_MODELS[self.core_model] = spacy.load(
+                self.core_model, disable=DISABLED_PIPES)
+        return LOADED_MODELS[self.core_model]
+
+    def stream_docs(self,
+                    texts: Iterable[str],
+                    report: bool = True) -> Generator[Any, None, None]:
+        """Synopsis: Stream texts through nlp.pipe in batches
+        and record mining throughput (docs/sec)"""
+        start, docs_count = time.perf_counter(), 0
+        docs = (self._cached_docs(texts) if self.doc_cache else
+                self.nlp.pipe(texts, batch_size=self.batch_size))
+        for doc in docs:
+            docs_count += 1
+            yield doc
+        self._record_speed(docs_count, time.perf_counter() - start, report)
+
+    @property
+    def model_id(self) -> str:
+        """Synopsis: Name and version of the spaCy model (and spaCy),
+        which tokenized the texts"""
+        meta = self.nlp.meta
+        return (f"{meta.get('lang')}_{meta.get('name')}-"
+                f"{meta.get('version')}/spacy-{spacy.__version__}")
+
+    def _cached_docs(self, texts: Iterable[str]) -> Generator[Any, None, None]:
+        """Dependency: Helper for stream_docs method
+        Synopsis: Restore cached docs and tokenize (and cache) only the
+        texts missing from the cache, batch by batch in the input order"""
+        texts = iter(texts)
+        model_id = self.model_id
+        while True:
+            batch = list(islice(texts, self.batch_size))
+            if not batch:
+                return
+            keys = [self.doc_cache.key(text, model_id) for text in batch]
+            cached = self.doc_cache.get_many(keys)
+            missing = {
+                key: text
+                for key, text in zip(keys, batch) if key not in cached
+            }
+            new_docs = dict(
+                zip(missing,
+                    self.nlp.pipe(missing.values(),
+                                  batch_size=self.batch_size)))
+            self.doc_cache.put_many(
+                {key: serialize_doc(doc)
+                 for key, doc in new_docs.items()})
+            for key in keys:
+                yield new_docs[key] if key in new_docs else deserialize_doc(
+                    cached[key], self.nlp.vocab)
+
+    def close_cache(self) -> None:
+        """Synopsis: Evict the least recently used docs beyond the cache
+        size and report cache hits / misses of the run"""
+        if self.doc_cache is None:
+            return
+        self.doc_cache.report(self.doc_cache.evict())
+        self.doc_cache.close()
+
+    def _record_speed(self, docs_count: int, elapsed: float,
+                      report: bool) -> None:
+        """Dependency: Helper for stream_docs and match_texts methods
+        Synopsis: Record (and report) mining throughput"""
+        self.docs_per_sec = docs_count / elapsed if elapsed else 0.0
+        self.docs_mined += docs_count
+        self.mining_seconds += elapsed
+        if not report:
+            return
+        header = typer.style('Docs/sec: ', bold=True)
+        speed = typer.style(f"{self.docs_per_sec:.1f}",
+                            fg=typer.colors.GREEN,
+                            bold=True)
+        typer.echo(header + speed)
 
     @property
     def read_table(self) -> pd.DataFrame:
@@ -31,6 +204,65 @@ class ExtractData:
         raw_table: pd.DataFrame = pd.read_csv(self.input_table)
         return raw_table
 
+    def read_text(self, query: str) -> pd.DataFrame:
+        """Synopsis: Read only s2orc_id and text column of interest
+        (abstract or text) of the input table, once per ExtractData;
+        parquet / arrow tables are memory-mapped
+        Output: dataframe with the query and s2orc_id columns"""
+        if query not in self.text_tables:
+            columns = ['s2orc_id', query]
+            fmt = table_format(self.input_table)
+            if fmt == 'csv':
+                table = pd.read_csv(self.input_table, usecols=columns)
+            else:
+                if feather is None:
+                    raise ImportError(
+                        f"pyarrow is required to read {fmt} tables")
+                reader = parquet if fmt == 'parquet' else feather
+                table = reader.read_table(self.input_table,
+                                          columns=columns,
+                                          memory_map=True).to_pandas()
+                # Empty texts are missing values in csv tables too
+                table[query] = table[query].replace('', NA)
+            self.text_tables[query] = table[columns]
+        return self.text_tables[query]
+
+    def iter_text(self, query: str,
+                  chunk_size: int) -> Generator[pd.DataFrame, None, None]:
+        """Synopsis: Read s2orc_id and text column of interest (and the
+        section names, if tabulated) of the input table in chunks of
+        chunk_size rows, so only a chunk of texts is held in memory;
+        s2orc_ids are str (see mine_data_pipeline.read_batch)
+        Output: Generator of dataframes with the query and s2orc_id
+        columns"""
+        wanted = {'s2orc_id', query, SECTIONS_COLUMN}
+        fmt = table_format(self.input_table)
+        if fmt == 'csv':
+            yield from pd.read_csv(self.input_table,
+                                   usecols=lambda column: column in wanted,
+                                   dtype={'s2orc_id': str},
+                                   chunksize=chunk_size)
+            return
+        if feather is None:
+            raise ImportError(f"pyarrow is required to read {fmt} tables")
+        if fmt == 'parquet':
+            table_file = parquet.ParquetFile(self.input_table,
+                                             memory_map=True)
+            columns = [c for c in table_file.schema_arrow.names if c in wanted]
+            batches = table_file.iter_batches(batch_size=chunk_size,
+                                              columns=columns)
+        else:
+            table = feather.read_table(self.input_table, memory_map=True)
+            columns = [c for c in table.column_names if c in wanted]
+            batches = table.select(columns).to_batches(
+                max_chunksize=chunk_size)
+        for batch in batches:
+            chunk = batch.to_pandas()
+            chunk['s2orc_id'] = chunk['s2orc_id'].astype(str)
+            # Empty texts are missing values in csv tables too
+            chunk[query] = chunk[query].replace('', NA)
+            yield chunk
+
     def get_data(self, raw_table: pd.DataFrame, query: str):
         """Synopsis: Read text (abstract or body text)
         Input: dataframe with all the relevant fields of interest
@@ -61,9 +293,17 @@ class ExtractData:
                                    fg=typer.colors.GREEN,
                                    bold=True)
         typer.echo(start + taxa_message)
-        for text in self.texts:
-            yield self._build_dict(self._extract_taxa(text, taxa_rank, domain),
-                                   taxa_rank)
+        tax_class = SynTaxaDict().taxonomy.get('tax')
+        # 'bacterium' is not a taxon
+        taxonomy = sorted(tax_class.get_lexicon(domain, taxa_rank) -
+                          {'bacterium'})
+        matcher = self.build_matcher({domain: {taxa_rank: taxonomy}},
+                                     lower=False,
+                                     multi_token=False)
+        for doc in self.stream_docs(self.texts):
+            yield self._build_dict(
+                self._match_tokens(doc, matcher).get((domain, taxa_rank), []),
+                taxa_rank)
 
     def get_mv_data(
             self, terminology_list: List[str],
@@ -78,29 +318,247 @@ class ExtractData:
                                    bold=True,
                                    blink=True)
         typer.echo(start + data_message)
-        for text in self.texts:
+        matcher = self.build_matcher({'mv': {dict_key: terminology_list}})
+        for doc in self.stream_docs(self.texts):
             yield self._build_dict(
-                self._extract_mv_data(text, terminology_list), dict_key)
+                self._match_tokens(doc, matcher).get(('mv', dict_key), []),
+                dict_key)
+
+    def get_all_mv_data(
+        self, terminologies: Dict[str, Dict[str, List[str]]]
+    ) -> Dict[str, Dict[str, List[Dict[str, List[str]]]]]:
+        """Synopsis: Mine all the mud volcano data (chemical / geological /
+        other) from selected texts, parsing each text only once
+        Input: Dict '{prefix: terminology_dict}'
+        e.g. {'chemistry': SynChemDict().chemistry}
+        Output: Dict '{prefix: {data_category: [dict per text]}}'"""
+        self._echo_mining('Extracting mud volcano data: ', terminologies)
+        return self._mine_all(terminologies, lower=True)
+
+    def count_mv_data(
+            self, terminologies: Dict[str,
+                                      Dict[str,
+                                           List[str]]]) -> Dict[str, Any]:
+        """Synopsis: Same as get_all_mv_data method, but count the terms
+        into document x term matrices
+        Output: Dict '{prefix: TermMatrix}'"""
+        self._echo_mining('Extracting mud volcano data: ', terminologies)
+        return self.count_terms(terminologies, lower=True)
+
+    def get_all_taxonomy(
+        self, domains: List[str], taxa_ranks: List[str]
+    ) -> Dict[str, Dict[str, List[Dict[str, List[str]]]]]:
+        """Synopsis: Mine taxonomic data of all the domains and ranks
+        from selected texts, parsing each text only once
+        Output: Dict '{domain: {taxonomic_rank: [dict per text]}}'"""
+        self._echo_mining('Extracting taxonomy: ', domains + taxa_ranks)
+        terminologies = self.taxonomy_terminologies(domains, taxa_ranks)
+        return self._mine_all(terminologies, lower=False, multi_token=False)
 
-    def _extract_taxa(self, text: str, taxa_rank: str,
-                      domain: str) -> List[str]:
-        """Dependency: Helper get_taxonomy method
-        Synopsis: Extract TAXON tokens from selected texts"""
+    def count_taxonomy(self, domains: List[str],
+                       taxa_ranks: List[str]) -> Dict[str, Any]:
+        """Synopsis: Same as get_all_taxonomy method, but count the taxa
+        into document x term matrices
+        Output: Dict '{domain: TermMatrix}'"""
+        self._echo_mining('Extracting taxonomy: ', domains + taxa_ranks)
+        terminologies = self.taxonomy_terminologies(domains, taxa_ranks)
+        return self.count_terms(terminologies,
+                                lower=False,
+                                multi_token=False)
+
+    def taxonomy_terminologies(
+            self, domains: List[str],
+            taxa_ranks: List[str]) -> Dict[str, Dict[str, List[str]]]:
+        """Synopsis: Taxa names of the domains and ranks
+        Output: Dict '{domain: {taxonomic_rank: [taxa names]}}'"""
         tax_class = SynTaxaDict().taxonomy.get('tax')
-        taxonomy = tax_class.get_descendants(domain, taxa_rank)
-        nlp = spacy.load(self.core_model)
-        doc = nlp(text)
+        # 'bacterium' is not a taxon
+        return {
+            domain: {
+                taxa_rank: sorted(
+                    tax_class.get_lexicon(domain, taxa_rank) - {'bacterium'})
+                for taxa_rank in taxa_ranks
+            }
+            for domain in domains
+        }
+
+    def _echo_mining(self, header: str, names: Iterable[str]) -> None:
+        """Dependency: Helper for get_all_* and count_* methods
+        Synopsis: Report the data categories to mine"""
+        start = typer.style(header, bold=True)
+        message = typer.style(', '.join(names),
+                              fg=typer.colors.GREEN,
+                              bold=True,
+                              blink=True)
+        typer.echo(start + message)
+
+    def count_terms(self,
+                    terminologies: Dict[str, Dict[str, List[str]]],
+                    lower: bool,
+                    matcher: Optional[TermMatcher] = None,
+                    multi_token: bool = True) -> Dict[str, Any]:
+        """Synopsis: Match all the terminologies in one pass and count
+        the hits into a document x term matrix per prefix (matcher built
+        by build_matcher can be reused across batches of texts)
+        Output: Dict '{prefix: TermMatrix}'"""
+        hits = self.match_texts(matcher or self.build_matcher(
+            terminologies, lower, multi_token))
+        return {
+            prefix: TermMatrix.from_hits(
+                self.s2orc_ids,
+                ({key: text_hits.get((prefix, key), [])
+                  for key in terminology} for text_hits in hits),
+                list(terminology))
+            for prefix, terminology in terminologies.items()
+        }
+
+    def _mine_all(
+        self,
+        terminologies: Dict[str, Dict[str, List[str]]],
+        lower: bool,
+        multi_token: bool = True
+    ) -> Dict[str, Dict[str, List[Dict[str, List[str]]]]]:
+        """Dependency: Helper for get_all_mv_data and get_all_taxonomy
+        Synopsis: Match all the terminologies in one pass and map the
+        hits to dicts per text"""
+        matcher = self.build_matcher(terminologies, lower, multi_token)
+        mined: Dict[str, Dict[str, List[Dict[str, List[str]]]]] = {
+            prefix: {key: [] for key in terminology}
+            for prefix, terminology in terminologies.items()
+        }
+        for hits in self.match_texts(matcher):
+            for prefix, categories in mined.items():
+                for key, found in categories.items():
+                    found.append(
+                        self._build_dict(hits.get((prefix, key), []), key))
+        return mined
+
+    def match_texts(
+            self,
+            matcher: TermMatcher) -> List[Dict[Tuple[str, str], List[str]]]:
+        """Dependency: Helper for _mine_all method
+        Synopsis: Match selected texts against the terms, in worker
+        processes when workers > 1. Shards are merged back in the
+        input order, so the output is identical to a single-process run"""
+        if self.workers <= 1:
+            return self.match_units(self.texts, matcher)
+        start = time.perf_counter()
+        index = next((i for i, pool_matcher in enumerate(self.pool_matchers)
+                      if pool_matcher is matcher), None)
+        if index is not None:
+            shards = self.pool.map(_mine_shard,
+                                   [(index, texts)
+                                    for texts in self._split_texts()])
+        else:
+            with self._open_pool([matcher]) as pool:
+                shards = pool.map(_mine_shard,
+                                  [(0, texts)
+                                   for texts in self._split_texts()])
+        # Docs of the workers (paragraphs, if paragraphs=True)
+        self._record_speed(sum(docs for _, docs, _ in shards),
+                           time.perf_counter() - start, True)
+        if self.doc_cache is not None:
+            # Cache hits / misses of the workers
+            self.doc_cache.hits += sum(hits for _, _, (hits, _) in shards)
+            self.doc_cache.misses += sum(misses
+                                         for _, _, (_, misses) in shards)
+        return [hits for shard, _, _ in shards for hits in shard]
+
+    @contextmanager
+    def worker_pool(
+            self, matchers: List[TermMatcher]) -> Generator[None, None, None]:
+        """Synopsis: Keep one pool of worker processes (spaCy model and
+        matchers loaded once) for all the match_texts calls with the
+        matchers in the with block, e.g. over the batches of a stream;
+        no pool with a single worker"""
+        if self.workers <= 1:
+            yield
+            return
+        with self._open_pool(matchers) as pool:
+            self.pool, self.pool_matchers = pool, list(matchers)
+            try:
+                yield
+            finally:
+                self.pool, self.pool_matchers = None, []
+
+    def _open_pool(self, matchers: List[TermMatcher]) -> Any:
+        """Dependency: Helper for match_texts and worker_pool methods
+        Synopsis: Start the worker processes, warmed up with the matchers"""
+        return Pool(self.workers,
+                    initializer=_init_worker,
+                    initargs=(self.core_model, self.batch_size, matchers,
+                              self.doc_cache, self.paragraphs))
+
+    def match_units(
+            self,
+            texts: List[str],
+            matcher: TermMatcher,
+            report: bool = True) -> List[Dict[Tuple[str, str], List[str]]]:
+        """Dependency: Helper for match_texts method and _mine_shard
+        Synopsis: Match the texts, or (paragraphs=True) their paragraphs
+        as independent docs, so a doc is never larger than a paragraph;
+        the hits of the paragraphs are aggregated back per text (in the
+        paragraph order)"""
+        if not self.paragraphs:
+            return [
+                self._match_tokens(doc, matcher)
+                for doc in self.stream_docs(texts, report)
+            ]
+        docs = self.stream_docs(
+            (paragraph for text in texts
+             for paragraph in split_paragraphs(text)), report)
+        hits = []
+        for text in texts:
+            text_hits: Dict[Tuple[str, str], List[str]] = defaultdict(list)
+            for _ in split_paragraphs(text):
+                for category, terms in self._match_tokens(
+                        next(docs), matcher).items():
+                    text_hits[category].extend(terms)
+            hits.append(dict(text_hits))
+        # Run the stream out, so its throughput is recorded
+        for _ in docs:
+            pass
+        return hits
+
+    def _split_texts(self) -> List[List[str]]:
+        """Dependency: Helper for match_texts method
+        Synopsis: Split selected texts into contiguous shards"""
+        shard_size = max(
+            1, math.ceil(len(self.texts) / (self.workers * SHARDS_PER_WORKER)))
         return [
-            token.text for token in doc
-            if token.text != 'bacterium' and token.text in taxonomy
+            self.texts[i:i + shard_size]
+            for i in range(0, len(self.texts), shard_size)
         ]
 
-    def _extract_mv_data(self, text: str, data_list: List[str]) -> List[str]:
-        """Dependency: Helper get_mv_data method
-        Synopsis: Extract relevant tokens from selected texts"""
-        nlp = spacy.load(self.core_model)
-        doc = nlp(text)
-        return [token.text.lower() for token in doc if token.text.lower() in data_list]
+    def build_matcher(self,
+                      terminologies: Dict[str, Dict[str, List[str]]],
+                      lower: bool = True,
+                      multi_token: bool = True) -> TermMatcher:
+        """Synopsis: Compile the terminologies into a TermMatcher, which
+        maps every term to the (prefix, data_category) pairs it belongs to
+        e.g. taxon name to (domain, taxonomic_rank); without multi_token
+        only the single-token terms are matched (taxonomy is matched
+        token by token, e.g. species binomials are not counted)"""
+        matcher = TermMatcher(lower)
+        for prefix, terminology in terminologies.items():
+            for key, terms in terminology.items():
+                terms = list(terms)
+                tokenized = self.nlp.tokenizer.pipe(terms,
+                                                    batch_size=self.batch_size)
+                for term, term_doc in zip(terms, tokenized):
+                    if not multi_token and len(term_doc) > 1:
+                        continue
+                    matcher.add([token.text for token in term_doc], term,
+                                (prefix, key))
+        return matcher
+
+    def _match_tokens(
+            self, doc: Any,
+            matcher: TermMatcher) -> Dict[Tuple[str, str], List[str]]:
+        """Dependency: Helper for get_* and match_texts methods
+        Synopsis: Route relevant tokens to their (prefix, data_category)"""
+        return matcher.match(
+            [token.text for token in doc if not token.is_space])
 
     def _build_dict(self, data_list: List[str],
                     taxa_rank: str) -> Dict[str, List[str]]:
@@ -135,7 +593,52 @@ class ExtractData:
         return df.rename_axis('s2orc_id').reset_index().replace(NA, '-')
 
     def merge_dfs(self, *args: pd.DataFrame) -> pd.DataFrame:
-        """Synopsis: Merge multiple dfs on s2orc_id column"""
-        return reduce(
-            lambda left, right: pd.merge(
-                left, right, on='s2orc_id', how='outer'), [*args]).fillna('-')
+        """Synopsis: Merge multiple dfs on s2orc_id column; the dfs are
+        aligned on s2orc_id in one step (rows sorted by s2orc_id, as the
+        outer merge does), instead of merging them one by one"""
+        frames = [df.set_index('s2orc_id') for df in args]
+        columns = [column for frame in frames for column in frame.columns]
+        aligned = (len(frames) > 1 and len(set(columns)) == len(columns)
+                   and all(frame.index.is_unique and len(frame)
+                           for frame in frames))
+        if not aligned:
+            # Single, empty or overlapping dfs, keep the pairwise merges
+            return reduce(
+                lambda left, right: pd.merge(
+                    left, right, on='s2orc_id', how='outer'),
+                [*args]).fillna('-')
+        merged = pd.concat(frames, axis=1, join='outer', sort=True)
+        return merged.rename_axis('s2orc_id').reset_index().fillna('-')
+
+
+def _init_worker(core_model: str, batch_size: int,
+                 matchers: List[TermMatcher], doc_cache: Optional[DocCache],
+                 paragraphs: bool) -> None:
+    """Dependency: Helper for ExtractData._open_pool method
+    Synopsis: Warm up the worker process (spaCy model and matchers)"""
+    record = ExtractData('', '', '', core_model, batch_size,
+                         paragraphs=paragraphs)
+    record.doc_cache = doc_cache
+    record.nlp
+    WORKER_STATE.update(record=record, matchers=matchers)
+
+
+def _mine_shard(
+    shard: Tuple[int, List[str]]
+) -> Tuple[List[Dict[Tuple[str, str], List[str]]], int, Tuple[int, int]]:
+    """Dependency: Helper for ExtractData.match_texts method
+    Synopsis: Match a shard of texts in the worker process
+    Input: Tuple (index of the worker matcher, texts)
+    Output: Tuple (hits per text, # docs, (# cache hits, # cache misses))"""
+    index, texts = shard
+    record = WORKER_STATE['record']
+    matcher = WORKER_STATE['matchers'][index]
+    doc_cache = record.doc_cache
+    if doc_cache is not None:
+        doc_cache.hits, doc_cache.misses = 0, 0
+    docs_mined = record.docs_mined
+    hits = record.match_units(texts, matcher, report=False)
+    docs = record.docs_mined - docs_mined
+    if doc_cache is None:
+        return hits, docs, (0, 0)
+    return hits, docs, (doc_cache.hits, doc_cache.misses)
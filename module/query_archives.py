@@ -0,0 +1,707 @@
+from fastcore.utils import store_attr  # type: ignore
+from typing import Any, BinaryIO, Callable, Dict, Generator, Iterable, List
+from typing import Deque, Optional, Pattern, Tuple, Union
+from multiprocessing import Pool
+from collections import deque
+from contextlib import closing
+from pathlib import Path
+import jmespath  # type: ignore
+import typer
+import hashlib
+import sqlite3
+import shutil
+import gzip
+import json
+import zlib
+import os
+import re
+
+# Number of jsonl lines the writer buffers before writing them out
+WRITE_BATCH = 1000
+# State of the scanning worker process
+# '{id_filter: ArchiveFilter, pdf_projection: projection of pdf entries}'
+SCANNER_STATE: Dict[str, Any] = dict()
+# Projection of S2ORC entries e.g. extract_data.project_metadata
+Projection = Optional[Callable[[Dict], Dict]]
+# Shard number in S2ORC archive names, e.g. pdf_parses_12.jsonl.gz
+SHARD_NUMBER = re.compile(r'(\d+)(?!.*\d)')
+# Number of jsonl lines per gzip member of the seekable (indexed) shards
+BLOCK_LINES = 64
+# zlib wbits value for gzip members
+GZIP_WBITS = 16 + zlib.MAX_WBITS
+# S2ORC id fields stored in the ArchiveIndex
+INDEX_FIELDS = ['paper_id', 'pubmed_id', 'doi']
+INDEX_PATTERNS = {
+    field: re.compile(b'"' + field.encode() + rb'"\s*:\s*"([^"\\]*)"')
+    for field in INDEX_FIELDS
+}
+INDEX_SCHEMA = '''
+CREATE TABLE shards (id INTEGER PRIMARY KEY, path TEXT);
+CREATE TABLE records (paper_id TEXT, pubmed_id TEXT, doi TEXT,
+                      shard INTEGER, block_offset INTEGER, block_size INTEGER,
+                      line_start INTEGER, line_end INTEGER);
+'''
+INDEX_KEYS = '''
+CREATE INDEX paper_id_key ON records (paper_id);
+CREATE INDEX pubmed_id_key ON records (pubmed_id);
+CREATE INDEX doi_key ON records (doi);
+'''
+
+
+class ArchiveFilter:
+    """Synopsis: ArchiveFilter class is dedicated to the fast rejection
+    of S2ORC jsonl lines before JSON decoding: the id field value is pulled
+    out of the raw bytes and checked against the ids of interest
+    Input: id field name (pubmed_id / paper_id), ids of interest and
+    optional projection of the entries (fields written to the output)
+    Output: decoded S2ORC entries of interest"""
+    def __init__(self,
+                 field: str,
+                 ids_list: Iterable[Optional[str]],
+                 projection: Projection = None) -> None:
+        self.field, self.projection = field, projection
+        self.ids = {str(i) for i in ids_list if i is not None}
+        self.raw_ids = {i.encode() for i in self.ids}
+        # Matches '"field": "value"', null values are rejected right away
+        self.pattern = re.compile(b'"' + re.escape(field.encode()) +
+                                  rb'"\s*:\s*"([^"\\]*)"')
+
+    @property
+    def fingerprint(self) -> Dict[str, Optional[str]]:
+        """Synopsis: What the filter selects (id field, hash of the
+        sorted ids, projection), recorded by ScanManifest"""
+        return {
+            'field': self.field,
+            'ids': hashlib.sha1('\n'.join(sorted(
+                self.ids)).encode()).hexdigest(),
+            'projection': projection_name(self.projection)
+        }
+
+    def is_candidate(self, line: bytes) -> bool:
+        """Synopsis: Check raw jsonl line for any id of interest"""
+        return any(value in self.raw_ids
+                   for value in self.pattern.findall(line))
+
+    def select(self, lines: Iterable[bytes]) -> Generator[Dict, None, None]:
+        """Synopsis: Decode candidate lines only and yield
+        the entries of interest"""
+        for line in lines:
+            if self.is_candidate(line):
+                article = json.loads(line)
+                if jmespath.search(self.field, article) in self.ids:
+                    yield article
+
+    def select_lines(self,
+                     lines: Iterable[bytes]) -> Generator[bytes, None, None]:
+        """Synopsis: Same as select method, but yield the jsonl lines
+        of interest (raw or projected, newline terminated)"""
+        for _, line in self.select_hits(lines):
+            yield line
+
+    def select_hits(
+        self, lines: Iterable[bytes]
+    ) -> Generator[Tuple[Dict, bytes], None, None]:
+        """Synopsis: Yield (decoded entry, output jsonl line)
+        of the entries of interest"""
+        for line in lines:
+            if self.is_candidate(line):
+                article = json.loads(line)
+                if jmespath.search(self.field, article) in self.ids:
+                    yield article, self.output_line(article, line)
+
+    def output_line(self, article: Dict, line: bytes) -> bytes:
+        """Synopsis: Raw jsonl line, or projected entry encoded
+        as jsonlines does"""
+        if self.projection is not None:
+            return (json.dumps(self.projection(article), ensure_ascii=False) +
+                    '\n').encode()
+        return line if line.endswith(b'\n') else line + b'\n'
+
+
+class BatchWriter:
+    """Synopsis: BatchWriter class is dedicated to writing jsonl lines
+    in batches to a temporary file, which is atomically renamed into place
+    only if all the writing succeeded (no partial output on crash)"""
+    def __init__(self, output_file: Union[str, Path]) -> None:
+        self.output_file = Path(output_file)
+        self.tmp_file = self.output_file.with_name(self.output_file.name +
+                                                   '.tmp')
+        self.batch: List[bytes] = []
+
+    def __enter__(self) -> 'BatchWriter':
+        self.f = open(self.tmp_file, 'wb')
+        return self
+
+    def write(self, lines: Iterable[bytes]) -> None:
+        """Synopsis: Buffer lines, write them out every WRITE_BATCH lines"""
+        self.batch.extend(lines)
+        if len(self.batch) >= WRITE_BATCH:
+            self.f.writelines(self.batch)
+            self.batch = []
+
+    def __exit__(self, exc_type, exc_value, traceback) -> None:
+        if exc_type is None:
+            self.f.writelines(self.batch)
+        self.f.close()
+        if exc_type is None:
+            os.replace(self.tmp_file, self.output_file)
+        else:
+            self.tmp_file.unlink()
+
+
+class ScanManifest:
+    """Synopsis: ScanManifest class is dedicated to checkpointing of the
+    archive scans. Hits of every finished archive are kept in a part file
+    and recorded in the manifest (hit counts and checksums), so that an
+    interrupted scan can be resumed; corrupt archives are quarantined
+    Input: checkpoint directory (next to the output file)
+    Output: manifest.json and part files in the checkpoint directory"""
+    def __init__(self, parts_dir: Union[str, Path]) -> None:
+        self.parts_dir = Path(parts_dir)
+        self.manifest_file = self.parts_dir / 'manifest.json'
+        self.shards: Dict[str, Dict[str, Dict[str, Any]]] = dict()
+        self.quarantined: Dict[str, str] = dict()
+        self.fingerprint: Optional[Dict[str, Any]] = None
+
+    def start(self,
+              resume: bool = False,
+              fingerprint: Optional[Dict[str, Any]] = None) -> None:
+        """Synopsis: Start a fresh scan, or resume the previous one: keep
+        finished archives (checksums verified) and the quarantined ones
+        (retried, listed until scanned successfully), drop partial
+        output; the previous scan is discarded if it was run with another
+        setup (fingerprint of the filter, projection and output streams)"""
+        manifest: Dict[str, Any] = dict()
+        if resume and self.manifest_file.exists():
+            with open(self.manifest_file) as f:
+                manifest = json.load(f)
+            if manifest.get('fingerprint') != fingerprint:
+                typer.secho('Scan setup changed, previous scan is discarded',
+                            fg=typer.colors.RED)
+                manifest = dict()
+        self.fingerprint = fingerprint
+        if manifest:
+            self.shards = {
+                archive: entry
+                for archive, entry in manifest.get('shards', dict()).items()
+                if self._verify(archive, entry)
+            }
+            self.quarantined = manifest.get('quarantined', dict())
+        else:
+            self.shards, self.quarantined = dict(), dict()
+        self.parts_dir.mkdir(parents=True, exist_ok=True)
+        kept = {
+            self.part_file(archive, stream).name
+            for archive, entry in self.shards.items() for stream in entry
+        }
+        for part in self.parts_dir.glob('*.jsonl*'):
+            if part.name not in kept:
+                part.unlink()
+        self._dump()
+
+    @property
+    def done(self) -> List[str]:
+        """Synopsis: Archives, which have been scanned completely"""
+        return list(self.shards)
+
+    def part_file(self, archive: str, stream: str) -> Path:
+        """Synopsis: Part file of the archive hits (per output stream)"""
+        archive_key = hashlib.sha1(archive.encode()).hexdigest()[:16]
+        return self.parts_dir / f"{archive_key}.{stream}.jsonl"
+
+    def record(self, archive: str, streams: Dict[str, List[bytes]]) -> None:
+        """Synopsis: Write archive hits to part files (atomically)
+        and mark the archive as done"""
+        entry: Dict[str, Dict[str, Any]] = dict()
+        for stream, lines in streams.items():
+            part = self.part_file(archive, stream)
+            with BatchWriter(part) as writer:
+                writer.write(lines)
+            entry[stream] = {
+                'hits': len(lines),
+                'sha256': _checksum(part)
+            }
+        self.shards[archive] = entry
+        self.quarantined.pop(archive, None)
+        self._dump()
+
+    def quarantine(self, archive: str, error: str) -> None:
+        """Synopsis: List corrupt archive in the manifest"""
+        self.quarantined[archive] = error
+        self._dump()
+
+    def hits(self, archive: str, stream: str) -> int:
+        """Synopsis: Number of hits of the archive (per output stream)"""
+        return self.shards[archive][stream]['hits']
+
+    def finish(self, archives: List[str]) -> None:
+        """Synopsis: Remove the checkpoint directory once all the archives
+        are done (nothing left to resume, the hits are in the outputs)"""
+        if not self.quarantined and all(archive in self.shards
+                                        for archive in archives):
+            shutil.rmtree(self.parts_dir, ignore_errors=True)
+
+    def assemble(self, archives: List[str], stream: str,
+                 output_file: Union[str, Path]) -> None:
+        """Synopsis: Concatenate part files in archive order
+        into the output file (atomically)"""
+        with BatchWriter(output_file) as writer:
+            for archive in archives:
+                if archive in self.shards:
+                    with open(self.part_file(archive, stream), 'rb') as f:
+                        writer.write(f)
+
+    def _verify(self, archive: str, entry: Dict[str, Dict[str,
+                                                             Any]]) -> bool:
+        """Dependency: Helper for start method
+        Synopsis: Check part files of the finished archive"""
+        for stream, stats in entry.items():
+            part = self.part_file(archive, stream)
+            if not part.exists() or _checksum(part) != stats['sha256']:
+                return False
+        return True
+
+    def _dump(self) -> None:
+        """Dependency: Helper for start, record and quarantine methods
+        Synopsis: Write manifest (atomically)"""
+        tmp_file = self.manifest_file.with_name(self.manifest_file.name +
+                                                '.tmp')
+        manifest = {
+            'fingerprint': self.fingerprint,
+            'shards': self.shards,
+            'quarantined': self.quarantined
+        }
+        with open(tmp_file, 'w') as f:
+            json.dump(manifest, f, indent=1)
+        os.replace(tmp_file, self.manifest_file)
+
+
+class ArchiveScanner:
+    """Synopsis: ArchiveScanner class is dedicated to scanning S2ORC
+    archives in worker processes. Hits of every archive are checkpointed
+    by a single writer (the parent process, see ScanManifest) and the
+    output file is assembled in archive order and atomically renamed
+    into place once all archives are done
+    Input: S2ORC archives, ArchiveFilter with the ids of interest
+    Output: jsonl file with the S2ORC entries of interest"""
+    def __init__(self,
+                 archives: Iterable[Union[str, Path]],
+                 id_filter: ArchiveFilter,
+                 output_file: Union[str, Path],
+                 n_workers: Optional[int] = None) -> None:
+        store_attr('id_filter')
+        self.archives = sorted(str(archive) for archive in archives)
+        self.output_file = Path(output_file)
+        self.n_workers = n_workers or os.cpu_count() or 1
+        self.manifest = ScanManifest(
+            self.output_file.with_name(self.output_file.name + '.parts'))
+
+    def run(self, resume: bool = False) -> Dict[str, int]:
+        """Synopsis: Scan all the archives and write hits to output file
+        (resume=True skips the archives finished by the previous run)
+        Output: Dict '{archive: # hits}'"""
+        self.manifest.start(resume, {
+            'filter': self.id_filter.fingerprint,
+            'streams': ['hits']
+        })
+        todo = [a for a in self.archives if a not in self.manifest.done]
+        with Pool(min(self.n_workers, max(1, len(todo))),
+                  initializer=_init_scanner,
+                  initargs=(self.id_filter, None)) as pool:
+            for archive, lines, error in pool.imap(_scan_archive, todo):
+                if error:
+                    _echo_invalid(archive)
+                    self.manifest.quarantine(archive, error)
+                else:
+                    self.manifest.record(archive, {'hits': lines})
+        self.manifest.assemble(self.archives, 'hits', self.output_file)
+        self.manifest.finish(self.archives)
+        return {
+            archive: self.manifest.hits(archive, 'hits')
+            for archive in self.archives if archive in self.manifest.done
+        }
+
+
+def _init_scanner(id_filter: ArchiveFilter,
+                  pdf_projection: Projection) -> None:
+    """Dependency: Helper for ArchiveScanner and PairedScanner
+    Synopsis: Share ArchiveFilter with the worker process"""
+    SCANNER_STATE.update(id_filter=id_filter, pdf_projection=pdf_projection)
+
+
+def _scan_archive(archive: str) -> Tuple[str, List[bytes], Optional[str]]:
+    """Dependency: Helper for ArchiveScanner.run method
+    Synopsis: Scan individual S2ORC archive in the worker process
+    Output: Tuple (archive, jsonl lines of interest, error if corrupt)"""
+    archive, hits, error = _scan_with(archive, SCANNER_STATE['id_filter'])
+    return archive, [line for _, line in hits], error
+
+
+def _scan_with(
+    archive: str, id_filter: ArchiveFilter
+) -> Tuple[str, List[Tuple[Dict, bytes]], Optional[str]]:
+    """Dependency: Helper for _scan_archive and _scan_pair functions
+    Synopsis: Scan individual S2ORC archive with the ArchiveFilter,
+    hits of corrupt archives are dropped
+    Output: Tuple (archive, [(entry, output line)], error if corrupt)"""
+    try:
+        with gzip.open(archive) as f:
+            return archive, list(id_filter.select_hits(f)), None
+    except (EOFError, OSError, zlib.error, ValueError) as error:
+        return archive, [], f"{type(error).__name__}: {error}"
+
+
+class PairedScanner:
+    """Synopsis: PairedScanner class is dedicated to the joint scan of
+    S2ORC metadata and pdf_parse archives, which are numbered the same way
+    (e.g. metadata_0.jsonl.gz and pdf_parses_0.jsonl.gz). Each worker scans
+    a metadata shard and passes the paper_ids of its hits straight to the
+    scan of the paired pdf_parse shard, so shards flow through both scans
+    in a pipeline and no intermediate file is re-read
+    Input: metadata and pdf_parse archives, ArchiveFilter (pubmed_id)
+    Output: metadata and pdf_parse jsonl files with the entries of interest"""
+    def __init__(self,
+                 meta_archives: Iterable[Union[str, Path]],
+                 pdf_archives: Iterable[Union[str, Path]],
+                 id_filter: ArchiveFilter,
+                 meta_output: Union[str, Path],
+                 pdf_output: Union[str, Path],
+                 n_workers: Optional[int] = None,
+                 pdf_projection: Projection = None) -> None:
+        store_attr('id_filter, meta_output, pdf_output, pdf_projection')
+        self.pairs = pair_archives(meta_archives, pdf_archives)
+        self.n_workers = n_workers or os.cpu_count() or 1
+        meta_output = Path(meta_output)
+        self.manifest = ScanManifest(
+            meta_output.with_name(meta_output.name + '.parts'))
+
+    def run(self, resume: bool = False) -> Dict[str, Tuple[int, int]]:
+        """Synopsis: Scan all the archive pairs and write hits
+        to both output files (resume=True skips the pairs finished
+        by the previous run)
+        Output: Dict '{metadata archive: (# meta hits, # pdf hits)}'"""
+        for meta_archive, pdf_archive in self.pairs:
+            if pdf_archive is None:
+                _echo_invalid(meta_archive, 'No paired pdf_parse archive: ')
+        self.manifest.start(
+            resume, {
+                'filter': self.id_filter.fingerprint,
+                'pdf_projection': projection_name(self.pdf_projection),
+                'pairs': [list(pair) for pair in self.pairs],
+                'streams': ['meta', 'pdf']
+            })
+        todo = [p for p in self.pairs if p[0] not in self.manifest.done]
+        with Pool(min(self.n_workers, max(1, len(todo))),
+                  initializer=_init_scanner,
+                  initargs=(self.id_filter, self.pdf_projection)) as pool:
+            for meta_archive, meta_lines, pdf_lines, invalid in pool.imap(
+                    _scan_pair, todo):
+                for archive, error in invalid.items():
+                    _echo_invalid(archive)
+                    self.manifest.quarantine(archive, error)
+                if not invalid:
+                    self.manifest.record(meta_archive, {
+                        'meta': meta_lines,
+                        'pdf': pdf_lines
+                    })
+        archives = [meta_archive for meta_archive, _ in self.pairs]
+        self.manifest.assemble(archives, 'meta', self.meta_output)
+        self.manifest.assemble(archives, 'pdf', self.pdf_output)
+        self.manifest.finish(archives)
+        return {
+            archive: (self.manifest.hits(archive, 'meta'),
+                      self.manifest.hits(archive, 'pdf'))
+            for archive in archives if archive in self.manifest.done
+        }
+
+
+def stream_pairs(
+    pairs: List[Tuple[str, Optional[str]]],
+    id_filter: ArchiveFilter,
+    n_workers: Optional[int] = None,
+    pdf_projection: Projection = None,
+    window: Optional[int] = None
+) -> Generator[Tuple[str, List[bytes], List[bytes]], None, None]:
+    """Synopsis: Scan archive pairs (see pair_archives) in worker processes
+    and yield their hits in archive order, without output files; at most
+    `window` pairs (default: 2 per worker) are scanned ahead of the
+    consumer, so a slow consumer holds the scan back (backpressure);
+    pairs with a corrupt archive are reported and skipped (as PairedScanner
+    does)
+    Output: Tuple (metadata archive, metadata lines, pdf_parse lines)"""
+    n_workers = n_workers or os.cpu_count() or 1
+    window = window or 2 * n_workers
+    pending: Deque = deque()
+    with Pool(min(n_workers, max(1, len(pairs))),
+              initializer=_init_scanner,
+              initargs=(id_filter, pdf_projection)) as pool:
+        for pair in pairs:
+            pending.append(pool.apply_async(_scan_pair, (pair, )))
+            if len(pending) >= window:
+                yield from _scanned_pair(pending.popleft().get())
+        while pending:
+            yield from _scanned_pair(pending.popleft().get())
+
+
+def _scanned_pair(
+    scanned: Tuple[str, List[bytes], List[bytes], Dict[str, str]]
+) -> Generator[Tuple[str, List[bytes], List[bytes]], None, None]:
+    """Dependency: Helper for stream_pairs function
+    Synopsis: Hits of the scanned pair, nothing if an archive is corrupt"""
+    meta_archive, meta_lines, pdf_lines, invalid = scanned
+    for archive in invalid:
+        _echo_invalid(archive)
+    if not invalid:
+        yield meta_archive, meta_lines, pdf_lines
+
+
+def projection_name(projection: Projection) -> Optional[str]:
+    """Synopsis: Qualified name of the projection (None if raw entries)"""
+    if projection is None:
+        return None
+    return f"{projection.__module__}.{projection.__qualname__}"
+
+
+def pair_archives(
+    meta_archives: Iterable[Union[str, Path]],
+    pdf_archives: Iterable[Union[str, Path]]
+) -> List[Tuple[str, Optional[str]]]:
+    """Synopsis: Pair metadata and pdf_parse archives by shard number
+    (single, unnumbered archives are paired with each other)
+    Output: List of (metadata archive, pdf_parse archive or None)"""
+    meta_archives, pdf_archives = list(meta_archives), list(pdf_archives)
+    if len(meta_archives) == len(pdf_archives) == 1:
+        return [(str(meta_archives[0]), str(pdf_archives[0]))]
+    pdf_shards = {_shard_number(archive): str(archive)
+                  for archive in pdf_archives}
+    return [(str(archive), pdf_shards.get(_shard_number(archive)))
+            for archive in sorted(meta_archives, key=str)]
+
+
+def _shard_number(archive: Union[str, Path]) -> str:
+    """Dependency: Helper for pair_archives function
+    Synopsis: Get shard number (last digits in the archive file name)"""
+    found = SHARD_NUMBER.search(Path(archive).name)
+    return str(int(found.group(1))) if found else Path(archive).name
+
+
+def _scan_pair(
+    pair: Tuple[str, Optional[str]]
+) -> Tuple[str, List[bytes], List[bytes], Dict[str, str]]:
+    """Dependency: Helper for PairedScanner.run method
+    Synopsis: Scan metadata archive and then its paired pdf_parse archive
+    for the paper_ids found in the metadata archive
+    Output: Tuple (metadata archive, metadata lines, pdf_parse lines,
+    '{corrupt archive: error}')"""
+    meta_archive, pdf_archive = pair
+    _, meta_hits, meta_error = _scan_with(meta_archive,
+                                          SCANNER_STATE['id_filter'])
+    invalid = {meta_archive: meta_error} if meta_error else dict()
+    pdf_hits: List[Tuple[Dict, bytes]] = []
+    if pdf_archive is not None and meta_hits:
+        pdf_filter = ArchiveFilter(
+            'paper_id',
+            [jmespath.search('paper_id', article) for article, _ in meta_hits],
+            SCANNER_STATE['pdf_projection'])
+        _, pdf_hits, pdf_error = _scan_with(pdf_archive, pdf_filter)
+        if pdf_error:
+            invalid[pdf_archive] = pdf_error
+    return (meta_archive, [line for _, line in meta_hits],
+            [line for _, line in pdf_hits], invalid)
+
+
+def _checksum(file: Path) -> str:
+    """Dependency: Helper for ScanManifest class
+    Synopsis: SHA-256 checksum of the file"""
+    digest = hashlib.sha256()
+    with open(file, 'rb') as f:
+        for chunk in iter(lambda: f.read(1 << 20), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def _echo_invalid(archive: str, message: str = 'Invalid archive: ') -> None:
+    """Synopsis: Report invalid (truncated) S2ORC archive"""
+    header = typer.style(message, bold=True)
+    invalid_archive = typer.style(f"{archive}",
+                                  fg=typer.colors.RED,
+                                  bold=True)
+    typer.echo(header + invalid_archive)
+
+
+class ArchiveIndex:
+    """Synopsis: ArchiveIndex class is dedicated to random access retrieval
+    of S2ORC entries. S2ORC archives are re-compressed once into seekable
+    shards (gzip members of BLOCK_LINES lines each, still readable
+    by gzip) and every entry (paper_id, pubmed_id, doi) is mapped
+    to its shard, gzip member offset and position within the member
+    Input: S2ORC archives (metadata or pdf_parse)
+    Output: index directory with seekable shards and SQLite index"""
+    def __init__(self, index_dir: Union[str, Path]) -> None:
+        self.index_dir = Path(index_dir)
+        self.shard_dir = self.index_dir / 'shards'
+        self.db_file = self.index_dir / 'index.sqlite'
+
+    def build(self,
+              archives_path: Union[str, Path],
+              n_workers: Optional[int] = None,
+              block_lines: int = BLOCK_LINES) -> int:
+        """Synopsis: Re-compress and index all the archives
+        (one-time procedure per S2ORC release)
+        Output: Number of indexed entries"""
+        archives_root = Path(archives_path)
+        archives = sorted(archives_root.glob('**/*.gz'))
+        tasks = [(str(archive),
+                  str(self.shard_dir / archive.relative_to(archives_root)),
+                  block_lines) for archive in archives]
+        self.shard_dir.mkdir(parents=True, exist_ok=True)
+        tmp_db = self.db_file.with_name(self.db_file.name + '.tmp')
+        if tmp_db.exists():
+            tmp_db.unlink()
+        indexed = 0
+        with closing(sqlite3.connect(str(tmp_db))) as db, Pool(
+                n_workers or os.cpu_count() or 1) as pool:
+            db.executescript(INDEX_SCHEMA)
+            for shard_id, (shard, rows, valid) in enumerate(
+                    pool.imap(_index_archive, tasks)):
+                if not valid:
+                    _echo_invalid(tasks[shard_id][0])
+                db.execute('INSERT INTO shards VALUES (?, ?)',
+                           (shard_id, str(
+                               Path(shard).relative_to(self.index_dir))))
+                db.executemany(
+                    'INSERT INTO records VALUES (?, ?, ?, ?, ?, ?, ?, ?)',
+                    [(*row[:3], shard_id, *row[3:]) for row in rows])
+                indexed += len(rows)
+            db.executescript(INDEX_KEYS)
+            db.commit()
+        os.replace(tmp_db, self.db_file)
+        return indexed
+
+    @property
+    def exists(self) -> bool:
+        """Synopsis: Check if the index has been built"""
+        return self.db_file.exists()
+
+    def locate(self, field: str, ids_list: Iterable[Optional[str]]
+               ) -> List[Tuple[str, int, int, int, int]]:
+        """Synopsis: Locate entries by id field (paper_id, pubmed_id, doi)
+        Output: List of (shard, member offset, member size, line start,
+        line end), in shard order"""
+        if field not in INDEX_FIELDS:
+            raise ValueError(f'Field {field} is not indexed')
+        with closing(sqlite3.connect(str(self.db_file))) as db:
+            db.execute('CREATE TEMP TABLE wanted (id TEXT PRIMARY KEY)')
+            db.executemany('INSERT OR IGNORE INTO wanted VALUES (?)',
+                           [(str(i), ) for i in ids_list if i is not None])
+            return db.execute(
+                'SELECT shards.path, block_offset, block_size, line_start, '
+                'line_end FROM records '
+                f'JOIN wanted ON records.{field} = wanted.id '
+                'JOIN shards ON records.shard = shards.id '
+                'ORDER BY records.shard, block_offset, line_start').fetchall()
+
+    def fetch(
+            self, field: str,
+            ids_list: Iterable[Optional[str]]) -> Generator[bytes, None, None]:
+        """Synopsis: Fetch raw jsonl lines of the entries of interest,
+        decompressing only the gzip members, which contain them"""
+        for _, line in self._fetch_located(self.locate(field, ids_list)):
+            yield line
+
+    def _fetch_located(
+        self, located: List[Tuple[str, int, int, int, int]]
+    ) -> Generator[Tuple[str, bytes], None, None]:
+        """Dependency: Helper for fetch and write methods
+        Synopsis: Read located lines shard by shard
+        Output: Generator of (shard, raw jsonl line)"""
+        shard_file, block, block_key = None, b'', None
+        try:
+            for shard, offset, size, start, end in located:
+                if shard_file is None or shard_file.name != str(
+                        self.index_dir / shard):
+                    if shard_file is not None:
+                        shard_file.close()
+                    shard_file = open(self.index_dir / shard, 'rb')
+                if block_key != (shard, offset):
+                    shard_file.seek(offset)
+                    block = zlib.decompress(shard_file.read(size), GZIP_WBITS)
+                    block_key = (shard, offset)
+                yield shard, block[start:end]
+        finally:
+            if shard_file is not None:
+                shard_file.close()
+
+    def write(self,
+              field: str,
+              ids_list: Iterable[Optional[str]],
+              output_file: Union[str, Path],
+              projection: Projection = None) -> Dict[str, int]:
+        """Synopsis: Write entries of interest (raw or projected)
+        to jsonl file (atomically)
+        Output: Dict '{shard: # hits}'"""
+        hits: Dict[str, int] = dict()
+        id_filter = ArchiveFilter(field, [], projection)
+        with BatchWriter(output_file) as writer:
+            for shard, line in self._fetch_located(
+                    self.locate(field, ids_list)):
+                hits[shard] = hits.get(shard, 0) + 1
+                if projection is not None:
+                    line = id_filter.output_line(json.loads(line), line)
+                writer.write([line])
+        return hits
+
+
+def _index_archive(
+    task: Tuple[str, str, int]
+) -> Tuple[str, List[Tuple[Optional[str], ...]], bool]:
+    """Dependency: Helper for ArchiveIndex.build method
+    Synopsis: Re-compress individual S2ORC archive into gzip members
+    of block_lines lines and collect the index rows in the worker process
+    Output: Tuple (shard, index rows, archive is valid)"""
+    archive, shard, block_lines = task
+    Path(shard).parent.mkdir(parents=True, exist_ok=True)
+    rows: List[Tuple[Optional[str], ...]] = []
+    valid = True
+    with open(shard + '.tmp', 'wb') as f_out:
+        block: List[bytes] = []
+        try:
+            with gzip.open(archive) as f_in:
+                for line in f_in:
+                    block.append(line if line.endswith(b'\n') else line +
+                                 b'\n')
+                    if len(block) == block_lines:
+                        rows.extend(_write_block(block, f_out))
+                        block = []
+        except (EOFError, OSError, zlib.error, ValueError):
+            valid = False
+        rows.extend(_write_block(block, f_out))
+    os.replace(shard + '.tmp', shard)
+    return shard, rows, valid
+
+
+def _write_block(block: List[bytes],
+                 f_out: BinaryIO) -> List[Tuple[Optional[str], ...]]:
+    """Dependency: Helper for _index_archive function
+    Synopsis: Write lines as one gzip member and get their index rows
+    Output: List of (paper_id, pubmed_id, doi, member offset, member size,
+    line start, line end)"""
+    if not block:
+        return []
+    offset = f_out.tell()
+    size = f_out.write(gzip.compress(b''.join(block), mtime=0))
+    rows, start = [], 0
+    for line in block:
+        ids = [
+            _raw_value(INDEX_PATTERNS[field], line) for field in INDEX_FIELDS
+        ]
+        rows.append((*ids, offset, size, start, start + len(line)))
+        start += len(line)
+    return rows
+
+
+def _raw_value(pattern: Pattern, line: bytes) -> Optional[str]:
+    """Dependency: Helper for _write_block function
+    Synopsis: Pull top-level field value out of raw jsonl line"""
+    found = pattern.search(line)
+    return found.group(1).decode() if found else None
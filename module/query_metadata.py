@@ -1,13 +1,34 @@
 from fastcore.utils import store_attr, parallel  # type: ignore
-from typing import Generator, List
+from typing import Dict, Generator, List, Optional, Tuple
+from .query_archives import ArchiveFilter, ArchiveIndex, ArchiveScanner
+from .query_archives import PairedScanner
+from .extract_data import project_body_text, project_metadata
+from urllib.parse import urlencode
+from urllib.request import urlopen
+from urllib.error import URLError
+from http.client import HTTPException
 import click_spinner  # type: ignore
 from pathlib import Path
 from Bio import Entrez  # type: ignore
-import jmespath  # type: ignore
 import jsonlines  # type: ignore
+import datetime
+import hashlib
 import gzip
 import typer
 import json
+import time
+import os
+
+# NCBI E-utilities (Entrez) endpoint
+EUTILS_URL = 'https://eutils.ncbi.nlm.nih.gov/entrez/eutils/'
+# Number of PMIDs fetched per Entrez request
+ENTREZ_PAGE = 5000
+# Pause between Entrez requests (NCBI allows 3 requests/sec without API key)
+ENTREZ_INTERVAL = 0.34
+# Seconds an Entrez request may stall before falling back to the cache
+ENTREZ_TIMEOUT = 60
+# Local cache of Entrez results
+ENTREZ_CACHE = Path.home() / '.cache' / 'muddy_mine' / 'entrez'
 
 
 class GettingPMID:
@@ -18,14 +39,19 @@ class GettingPMID:
                  email: str,
                  archive_paths: str,
                  extracted_output: str,
-                 query: str = 'mud[TIAB] AND volcano[TIAB]') -> None:
-        store_attr('email, query')
+                 query: str = 'mud[TIAB] AND volcano[TIAB]',
+                 eutils_url: str = EUTILS_URL,
+                 cache_dir: Optional[str] = None,
+                 page_size: int = ENTREZ_PAGE) -> None:
+        store_attr('email, query, eutils_url, page_size')
+        self.cache_dir = Path(cache_dir) if cache_dir else ENTREZ_CACHE
         self.archive_paths = Path(archive_paths).glob('**/*.gz')
         self.extracted_output = Path(extracted_output)
 
     @property
     def get_pmid(self) -> List[str]:
-        """Synopsis: Fetch PMIDs articles (from Entrez)
+        """Synopsis: Fetch PMIDs articles (from Entrez), all the pages
+        of the result set; results are cached locally per query and date
         Input: Pubmed query string e.g. mud[TIAB] AND volcano[TIAB]
         Output: List of PMIDs"""
         # Header comment
@@ -34,29 +60,96 @@ class GettingPMID:
         query = typer.style(f"{self.query}")
         typer.echo(header_1 + query)
         # Function per se
-        Entrez.email = self.email
-        with Entrez.esearch(db='pubmed',
-                            term=self.query,
-                            idtype='acc',
-                            retmax=1000) as f:
+        cache_file = self._cache_file(datetime.date.today().isoformat())
+        if cache_file.exists():
+            pmids = self._read_cache(cache_file)
+        else:
+            try:
+                pmids = self._fetch_pmids()
+                self._write_cache(cache_file, pmids)
+            except (URLError, OSError, HTTPException):
+                # Offline (or stalled / cut connection), fall back to the
+                # latest cached result
+                cached = sorted(
+                    self.cache_dir.glob(self._cache_file('*').name))
+                if not cached:
+                    raise
+                typer.secho(f'Entrez unavailable, using {cached[-1].name}',
+                            fg=typer.colors.RED)
+                pmids = self._read_cache(cached[-1])
+        header_2 = typer.style("PMIDs #: ", bold=True)
+        pmids_text = typer.style(f"{len(pmids)}",
+                                 blink=True,
+                                 fg=typer.colors.GREEN,
+                                 bold=True)
+        # Conclusion
+        typer.echo(header_2 + pmids_text)
+        return pmids
+
+    def _fetch_pmids(self) -> List[str]:
+        """Dependency: Helper for get_pmid method
+        Synopsis: Run the query on the Entrez history server and fetch
+        the PMIDs page by page (WebEnv / query_key)"""
+        with self._eutils('esearch',
+                          db='pubmed',
+                          term=self.query,
+                          usehistory='y',
+                          retmax=0) as f:
             record = Entrez.read(f)
-            pmids = record.get('IdList')
-            header_2 = typer.style("PMIDs #: ", bold=True)
-            pmids_text = typer.style(f"{len(pmids)}",
-                                     blink=True,
-                                     fg=typer.colors.GREEN,
-                                     bold=True)
-            # Conclusion
-            typer.echo(header_2 + pmids_text)
-            return pmids
+        count = int(record['Count'])
+        pmids: List[str] = []
+        for retstart in range(0, count, self.page_size):
+            time.sleep(ENTREZ_INTERVAL)
+            with self._eutils('efetch',
+                              db='pubmed',
+                              rettype='uilist',
+                              retmode='text',
+                              WebEnv=record['WebEnv'],
+                              query_key=record['QueryKey'],
+                              retstart=retstart,
+                              retmax=self.page_size) as f:
+                pmids.extend(line.strip()
+                             for line in f.read().decode().splitlines()
+                             if line.strip())
+        return pmids
+
+    def _eutils(self, utility: str, **params):
+        """Dependency: Helper for _fetch_pmids method
+        Synopsis: POST request to Entrez utility (esearch, efetch, etc.)"""
+        params.update(email=self.email, tool='muddy_mine')
+        return urlopen(f"{self.eutils_url}{utility}.fcgi",
+                       data=urlencode(params).encode(),
+                       timeout=ENTREZ_TIMEOUT)
+
+    def _cache_file(self, date: str) -> Path:
+        """Dependency: Helper for get_pmid method
+        Synopsis: Cache file of the query results on the date"""
+        query_key = hashlib.sha1(self.query.encode()).hexdigest()[:16]
+        return self.cache_dir / f"{query_key}_{date}.json"
+
+    def _read_cache(self, cache_file: Path) -> List[str]:
+        """Dependency: Helper for get_pmid method
+        Synopsis: Read cached PMIDs"""
+        with open(cache_file) as f:
+            return json.load(f)['pmids']
+
+    def _write_cache(self, cache_file: Path, pmids: List[str]) -> None:
+        """Dependency: Helper for get_pmid method
+        Synopsis: Cache PMIDs of the query (atomically)"""
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+        tmp_file = cache_file.with_suffix('.tmp')
+        with open(tmp_file, 'w') as f:
+            json.dump({'query': self.query, 'pmids': pmids}, f)
+        os.replace(tmp_file, cache_file)
 
     def get_articles(self, pmid_list: List[str]) -> List[Generator]:
         """Synopsis: Process each  S2ORC archive and extract aricles of
         interest based on PMIDs fetched from the Pubmed
         Input: List of PMIDs
         Output: Get articles from metadata S2ORC archives"""
+        id_filter = ArchiveFilter('pubmed_id', pmid_list)
         interests = [
-            self._open_s2rc(str(archive), pmid_list)
+            self._open_s2rc(str(archive), id_filter)
             for archive in self.archive_paths
         ]
         return interests
@@ -78,16 +171,75 @@ class GettingPMID:
                      threadpool=True,
                      n_workers=4)
 
-    def _open_s2rc(self, archive, pmid_list: List[str]) -> Generator:
+    def scan_archives(self,
+                      pmid_list: List[str],
+                      n_workers: Optional[int] = None,
+                      resume: bool = False,
+                      project: bool = False) -> Dict[str, int]:
+        """Synopsis: Extract articles of interest from archives in worker
+        processes (all CPUs by default) with a single ordered writer
+        (resume=True skips the archives finished by the previous run,
+        project=True writes only the ExtractInfo fields of interest)
+        Input: List of PMIDs
+        Output: Dict '{archive: # articles of interest}'"""
+        typer.secho('Working with archives (it could take a while): ',
+                    bold=True)
+        scanner = ArchiveScanner(
+            self.archive_paths,
+            ArchiveFilter('pubmed_id', pmid_list,
+                          project_metadata if project else None),
+            self.extracted_output, n_workers)
+        with click_spinner.spinner():
+            return scanner.run(resume)
+
+    def scan_paired(
+            self,
+            pmid_list: List[str],
+            pdf_archive_paths: str,
+            pdf_output: str,
+            n_workers: Optional[int] = None,
+            resume: bool = False,
+            project: bool = False) -> Dict[str, Tuple[int, int]]:
+        """Synopsis: Extract metadata and pdf_parse entries of interest in
+        one joint scan of the paired (same shard number) S2ORC archives
+        Input: List of PMIDs, PATH to pdf_parse archives, pdf output FILE
+        (resume=True skips the archive pairs finished by the previous run,
+        project=True writes only the ExtractInfo fields of interest)
+        Output: Dict '{archive: (# metadata entries, # pdf entries)}'"""
+        typer.secho('Working with paired archives (it could take a while): ',
+                    bold=True)
+        scanner = PairedScanner(
+            self.archive_paths,
+            Path(pdf_archive_paths).glob('**/*.gz'),
+            ArchiveFilter('pubmed_id', pmid_list,
+                          project_metadata if project else None),
+            self.extracted_output, pdf_output, n_workers,
+            project_body_text if project else None)
+        with click_spinner.spinner():
+            return scanner.run(resume)
+
+    def fetch_indexed(self,
+                      pmid_list: List[str],
+                      index_dir: str,
+                      project: bool = False) -> Dict[str, int]:
+        """Synopsis: Extract articles of interest from the seekable shards
+        of an ArchiveIndex (built with index_s2orc.py), without a full scan
+        (project=True writes only the ExtractInfo fields of interest)
+        Input: List of PMIDs, ArchiveIndex directory
+        Output: Dict '{shard: # articles of interest}'"""
+        typer.secho('Fetching articles from the archive index', bold=True)
+        return ArchiveIndex(index_dir).write(
+            'pubmed_id', pmid_list, self.extracted_output,
+            project_metadata if project else None)
+
+    def _open_s2rc(self, archive, id_filter: ArchiveFilter) -> Generator:
         """Dependency: Helper for the get_articles method
         Synopsis: Open individual S2ORC archive
         """
         try:
             with gzip.open(archive) as f:
-                articles = (json.loads(article) for article in f)
-                for article in articles:
-                    if jmespath.search('pubmed_id', article) in pmid_list:
-                        yield article
+                for article in id_filter.select(f):
+                    yield article
         except EOFError:
             header = typer.style("Invalid archive: ", bold=True)
             invalid_archive = typer.style(f"{archive}",
@@ -1,5 +1,7 @@
 from fastcore.utils import parallel, store_attr  # type: ignore
-from typing import Generator, List
+from typing import Dict, Generator, List, Optional
+from .query_archives import ArchiveFilter, ArchiveIndex, ArchiveScanner
+from .extract_data import project_body_text
 import click_spinner  # type: ignore
 from pathlib import Path
 import jmespath  # type: ignore
@@ -26,8 +28,10 @@ class GettingPDFs:
         Output: List with all the relevant papers_ids"""
         with open(self.input_file) as f:
             articles = (json.loads(article) for article in f)
+            # Projected metadata (scan with project=True) keeps s2orc_id
             papers_ids = [
-                jmespath.search('paper_id', p_id) for p_id in articles
+                jmespath.search('paper_id || s2orc_id', p_id)
+                for p_id in articles
             ]
             return papers_ids
 
@@ -44,8 +48,9 @@ class GettingPDFs:
                              fg=typer.colors.GREEN,
                              bold=True)
         typer.echo(first + second)
+        id_filter = ArchiveFilter('paper_id', ids_list)
         interests = [
-            self._open_s2rc(str(archive), ids_list)
+            self._open_s2rc(str(archive), id_filter)
             for archive in self.archive_paths
         ]
         return interests
@@ -68,15 +73,48 @@ class GettingPDFs:
                      threadpool=True,
                      n_workers=4)
 
-    def _open_s2rc(self, archive, ids_list: List[str]) -> Generator:
+    def scan_archives(self,
+                      ids_list: List[str],
+                      n_workers: Optional[int] = None,
+                      resume: bool = False,
+                      project: bool = False) -> Dict[str, int]:
+        """Synopsis: Extract articles of interest from archives in worker
+        processes (all CPUs by default) with a single ordered writer
+        (resume=True skips the archives finished by the previous run,
+        project=True writes only the ExtractInfo fields of interest)
+        Input: List of paper_ids (S2ORC ids)
+        Output: Dict '{archive: # articles of interest}'"""
+        typer.secho('Working with archives (it could take a while): ',
+                    bold=True)
+        scanner = ArchiveScanner(
+            self.archive_paths,
+            ArchiveFilter('paper_id', ids_list,
+                          project_body_text if project else None),
+            self.extracted_output, n_workers)
+        with click_spinner.spinner():
+            return scanner.run(resume)
+
+    def fetch_indexed(self,
+                      ids_list: List[str],
+                      index_dir: str,
+                      project: bool = False) -> Dict[str, int]:
+        """Synopsis: Extract articles of interest from the seekable shards
+        of an ArchiveIndex (built with index_s2orc.py), without a full scan
+        (project=True writes only the ExtractInfo fields of interest)
+        Input: List of paper_ids (S2ORC ids), ArchiveIndex directory
+        Output: Dict '{shard: # articles of interest}'"""
+        typer.secho('Fetching articles from the archive index', bold=True)
+        return ArchiveIndex(index_dir).write(
+            'paper_id', ids_list, self.extracted_output,
+            project_body_text if project else None)
+
+    def _open_s2rc(self, archive, id_filter: ArchiveFilter) -> Generator:
         """Dependency: Helper for get_articles method
         Synopsis: Open individual S2ORC pdf archive"""
         try:
             with gzip.open(archive) as f:
-                articles = (json.loads(article) for article in f)
-                for article in articles:
-                    if jmespath.search('paper_id', article) in ids_list:
-                        yield article
+                for article in id_filter.select(f):
+                    yield article
         except EOFError:
             header = typer.style("Invalid archive: ", bold=True)
             invalid_archive = typer.style(f"{archive}",
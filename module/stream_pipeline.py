@@ -0,0 +1,272 @@
+from typing import Any, Callable, Dict, Generator, Iterable, List, Optional
+from typing import Tuple, Union
+from .query_archives import ArchiveFilter, BatchWriter, Projection
+from .query_archives import pair_archives, stream_pairs
+from .extract_data import project_body_text, project_metadata
+from .tabulate_data import join_rows, merged_columns, pdf_texts
+from .mine_data_pipeline import MineData, read_batch
+from contextlib import ExitStack, closing
+from pathlib import Path
+import threading
+import typer
+import queue
+import json
+import csv
+import io
+
+# Number of shards (or mining batches) buffered between two stages
+QUEUE_SIZE = 4
+# Number of merged table rows mined at once
+MINE_BATCH = 1000
+# Seconds a stage waits on a full / empty queue before it checks whether
+# another stage has failed
+QUEUE_POLL = 0.5
+# Optional checkpoints, the intermediate files of the five-step flow
+# (scan_s2orc_meta.py / scan_s2orc_pdf.py, extract_s2orc.py,
+# tabulate_s2orc.py --stream)
+CHECKPOINTS = [
+    'meta_raw', 'pdf_raw', 'meta_extracted', 'pdf_extracted', 'merged_table'
+]
+# Taxonomic tables of mine_data.py '{domain: type_prefix}'
+TAXA_PREFIXES = {'Bacteria': 'art_bacteria', 'Archaea': 'art_archaea'}
+
+
+class PipelineStopped(Exception):
+    """Synopsis: Raised in a stage of StreamPipeline, when another stage
+    has failed"""
+
+
+class StreamPipeline:
+    """Synopsis: StreamPipeline class is dedicated to a single streaming
+    run of the five-step flow (scan meta, scan pdf, extract, tabulate,
+    mine). Paired archives (same shard number) are scanned in worker
+    processes, extraction and tabulation run in threads and the mining in
+    the calling thread; the stages are connected by bounded queues, so a
+    slow stage holds the previous ones back (backpressure) and only a few
+    shards are held in memory. pdf_parse entries are looked up in the
+    paired shard only (S2ORC shards are paired by paper_id)
+    Input: PMIDs, metadata and pdf_parse archives, MineData (with loaded
+    mining), optional checkpoints '{checkpoint: FILE PATH}' (CHECKPOINTS)
+    Output: mined tables as written by mine_data.py, and the checkpoints,
+    same as the intermediate files of the five-step flow"""
+    def __init__(self,
+                 pmids: List[str],
+                 meta_archives: Iterable[Union[str, Path]],
+                 pdf_archives: Iterable[Union[str, Path]],
+                 record: MineData,
+                 n_workers: Optional[int] = None,
+                 checkpoints: Optional[Dict[str, str]] = None,
+                 queue_size: int = QUEUE_SIZE,
+                 mine_batch: int = MINE_BATCH,
+                 prefixes: Dict[str, str] = TAXA_PREFIXES,
+                 level: str = 'text') -> None:
+        self.pmids, self.record, self.n_workers = pmids, record, n_workers
+        self.pairs = pair_archives(meta_archives, pdf_archives)
+        self.checkpoints = {
+            name: path
+            for name, path in (checkpoints or dict()).items() if path
+        }
+        unknown = set(self.checkpoints) - set(CHECKPOINTS)
+        if unknown:
+            raise ValueError(f"Unknown checkpoints: {sorted(unknown)}")
+        self.queue_size, self.mine_batch = queue_size, mine_batch
+        self.prefixes, self.level = prefixes, level
+        self.failed = threading.Event()
+        self.errors: List[BaseException] = []
+        self.stats: Dict[str, Any] = {'hits_per_shard': dict()}
+
+    @property
+    def raw(self) -> bool:
+        """Synopsis: Whether the raw S2ORC entries are checkpointed;
+        otherwise the entries are projected by the scanning workers"""
+        return bool({'meta_raw', 'pdf_raw'} & set(self.checkpoints))
+
+    def run(self) -> Dict[str, Any]:
+        """Synopsis: Run all the stages concurrently until the mined
+        tables are written; the first error of a stage is raised
+        Output: Dict '{hits_per_shard: {archive: {metadata, pdf_parse}},
+        scanned, extracted, tabulated, mined}' (# entries / rows / texts)"""
+        for meta_archive, pdf_archive in self.pairs:
+            if pdf_archive is None:
+                header = typer.style('No paired pdf_parse archive: ',
+                                     bold=True)
+                typer.echo(header + typer.style(
+                    meta_archive, fg=typer.colors.RED, bold=True))
+        scanned, extracted, batches = (queue.Queue(self.queue_size)
+                                       for _ in range(3))
+        stages = [
+            threading.Thread(target=self._run_stage,
+                             args=(self._scan, scanned),
+                             daemon=True),
+            threading.Thread(target=self._run_stage,
+                             args=(self._extract, scanned, extracted),
+                             daemon=True),
+            threading.Thread(target=self._run_stage,
+                             args=(self._tabulate, extracted, batches),
+                             daemon=True)
+        ]
+        for stage in stages:
+            stage.start()
+        try:
+            self.stats['mined'] = self.record.mine_stream(
+                self._items(batches), self.level, self.prefixes)
+        except PipelineStopped:
+            pass
+        except BaseException:
+            self.failed.set()
+            raise
+        finally:
+            for stage in stages:
+                stage.join()
+        if self.errors:
+            raise self.errors[0]
+        return self.stats
+
+    def _run_stage(self, stage: Callable, *queues: queue.Queue) -> None:
+        """Dependency: Helper for run method
+        Synopsis: Run the stage in its thread and record its error, which
+        stops the other stages"""
+        try:
+            stage(*queues)
+        except PipelineStopped:
+            pass
+        except BaseException as error:
+            self.errors.append(error)
+            self.failed.set()
+
+    def _put(self, target: queue.Queue, item: Any) -> None:
+        """Dependency: Helper for the stages
+        Synopsis: Put the item into the queue, wait while the queue is
+        full (backpressure)"""
+        while True:
+            try:
+                target.put(item, timeout=QUEUE_POLL)
+                return
+            except queue.Full:
+                if self.failed.is_set():
+                    raise PipelineStopped
+
+    def _items(self, source: queue.Queue) -> Generator[Any, None, None]:
+        """Dependency: Helper for the stages
+        Synopsis: Yield the items of the queue until its end (None)"""
+        while True:
+            try:
+                item = source.get(timeout=QUEUE_POLL)
+            except queue.Empty:
+                if self.failed.is_set():
+                    raise PipelineStopped
+                continue
+            if item is None:
+                return
+            yield item
+
+    def _scan(self, scanned: queue.Queue) -> None:
+        """Dependency: Helper for run method
+        Synopsis: Scan the archive pairs (GettingPMID and GettingPDFs
+        scans) and pass the hits of every shard on"""
+        id_filter = ArchiveFilter('pubmed_id', self.pmids,
+                                  None if self.raw else project_metadata)
+        self.stats['scanned'] = 0
+        with closing(
+                stream_pairs(self.pairs, id_filter, self.n_workers,
+                             None if self.raw else project_body_text,
+                             self.queue_size)) as shards:
+            for meta_archive, meta_lines, pdf_lines in shards:
+                self.stats['hits_per_shard'][meta_archive] = {
+                    'metadata': len(meta_lines),
+                    'pdf_parse': len(pdf_lines)
+                }
+                self.stats['scanned'] += len(meta_lines) + len(pdf_lines)
+                self._put(scanned, (meta_lines, pdf_lines))
+        self._put(scanned, None)
+
+    def _extract(self, scanned: queue.Queue, extracted: queue.Queue) -> None:
+        """Dependency: Helper for run method
+        Synopsis: Extract the fields of interest (ExtractInfo) of every
+        shard and write the scan / extract checkpoints"""
+        projections: List[Projection] = ([project_metadata, project_body_text]
+                                         if self.raw else [None, None])
+        count = 0
+        with ExitStack() as stack:
+            writers = self._writers(stack, ['meta_raw', 'pdf_raw'])
+            extract_writers = self._writers(
+                stack, ['meta_extracted', 'pdf_extracted'])
+            for shard in self._items(scanned):
+                entries = []
+                for lines, projection, writer, extract_writer in zip(
+                        shard, projections, writers, extract_writers):
+                    if writer:
+                        writer.write(lines)
+                    shard_entries, lines = extract_lines(lines, projection)
+                    if extract_writer:
+                        extract_writer.write(lines)
+                    entries.append(shard_entries)
+                    count += len(shard_entries)
+                self._put(extracted, tuple(entries))
+        self.stats['extracted'] = count
+        self._put(extracted, None)
+
+    def _tabulate(self, extracted: queue.Queue,
+                  batches: queue.Queue) -> None:
+        """Dependency: Helper for run method
+        Synopsis: Left join metadata and pdf_parse entries of every shard
+        (TabulateData), write the merged table checkpoint and pass the
+        rows on in mining batches"""
+        # Extracted pdf_parse entries have section names
+        columns = merged_columns(True)
+        header = csv_text([columns])
+        pending: List[str] = []
+        n_pending, count = 0, 0
+        with ExitStack() as stack:
+            writer, = self._writers(stack, ['merged_table'])
+            if writer:
+                writer.write([header.encode()])
+            for meta_entries, pdf_entries in self._items(extracted):
+                rows = join_rows(meta_entries, pdf_texts(pdf_entries),
+                                 columns)
+                text = csv_text(rows)
+                if writer:
+                    writer.write([text.encode()])
+                pending.append(text)
+                n_pending += len(rows)
+                count += len(rows)
+                if n_pending >= self.mine_batch:
+                    self._put(batches,
+                              read_batch(header + ''.join(pending),
+                                         self.level))
+                    pending, n_pending = [], 0
+        if pending:
+            self._put(batches, read_batch(header + ''.join(pending),
+                                          self.level))
+        self.stats['tabulated'] = count
+        self._put(batches, None)
+
+    def _writers(self, stack: ExitStack,
+                 names: List[str]) -> List[Optional[BatchWriter]]:
+        """Dependency: Helper for the stages
+        Synopsis: Open writers of the requested checkpoints (None if not
+        requested); a checkpoint is renamed into place only if its stage
+        succeeds"""
+        return [
+            stack.enter_context(BatchWriter(self.checkpoints[name]))
+            if name in self.checkpoints else None for name in names
+        ]
+
+
+def extract_lines(lines: List[bytes],
+                  projection: Projection) -> Tuple[List[Dict], List[bytes]]:
+    """Synopsis: Decode (and project) the jsonl lines of S2ORC entries
+    Output: Tuple (entries, jsonl lines of the entries, as ExtractInfo
+    writes them)"""
+    if projection is None:
+        return [json.loads(line) for line in lines], lines
+    entries = [projection(json.loads(line)) for line in lines]
+    return entries, [(json.dumps(entry, ensure_ascii=False) + '\n').encode()
+                     for entry in entries]
+
+
+def csv_text(rows: List[List]) -> str:
+    """Synopsis: csv rows as written by TabulateData.stream_table"""
+    buffer = io.StringIO()
+    csv.writer(buffer, lineterminator='\n').writerows(rows)
+    return buffer.getvalue()
@@ -1,6 +1,39 @@
 from fastcore.utils import store_attr  # type: ignore
+from typing import Dict, Generator, Iterable, List, Optional
+from pathlib import Path
 import pandas as pd  # type: ignore
+import tempfile
+import sqlite3
 import typer
+import json
+import csv
+import os
+
+# Columns of the merged table
+MERGED_COLUMNS = [
+    's2orc_id', 'title', 'abstract', 'text', 'authors', 'year', 'pmid', 'doi'
+]
+# Optional column of the merged table, section names of the paragraphs
+# of the text (json list), if the pdf_parse extract has them
+SECTIONS_COLUMN = 'sections'
+# Fields of the pdf_parse extract joined to the metadata entries
+PDF_FIELDS = ['text', SECTIONS_COLUMN]
+# Number of metadata entries joined (and written) at once in streaming mode
+JOIN_BATCH = 1000
+# Merged table formats by file suffix; arrow (uncompressed Arrow IPC) can be
+# memory-mapped, parquet and arrow need pyarrow, csv is kept for export
+TABLE_FORMATS = {
+    '.csv': 'csv',
+    '.parquet': 'parquet',
+    '.arrow': 'arrow',
+    '.feather': 'arrow'
+}
+
+
+def table_format(table_file: str) -> str:
+    """Synopsis: Format of the merged table (csv, parquet or arrow)
+    based on the file suffix (csv by default)"""
+    return TABLE_FORMATS.get(Path(table_file).suffix.lower(), 'csv')
 
 
 class TabulateData:
@@ -21,13 +54,158 @@ class TabulateData:
         """Synopsis: Merge metadata and pdf_parse data"""
         try:
             raw_df = meta_df.merge(pdf_df, on='s2orc_id', how='left')
-            return raw_df.reindex(columns=[
-                's2orc_id', 'title', 'abstract', 'text', 'authors', 'year',
-                'pmid', 'doi'
-            ])
+            return raw_df.reindex(
+                columns=merged_columns(SECTIONS_COLUMN in pdf_df))
         except ValueError:
             typer.secho('Argument with inappropriate value', bold=True)
 
     def write_table(self, merged_df: pd.DataFrame):
-        """Synopsis: Write merged dataframe to a file"""
-        merged_df.to_csv(self.merged_tbl, na_rep='N/A', index=False)
+        """Synopsis: Write merged dataframe to a file; csv, or columnar
+        parquet / arrow table (based on the merged_tbl suffix)"""
+        fmt = table_format(self.merged_tbl)
+        if fmt == 'parquet':
+            merged_df.to_parquet(self.merged_tbl, index=False)
+        elif fmt == 'arrow':
+            # Uncompressed, so the columns can be memory-mapped
+            merged_df.reset_index(drop=True).to_feather(
+                self.merged_tbl, compression='uncompressed')
+        else:
+            merged_df.to_csv(self.merged_tbl, na_rep='N/A', index=False)
+
+    def stream_table(self,
+                     batch_size: int = JOIN_BATCH,
+                     spill_dir: Optional[str] = None) -> int:
+        """Synopsis: Out-of-core alternative to read_jsonl, merge_df and
+        write_table; pdf_parse texts are spilled to a SQLite index, then
+        the metadata entries are left joined on s2orc_id batch by batch
+        and appended to the table (atomically), so the memory is bounded
+        by the batch size instead of the corpus size
+        Input: batch size, PATH for the spill file (default: temp dir)
+        Output: # rows of the merged table"""
+        n_rows = 0
+        tmp_file = Path(f"{self.merged_tbl}.tmp")
+        with tempfile.TemporaryDirectory(dir=spill_dir) as tmp_dir:
+            with sqlite3.connect(Path(tmp_dir) / 'pdf.sqlite') as db:
+                columns = merged_columns(self._spill_pdf(db, batch_size))
+                try:
+                    with open(tmp_file, 'w', newline='') as f:
+                        writer = csv.writer(f, lineterminator='\n')
+                        writer.writerow(columns)
+                        for batch in self._read_batches(
+                                self.extract_meta, batch_size):
+                            rows = self._join_batch(db, batch, columns)
+                            writer.writerows(rows)
+                            n_rows += len(rows)
+                    os.replace(tmp_file, self.merged_tbl)
+                finally:
+                    if tmp_file.exists():
+                        tmp_file.unlink()
+            db.close()
+        return n_rows
+
+    def _spill_pdf(self, db: sqlite3.Connection, batch_size: int) -> bool:
+        """Dependency: Helper for stream_table method
+        Synopsis: Write s2orc_id and the PDF_FIELDS of pdf_parse entries
+        to SQLite table (file order is kept as rowid)
+        Output: whether the entries have section names"""
+        db.execute('CREATE TABLE pdf (s2orc_id TEXT, fields TEXT)')
+        has_sections = False
+        for batch in self._read_batches(self.extract_pdf, batch_size):
+            has_sections |= any(SECTIONS_COLUMN in entry for entry in batch)
+            db.executemany('INSERT INTO pdf VALUES (?, ?)',
+                           ((_join_key(entry.get('s2orc_id')),
+                             json.dumps(_pdf_fields(entry)))
+                            for entry in batch))
+        db.execute('CREATE INDEX pdf_id ON pdf (s2orc_id)')
+        return has_sections
+
+    def _read_batches(self, file: str,
+                      batch_size: int) -> Generator[List[Dict], None, None]:
+        """Dependency: Helper for stream_table method
+        Synopsis: Read jsonl file in batches of decoded entries"""
+        batch: List[Dict] = []
+        with open(file) as f:
+            for line in f:
+                if line.strip():
+                    batch.append(json.loads(line))
+                if len(batch) == batch_size:
+                    yield batch
+                    batch = []
+        if batch:
+            yield batch
+
+    def _join_batch(self, db: sqlite3.Connection, batch: List[Dict],
+                    columns: List[str]) -> List[List]:
+        """Dependency: Helper for stream_table method
+        Synopsis: Left join batch of metadata entries with pdf_parse texts
+        (as merge_df does, a metadata entry is repeated per matching text)
+        Output: csv rows in columns order"""
+        keys = {_join_key(entry.get('s2orc_id')) for entry in batch} - {None}
+        texts: Dict[str, List[Dict]] = dict()
+        for key, fields in _select_texts(db, keys):
+            texts.setdefault(key, []).append(json.loads(fields))
+        return join_rows(batch, texts, columns)
+
+
+def merged_columns(has_sections: bool) -> List[str]:
+    """Synopsis: Columns of the merged table (with the SECTIONS_COLUMN,
+    if the pdf_parse extract has section names)"""
+    return MERGED_COLUMNS + ([SECTIONS_COLUMN] if has_sections else [])
+
+
+def pdf_texts(entries: Iterable[Dict]) -> Dict[str, List[Dict]]:
+    """Synopsis: PDF_FIELDS of the extracted pdf_parse entries by join
+    key (s2orc_id, None is never joined), in the entries order
+    Output: Dict '{s2orc_id: [{text, sections}]}'"""
+    texts: Dict[str, List[Dict]] = dict()
+    for entry in entries:
+        key = _join_key(entry.get('s2orc_id'))
+        if key is not None:
+            texts.setdefault(key, []).append(_pdf_fields(entry))
+    return texts
+
+
+def join_rows(batch: List[Dict],
+              texts: Dict[str, List[Dict]],
+              columns: List[str] = MERGED_COLUMNS) -> List[List]:
+    """Synopsis: Left join extracted metadata entries with pdf_parse texts
+    (see pdf_texts); as merge_df does, a metadata entry is repeated per
+    matching text
+    Output: csv rows in columns order"""
+    rows = []
+    for entry in batch:
+        for fields in texts.get(_join_key(entry.get('s2orc_id')), [dict()]):
+            entry.update({field: fields.get(field) for field in PDF_FIELDS})
+            rows.append([_csv_value(entry.get(column)) for column in columns])
+    return rows
+
+
+def _pdf_fields(entry: Dict) -> Dict:
+    """Dependency: Helper for TabulateData streaming join
+    Synopsis: PDF_FIELDS of the extracted pdf_parse entry"""
+    return {field: entry.get(field) for field in PDF_FIELDS}
+
+
+def _select_texts(db: sqlite3.Connection, keys: Iterable[str]):
+    """Dependency: Helper for TabulateData._join_batch method
+    Synopsis: Select (s2orc_id, PDF_FIELDS json) of the keys in pdf_parse
+    file order"""
+    keys = list(keys)
+    # Stay below SQLite limit of host parameters
+    for start in range(0, len(keys), 900):
+        chunk = keys[start:start + 900]
+        yield from db.execute(
+            f"SELECT s2orc_id, fields FROM pdf WHERE s2orc_id IN "
+            f"({', '.join('?' * len(chunk))}) ORDER BY rowid", chunk)
+
+
+def _join_key(value) -> Optional[str]:
+    """Dependency: Helper for TabulateData streaming join
+    Synopsis: s2orc_id as join key (None is never joined)"""
+    return None if value is None else str(value)
+
+
+def _csv_value(value):
+    """Dependency: Helper for TabulateData._join_batch method
+    Synopsis: Missing values are written as N/A (same as write_table)"""
+    return 'N/A' if value is None else value
@@ -0,0 +1,381 @@
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional
+from typing import Sequence, Tuple, Union
+from collections import Counter
+from itertools import groupby
+from scipy import sparse  # type: ignore
+from pathlib import Path
+import pandas as pd  # type: ignore
+import numpy as np  # type: ignore
+import tempfile
+import zipfile
+import heapq
+
+# Number of rows of the blocks merged and written by merge_runs
+MERGE_BLOCK = 10000
+
+
+class TermMatrix:
+    """Synopsis: TermMatrix class is dedicated to the document x term
+    count matrix of the mined data (scipy.sparse CSR matrix)
+    Input: count matrix, row labels (s2orc_ids), column labels
+    (data_category, term) and data categories (columns of the tables)
+    Output: npz file and the '{term} ({count})' tables rendered from it;
+    column indices of a row follow the order of the first mention of
+    the terms in the text (CSR indices are kept unsorted)"""
+    def __init__(self, counts: sparse.csr_matrix, s2orc_ids: Sequence[Any],
+                 terms: Sequence[Tuple[str, str]],
+                 categories: Sequence[str]) -> None:
+        self.counts = counts
+        self.s2orc_ids = np.asarray(s2orc_ids)
+        self.terms = [tuple(term) for term in terms]
+        self.categories = list(categories)
+
+    @classmethod
+    def from_hits(cls, s2orc_ids: Sequence[Any],
+                  hits_per_text: Iterable[Dict[str, List[str]]],
+                  categories: Sequence[str]) -> 'TermMatrix':
+        """Synopsis: Count the matched terms of each text
+        Input: s2orc_ids and Dict '{data_category: [matched terms]}'
+        per text (a repeated s2orc_id keeps its last text, like
+        ExtractData.map_s2orc_id does)"""
+        columns: Dict[Tuple[str, str], int] = dict()
+        rows: Dict[Any, Tuple[List[int], List[int]]] = dict()
+        for s2orc_id, hits in zip(s2orc_ids, hits_per_text):
+            row_columns, row_counts = [], []
+            for category in categories:
+                for term, count in Counter(hits.get(category, [])).items():
+                    row_columns.append(columns.setdefault((category, term),
+                                                          len(columns)))
+                    row_counts.append(count)
+            rows[s2orc_id] = (row_columns, row_counts)
+        return cls.from_rows(rows, list(columns), categories)
+
+    @classmethod
+    def from_rows(cls, rows: Dict[Any, Tuple[List[int], List[int]]],
+                  terms: List[Tuple[str, str]],
+                  categories: Sequence[str]) -> 'TermMatrix':
+        """Dependency: Helper for from_hits and stack methods
+        Synopsis: Assemble CSR matrix (columns ordered by data category
+        and term) from the column indices and counts of each row"""
+        order = {category: i for i, category in enumerate(categories)}
+        sorted_columns = sorted(range(len(terms)),
+                                key=lambda i: (order[terms[i][0]], terms[i]))
+        new_index = np.empty(len(terms), dtype=np.int64)
+        new_index[sorted_columns] = np.arange(len(terms))
+        indptr = np.cumsum([0] + [len(cols) for cols, _ in rows.values()])
+        indices = np.fromiter(
+            (i for cols, _ in rows.values() for i in cols), dtype=np.int64,
+            count=indptr[-1])
+        data = np.fromiter((n for _, counts in rows.values() for n in counts),
+                           dtype=np.int64,
+                           count=indptr[-1])
+        counts = sparse.csr_matrix(
+            (data, new_index[indices], indptr),
+            shape=(len(rows), len(terms)))
+        return cls(counts, list(rows), [terms[i] for i in sorted_columns],
+                   categories)
+
+    def save(self, matrix_file: Union[str, Path]) -> None:
+        """Synopsis: Write the matrix and its labels to npz file"""
+        np.savez_compressed(matrix_file,
+                            data=self.counts.data,
+                            indices=self.counts.indices,
+                            indptr=self.counts.indptr,
+                            shape=np.asarray(self.counts.shape),
+                            s2orc_ids=self.s2orc_ids,
+                            terms=np.asarray(self.terms,
+                                             dtype=str).reshape(-1, 2),
+                            categories=np.asarray(self.categories, dtype=str))
+
+    @classmethod
+    def load(cls, matrix_file: Union[str, Path]) -> 'TermMatrix':
+        """Synopsis: Read the matrix written by the save method"""
+        with np.load(matrix_file) as f:
+            counts = sparse.csr_matrix(
+                (f['data'], f['indices'], f['indptr']),
+                shape=tuple(f['shape']))
+            return cls(counts, f['s2orc_ids'], f['terms'].tolist(),
+                       f['categories'].tolist())
+
+    def select(self, mask: Sequence[bool]) -> 'TermMatrix':
+        """Synopsis: Rows of the matrix selected by the boolean mask"""
+        return TermMatrix.stack([self], rows_of=[np.flatnonzero(mask)])
+
+    @staticmethod
+    def stack(matrices: List['TermMatrix'],
+              rows_of: Optional[List[Any]] = None) -> 'TermMatrix':
+        """Synopsis: Stack the rows of several matrices (of the same data
+        categories); the columns are aligned by the (data_category, term)
+        labels, the row order of the first mention is kept"""
+        columns: Dict[Tuple[str, str], int] = dict()
+        rows: Dict[Any, Tuple[List[int], List[int]]] = dict()
+        for i, matrix in enumerate(matrices):
+            remap = [
+                columns.setdefault(term, len(columns))
+                for term in matrix.terms
+            ]
+            selected = (range(matrix.counts.shape[0])
+                        if rows_of is None else rows_of[i])
+            indptr, indices = matrix.counts.indptr, matrix.counts.indices
+            for row in selected:
+                start, end = indptr[row], indptr[row + 1]
+                rows[matrix.s2orc_ids[row].item()] = (
+                    [remap[j] for j in indices[start:end]],
+                    matrix.counts.data[start:end].tolist())
+        return TermMatrix.from_rows(rows, list(columns),
+                                    matrices[0].categories)
+
+    def sort_rows(self) -> 'TermMatrix':
+        """Synopsis: Rows sorted by s2orc_id"""
+        return TermMatrix.stack(
+            [self], rows_of=[np.argsort(self.s2orc_ids, kind='stable')])
+
+    def to_frame(self) -> pd.DataFrame:
+        """Synopsis: Render the matrix as table with a column per data
+        category and lists of '{term} ({count})' cells ('-' if none)"""
+        cells: Dict[str, List[Any]] = {
+            category: ['-'] * self.counts.shape[0]
+            for category in self.categories
+        }
+        indptr, indices = self.counts.indptr, self.counts.indices
+        data = self.counts.data
+        for row in range(self.counts.shape[0]):
+            for i in range(indptr[row], indptr[row + 1]):
+                category, term = self.terms[indices[i]]
+                cell = cells[category][row]
+                if cell == '-':
+                    cell = cells[category][row] = []
+                cell.append(f"{term} ({data[i]})")
+        return pd.DataFrame({'s2orc_id': self.s2orc_ids, **cells})
+
+
+class MatrixRun:
+    """Synopsis: MatrixRun class is dedicated to the rows of a count
+    matrix spilled to uncompressed npy files (e.g. the matrix of a mined
+    batch), which are memory-mapped when the runs are merged
+    Input: directory of the run
+    Output: arrays of the run (see read method)"""
+    def __init__(self, run_dir: Union[str, Path]) -> None:
+        self.run_dir = Path(run_dir)
+
+    @classmethod
+    def spill(cls, matrix: TermMatrix,
+              run_dir: Union[str, Path]) -> 'MatrixRun':
+        """Synopsis: Write the matrix and its labels to the run
+        directory"""
+        run = cls(run_dir)
+        run.run_dir.mkdir(parents=True)
+        run.write(data=matrix.counts.data,
+                  indices=matrix.counts.indices,
+                  indptr=matrix.counts.indptr,
+                  s2orc_ids=matrix.s2orc_ids,
+                  terms=np.asarray(matrix.terms, dtype=str).reshape(-1, 2),
+                  categories=np.asarray(matrix.categories, dtype=str))
+        return run
+
+    def write(self, **arrays: np.ndarray) -> None:
+        """Synopsis: (Over)write arrays of the run"""
+        for name, array in arrays.items():
+            np.save(self.run_dir / f"{name}.npy", array)
+
+    def read(self, name: str, mmap: bool = False) -> np.ndarray:
+        """Synopsis: Array of the run (data, indices, indptr, s2orc_ids,
+        terms or categories), memory-mapped if mmap"""
+        return np.load(self.run_dir / f"{name}.npy",
+                       mmap_mode='r' if mmap else None)
+
+    def sort(self, convert: Callable[[np.ndarray], np.ndarray]) -> None:
+        """Synopsis: Convert the s2orc_ids (e.g. to the dtype of the whole
+        table) and sort the rows of the run by them, as merge_runs expects
+        Input: Function converting the s2orc_ids array"""
+        s2orc_ids = self.read('s2orc_ids')
+        if not len(s2orc_ids):
+            return
+        s2orc_ids = convert(s2orc_ids)
+        order = np.argsort(s2orc_ids, kind='stable')
+        indptr = self.read('indptr')
+        lengths = np.diff(indptr)[order]
+        positions = np.concatenate(
+            [np.arange(indptr[row], indptr[row + 1]) for row in order] +
+            [np.empty(0, dtype=np.int64)])
+        self.write(data=self.read('data')[positions],
+                   indices=self.read('indices')[positions],
+                   indptr=np.concatenate([[0], np.cumsum(lengths)]),
+                   s2orc_ids=s2orc_ids[order])
+
+
+def merge_runs(
+    runs: List[MatrixRun],
+    categories: Sequence[str],
+    block_rows: int = MERGE_BLOCK
+) -> Tuple[List[Tuple[str, str]], Iterator[TermMatrix]]:
+    """Synopsis: k-way merge of the runs (sorted by s2orc_id) into blocks
+    of rows sorted by s2orc_id; a repeated s2orc_id keeps the row of the
+    last run, like TermMatrix.stack does; only the rows of a block are
+    held in memory
+    Input: sorted runs (see MatrixRun.sort method), data categories,
+    # rows of a block
+    Output: column labels (ordered like from_rows orders them) and
+    generator of the row blocks (at least one, possibly empty)"""
+    order = {category: i for i, category in enumerate(categories)}
+    run_terms = [
+        [tuple(term) for term in run.read('terms').tolist()] for run in runs
+    ]
+    terms = sorted({term for labels in run_terms for term in labels},
+                   key=lambda term: (order[term[0]], term))
+    columns = {term: i for i, term in enumerate(terms)}
+    remaps = [
+        np.asarray([columns[term] for term in labels], dtype=np.int64)
+        for labels in run_terms
+    ]
+    return terms, _merged_blocks(runs, remaps, terms, categories, block_rows)
+
+
+def _merged_blocks(runs: List[MatrixRun], remaps: List[np.ndarray],
+                   terms: List[Tuple[str, str]], categories: Sequence[str],
+                   block_rows: int) -> Iterator[TermMatrix]:
+    """Dependency: Helper for merge_runs function
+    Synopsis: Generate the merged row blocks"""
+    arrays = [{
+        name: run.read(name, mmap=True)
+        for name in ['data', 'indices', 'indptr', 's2orc_ids']
+    } for run in runs]
+    merged = heapq.merge(*[
+        _run_rows(run['s2orc_ids'], i, block_rows)
+        for i, run in enumerate(arrays)
+    ])
+    s2orc_ids: List[Any] = []
+    data: List[np.ndarray] = []
+    indices: List[np.ndarray] = []
+    lengths: List[int] = []
+    for s2orc_id, group in groupby(merged, key=lambda item: item[0]):
+        *_, (_, i, row) = group
+        indptr = arrays[i]['indptr']
+        start, end = indptr[row], indptr[row + 1]
+        s2orc_ids.append(s2orc_id)
+        data.append(arrays[i]['data'][start:end])
+        indices.append(remaps[i][arrays[i]['indices'][start:end]])
+        lengths.append(end - start)
+        if len(s2orc_ids) == block_rows:
+            yield _block(s2orc_ids, data, indices, lengths, terms, categories)
+            s2orc_ids, data, indices, lengths = [], [], [], []
+    if s2orc_ids or not any(len(run['s2orc_ids']) for run in arrays):
+        yield _block(s2orc_ids, data, indices, lengths, terms, categories)
+
+
+def _run_rows(s2orc_ids: np.ndarray, i: int,
+              block_rows: int) -> Iterator[Tuple[Any, int, int]]:
+    """Dependency: Helper for _merged_blocks function
+    Synopsis: (s2orc_id, # run, # row) of the rows of a sorted run, the
+    s2orc_ids are read a block at a time"""
+    for start in range(0, len(s2orc_ids), block_rows):
+        for row, s2orc_id in enumerate(
+                s2orc_ids[start:start + block_rows].tolist(), start):
+            yield s2orc_id, i, row
+
+
+def _block(s2orc_ids: List[Any], data: List[np.ndarray],
+           indices: List[np.ndarray], lengths: List[int],
+           terms: List[Tuple[str, str]],
+           categories: Sequence[str]) -> TermMatrix:
+    """Dependency: Helper for _merged_blocks function
+    Synopsis: TermMatrix of the merged rows"""
+    counts = sparse.csr_matrix(
+        (np.concatenate(data + [np.empty(0, dtype=np.int64)]),
+         np.concatenate(indices + [np.empty(0, dtype=np.int64)]),
+         np.cumsum([0] + lengths)),
+        shape=(len(s2orc_ids), len(terms)))
+    return TermMatrix(
+        counts,
+        np.asarray(s2orc_ids) if s2orc_ids else np.empty(0, dtype=str),
+        terms, categories)
+
+
+class MatrixWriter:
+    """Synopsis: MatrixWriter class is dedicated to writing a count matrix
+    to the npz file of TermMatrix.save method one block of rows at a time;
+    the arrays of the blocks are spilled to a temporary directory and
+    concatenated into the npz file on exit
+    Input: npz file, column labels and data categories of the matrix
+    Output: npz file (see TermMatrix.load method)"""
+    def __init__(self, matrix_file: Union[str, Path],
+                 terms: Sequence[Tuple[str, str]],
+                 categories: Sequence[str]) -> None:
+        self.matrix_file = matrix_file
+        self.terms = terms
+        self.categories = categories
+
+    def __enter__(self) -> 'MatrixWriter':
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.blocks: Dict[str, List[Path]] = {
+            name: []
+            for name in ['data', 'indices', 'indptr', 's2orc_ids']
+        }
+        self.n_rows = self.n_values = 0
+        self._spill('indptr', np.zeros(1, dtype=np.int64))
+        return self
+
+    def append(self, block: TermMatrix) -> None:
+        """Synopsis: Append the rows of the block (its columns are the
+        columns of the matrix)"""
+        self._spill('data', block.counts.data)
+        self._spill('indices', block.counts.indices)
+        self._spill('indptr',
+                    block.counts.indptr[1:].astype(np.int64) + self.n_values)
+        self._spill('s2orc_ids', block.s2orc_ids)
+        self.n_rows += block.counts.shape[0]
+        self.n_values += block.counts.nnz
+
+    def _spill(self, name: str, array: np.ndarray) -> None:
+        """Dependency: Helper for append method
+        Synopsis: Write array of a block to the temporary directory"""
+        block_file = Path(self.tmp_dir.name,
+                          f"{name}-{len(self.blocks[name])}.npy")
+        np.save(block_file, array)
+        self.blocks[name].append(block_file)
+
+    def __exit__(self, exc_type, *_) -> None:
+        try:
+            if exc_type is None:
+                self._write()
+        finally:
+            self.tmp_dir.cleanup()
+
+    def _write(self) -> None:
+        """Dependency: Helper for __exit__ method
+        Synopsis: Concatenate the block arrays into the npz file (arrays
+        of TermMatrix.save method, compressed like np.savez_compressed)"""
+        with zipfile.ZipFile(self.matrix_file, mode='w',
+                             compression=zipfile.ZIP_DEFLATED,
+                             allowZip64=True) as zipf:
+            for name in ['data', 'indices', 'indptr']:
+                self._write_blocks(zipf, name)
+            self._write_array(zipf, 'shape',
+                              np.asarray((self.n_rows, len(self.terms))))
+            self._write_blocks(zipf, 's2orc_ids')
+            self._write_array(
+                zipf, 'terms',
+                np.asarray(self.terms, dtype=str).reshape(-1, 2))
+            self._write_array(zipf, 'categories',
+                              np.asarray(self.categories, dtype=str))
+
+    def _write_blocks(self, zipf: zipfile.ZipFile, name: str) -> None:
+        """Dependency: Helper for _write method
+        Synopsis: Write the blocks of an array to the npz file, one block
+        in memory at a time"""
+        blocks = [np.load(path, mmap_mode='r') for path in self.blocks[name]]
+        dtype = np.result_type(*blocks)
+        header = np.lib.format.header_data_from_array_1_0(
+            np.empty(0, dtype=dtype))
+        header['shape'] = (sum(len(block) for block in blocks), )
+        with zipf.open(f"{name}.npy", 'w', force_zip64=True) as fid:
+            np.lib.format.write_array_header_1_0(fid, header)
+            for block in blocks:
+                fid.write(block.astype(dtype, copy=False).tobytes())
+
+    def _write_array(self, zipf: zipfile.ZipFile, name: str,
+                     array: np.ndarray) -> None:
+        """Dependency: Helper for _write method
+        Synopsis: Write a (small) array to the npz file"""
+        with zipf.open(f"{name}.npy", 'w', force_zip64=True) as fid:
+            np.lib.format.write_array(fid, array)
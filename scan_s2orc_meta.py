@@ -1,4 +1,5 @@
 from module.query_metadata import GettingPMID
+from module.metrics import PipelineMetrics, files_size
 import argparse
 
 if __name__ == "__main__":
@@ -15,7 +16,7 @@ if __name__ == "__main__":
     parser.add_argument('-a',
                         '--archives_path',
                         metavar='',
-                        required=True,
+                        required=False,
                         help='Provide PATH to meta S2ORC archives')
     parser.add_argument('-o',
                         '--output_file',
@@ -26,15 +27,103 @@ if __name__ == "__main__":
                         '--entrez_query',
                         metavar='',
                         required=False,
+                        default='mud[TIAB] AND volcano[TIAB]',
                         help='Provide Entrez search query')
+    parser.add_argument('-c',
+                        '--cache_dir',
+                        metavar='',
+                        required=False,
+                        help='Provide PATH for the Entrez results cache')
+    parser.add_argument('-w',
+                        '--workers',
+                        metavar='',
+                        type=int,
+                        required=False,
+                        help='Provide number of worker processes '
+                        '(default: all CPUs)')
+    parser.add_argument('-x',
+                        '--index',
+                        metavar='',
+                        required=False,
+                        help='Provide PATH to archive index (index_s2orc.py) '
+                        'to fetch entries without scanning the archives')
+    parser.add_argument('-p',
+                        '--pdf_archives',
+                        metavar='',
+                        required=False,
+                        help='Provide PATH to S2ORC pdf_parse archives '
+                        'to scan them jointly with the meta archives')
+    parser.add_argument('-op',
+                        '--pdf_output',
+                        metavar='',
+                        required=False,
+                        help='Provide pdf_parse jsonl output FILE PATH '
+                        '(joint scan)')
+    parser.add_argument('-r',
+                        '--resume',
+                        action='store_true',
+                        help='Resume interrupted scan '
+                        '(skip finished archives)')
+    parser.add_argument('-t',
+                        '--project',
+                        action='store_true',
+                        help='Write only the fields of interest '
+                        '(no separate extract_s2orc.py pass)')
+    parser.add_argument('-mt',
+                        '--metrics',
+                        metavar='',
+                        required=False,
+                        help='Provide FILE PATH for json report of the stage '
+                        'timings, throughput and peak RSS')
+    parser.add_argument('-pf',
+                        '--profile',
+                        metavar='',
+                        required=False,
+                        help='Provide PATH for cProfile dumps of the stages')
     args = parser.parse_args()
+    if not (args.archives_path or args.index):
+        parser.error('Provide either --archives_path or --index')
+    if bool(args.pdf_archives) != bool(args.pdf_output):
+        parser.error('Provide both --pdf_archives and --pdf_output')
 
     # Pipeline per se
+    metrics = PipelineMetrics(args.metrics, args.profile)
     # Init GettingPMID class
-    entrez = GettingPMID(args.email, args.archives_path, args.output_file,
-                         args.entrez_query)
+    entrez = GettingPMID(args.email,
+                         args.archives_path or args.index,
+                         args.output_file,
+                         args.entrez_query,
+                         cache_dir=args.cache_dir)
     # Get PMIDs from Pubmed
-    pmids = entrez.get_pmid
+    with metrics.stage('get_pmid') as stats:
+        pmids = entrez.get_pmid
+        stats['records'] = len(pmids)
     # Search for articles of interest in S2ORC meta archives
-    interest = entrez.get_articles(pmids)
-    final_result = entrez.parallel_process(interest)
+    with metrics.stage('scan') as stats:
+        if args.pdf_archives:
+            hits = entrez.scan_paired(pmids, args.pdf_archives,
+                                      args.pdf_output, args.workers,
+                                      args.resume, args.project)
+            stats['hits_per_shard'] = {
+                archive: {
+                    'metadata': meta,
+                    'pdf_parse': pdf
+                }
+                for archive, (meta, pdf) in hits.items()
+            }
+            stats['records'] = sum(meta + pdf for meta, pdf in hits.values())
+            stats['bytes'] = files_size(args.archives_path,
+                                        args.pdf_archives,
+                                        pattern='**/*.gz')
+        elif args.index:
+            stats['hits_per_shard'] = entrez.fetch_indexed(
+                pmids, args.index, args.project)
+            stats['records'] = sum(stats['hits_per_shard'].values())
+        else:
+            stats['hits_per_shard'] = entrez.scan_archives(
+                pmids, args.workers, args.resume, args.project)
+            stats['records'] = sum(stats['hits_per_shard'].values())
+            stats['bytes'] = files_size(args.archives_path,
+                                        pattern='**/*.gz')
+        stats['output_bytes'] = files_size(args.output_file, args.pdf_output)
+    metrics.write()
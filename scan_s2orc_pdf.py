@@ -1,4 +1,5 @@
 from module.query_pdf import GettingPDFs
+from module.metrics import PipelineMetrics, files_size
 import argparse
 
 if __name__ == "__main__":
@@ -13,21 +14,71 @@ if __name__ == "__main__":
     parser.add_argument('-a',
                         '--pdf_archives',
                         metavar='',
-                        required=True,
+                        required=False,
                         help='Provide PATH to S2ORC pdf_parse archives')
     parser.add_argument('-o',
                         '--output_file',
                         required=True,
                         help="""Provide PATH for jsonl file with
         the extracted S2ORC pdf_parse entries""")
+    parser.add_argument('-w',
+                        '--workers',
+                        metavar='',
+                        type=int,
+                        required=False,
+                        help='Provide number of worker processes '
+                        '(default: all CPUs)')
+    parser.add_argument('-x',
+                        '--index',
+                        metavar='',
+                        required=False,
+                        help='Provide PATH to archive index (index_s2orc.py) '
+                        'to fetch entries without scanning the archives')
+    parser.add_argument('-r',
+                        '--resume',
+                        action='store_true',
+                        help='Resume interrupted scan '
+                        '(skip finished archives)')
+    parser.add_argument('-t',
+                        '--project',
+                        action='store_true',
+                        help='Write only the fields of interest '
+                        '(no separate extract_s2orc.py pass)')
+    parser.add_argument('-mt',
+                        '--metrics',
+                        metavar='',
+                        required=False,
+                        help='Provide FILE PATH for json report of the stage '
+                        'timings, throughput and peak RSS')
+    parser.add_argument('-pf',
+                        '--profile',
+                        metavar='',
+                        required=False,
+                        help='Provide PATH for cProfile dumps of the stages')
     args = parser.parse_args()
+    if not (args.pdf_archives or args.index):
+        parser.error('Provide either --pdf_archives or --index')
 
     # Pipeline per se
+    metrics = PipelineMetrics(args.metrics, args.profile)
     # Init GettingPDFs class
-    record = GettingPDFs(args.metadata_input, args.pdf_archives,
+    record = GettingPDFs(args.metadata_input, args.pdf_archives or args.index,
                          args.output_file)
     # Get paper_ids from metadata jsonl file
-    ids = record.open_input
+    with metrics.stage('read_ids') as stats:
+        ids = record.open_input
+        stats['records'] = len(ids)
+        stats['bytes'] = files_size(args.metadata_input)
     # Extract pdf_parse entries
-    articles_interest = record.get_articles(ids)
-    record.parallel_process(articles_interest)
+    with metrics.stage('scan') as stats:
+        if args.index:
+            stats['hits_per_shard'] = record.fetch_indexed(
+                ids, args.index, args.project)
+        else:
+            stats['hits_per_shard'] = record.scan_archives(
+                ids, args.workers, args.resume, args.project)
+            stats['bytes'] = files_size(args.pdf_archives,
+                                        pattern='**/*.gz')
+        stats['records'] = sum(stats['hits_per_shard'].values())
+        stats['output_bytes'] = files_size(args.output_file)
+    metrics.write()
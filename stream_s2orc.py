@@ -0,0 +1,201 @@
+from module.query_metadata import GettingPMID
+from module.mine_data_pipeline import MineData, parse_section_filter
+from module.stream_pipeline import StreamPipeline, QUEUE_SIZE, MINE_BATCH
+from module.metrics import PipelineMetrics, files_size
+from module.tabulate_data import table_format
+from pathlib import Path
+import argparse
+
+if __name__ == "__main__":
+    # Design parser
+    parser = argparse.ArgumentParser(
+        description="""Run the whole pipeline (scan meta, scan pdf,
+        extract, tabulate, mine) as concurrent streaming stages;
+        intermediate files are optional checkpoints""")
+    parser.add_argument('-e',
+                        '--email',
+                        metavar='',
+                        required=True,
+                        help='Provide your email address (for Entrez)')
+    parser.add_argument('-q',
+                        '--entrez_query',
+                        metavar='',
+                        required=False,
+                        default='mud[TIAB] AND volcano[TIAB]',
+                        help='Provide Entrez search query')
+    parser.add_argument('-c',
+                        '--cache_dir',
+                        metavar='',
+                        required=False,
+                        help='Provide PATH for the Entrez results cache')
+    parser.add_argument('-a',
+                        '--archives_path',
+                        metavar='',
+                        required=True,
+                        help='Provide PATH to meta S2ORC archives')
+    parser.add_argument('-p',
+                        '--pdf_archives',
+                        metavar='',
+                        required=True,
+                        help='Provide PATH to S2ORC pdf_parse archives')
+    parser.add_argument(
+        '-mv',
+        '--output_mv',
+        metavar='',
+        required=True,
+        help='Provide output  PATH for mud volcano specific data table')
+    parser.add_argument(
+        '-taxa',
+        '--output_taxa',
+        metavar='',
+        required=True,
+        help='Provide output PATH for taxonomic specific data table')
+    parser.add_argument('-w',
+                        '--workers',
+                        metavar='',
+                        type=int,
+                        required=False,
+                        help='Provide number of scanning worker processes '
+                        '(default: all CPUs)')
+    parser.add_argument('-mw',
+                        '--mine_workers',
+                        metavar='',
+                        type=int,
+                        default=1,
+                        help='Provide number of mining worker processes')
+    parser.add_argument('-b',
+                        '--batch_size',
+                        metavar='',
+                        type=int,
+                        default=256,
+                        help='Provide number of texts per spaCy batch')
+    parser.add_argument('-mb',
+                        '--mine_batch',
+                        metavar='',
+                        type=int,
+                        default=MINE_BATCH,
+                        help='Provide number of merged table rows mined '
+                        f'at once (default: {MINE_BATCH})')
+    parser.add_argument('-qs',
+                        '--queue_size',
+                        metavar='',
+                        type=int,
+                        default=QUEUE_SIZE,
+                        help='Provide number of shards buffered between '
+                        f'the stages (default: {QUEUE_SIZE})')
+    parser.add_argument('-dc',
+                        '--doc_cache',
+                        metavar='',
+                        required=False,
+                        help='Provide PATH for the cache of tokenized texts '
+                        '(reused by the next runs)')
+    parser.add_argument('-cs',
+                        '--cache_size',
+                        metavar='',
+                        type=int,
+                        default=2048,
+                        help='Provide size limit of the cache in MB '
+                        '(default: 2048)')
+    parser.add_argument('-pg',
+                        '--paragraphs',
+                        action='store_true',
+                        help='Mine body text paragraphs as separate docs '
+                        '(bounded memory per doc)')
+    parser.add_argument('-sf',
+                        '--section_filter',
+                        metavar='',
+                        action='append',
+                        type=parse_section_filter,
+                        help='Provide section filter of the body texts, '
+                        'PREFIX:SECTION,!SECTION (e.g. methods:method,result '
+                        'or Bacteria:!reference); PREFIX is chemistry, '
+                        'geology, mv, methods, Bacteria or Archaea')
+    parser.add_argument('-cm',
+                        '--meta_raw',
+                        metavar='',
+                        required=False,
+                        help='Provide FILE PATH to checkpoint the metadata '
+                        'entries of interest (scan_s2orc_meta.py output)')
+    parser.add_argument('-cp',
+                        '--pdf_raw',
+                        metavar='',
+                        required=False,
+                        help='Provide FILE PATH to checkpoint the pdf_parse '
+                        'entries of interest (scan_s2orc_pdf.py output)')
+    parser.add_argument('-em',
+                        '--meta_extracted',
+                        metavar='',
+                        required=False,
+                        help='Provide FILE PATH to checkpoint the extracted '
+                        'metadata fields (extract_s2orc.py output)')
+    parser.add_argument('-ep',
+                        '--pdf_extracted',
+                        metavar='',
+                        required=False,
+                        help='Provide FILE PATH to checkpoint the extracted '
+                        'pdf_parse fields (extract_s2orc.py output)')
+    parser.add_argument('-o',
+                        '--merged_table',
+                        metavar='',
+                        required=False,
+                        help='Provide csv FILE PATH to checkpoint the merged '
+                        'table (tabulate_s2orc.py output)')
+    parser.add_argument('-mt',
+                        '--metrics',
+                        metavar='',
+                        required=False,
+                        help='Provide FILE PATH for json report of the stage '
+                        'timings, throughput and peak RSS')
+    parser.add_argument('-pf',
+                        '--profile',
+                        metavar='',
+                        required=False,
+                        help='Provide PATH for cProfile dumps of the stages')
+    args = parser.parse_args()
+    if args.merged_table and table_format(args.merged_table) != 'csv':
+        parser.error('Streaming mode writes csv tables only')
+
+    # Pipeline per se
+    metrics = PipelineMetrics(args.metrics, args.profile)
+    # Get PMIDs from Pubmed
+    entrez = GettingPMID(args.email,
+                         args.archives_path,
+                         args.meta_raw or '',
+                         args.entrez_query,
+                         cache_dir=args.cache_dir)
+    with metrics.stage('get_pmid') as stats:
+        pmids = entrez.get_pmid
+        stats['records'] = len(pmids)
+
+    # Init MineData class (dedicated to data mining)
+    record = MineData(args.merged_table or '', args.output_mv,
+                      args.output_taxa, args.batch_size, args.mine_workers,
+                      args.doc_cache, args.cache_size * 1024**2,
+                      paragraphs=args.paragraphs,
+                      section_filters=dict(args.section_filter or []))
+    record.load_mining
+
+    # Scan, extract, tabulate and mine at once
+    checkpoints = {
+        'meta_raw': args.meta_raw,
+        'pdf_raw': args.pdf_raw,
+        'meta_extracted': args.meta_extracted,
+        'pdf_extracted': args.pdf_extracted,
+        'merged_table': args.merged_table
+    }
+    pipeline = StreamPipeline(pmids, Path(args.archives_path).glob('**/*.gz'),
+                              Path(args.pdf_archives).glob('**/*.gz'),
+                              record, args.workers, checkpoints,
+                              args.queue_size, args.mine_batch)
+    with metrics.stage('stream') as stats:
+        since = record.mining_progress
+        stats.update(pipeline.run())
+        stats['docs_per_sec'] = record.mining_stats(since)['docs_per_sec']
+        stats['records'] = stats['scanned']
+        stats['bytes'] = files_size(args.archives_path,
+                                    args.pdf_archives,
+                                    pattern='**/*.gz')
+
+    # Trim the token cache and report its hits / misses
+    record.finish_mining()
+    metrics.write()
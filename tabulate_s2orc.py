@@ -1,4 +1,5 @@
-from module.tabulate_data import TabulateData
+from module.tabulate_data import TabulateData, table_format
+from module.metrics import PipelineMetrics, files_size
 import argparse
 import typer
 
@@ -23,18 +24,60 @@ if __name__ == "__main__":
                         '--merged_output',
                         metavar='',
                         required=True,
-                        help='Provide output PATH for the merged table')
+                        help='Provide output PATH for the merged table '
+                        '(.csv, or columnar .parquet / .arrow table)')
+    parser.add_argument('-s',
+                        '--stream',
+                        action='store_true',
+                        help='Join out-of-core (for files larger than RAM)')
+    parser.add_argument('-b',
+                        '--batch_size',
+                        metavar='',
+                        type=int,
+                        default=1000,
+                        help='Provide number of entries joined at once '
+                        '(streaming mode, default: 1000)')
+    parser.add_argument('-t',
+                        '--spill_dir',
+                        metavar='',
+                        required=False,
+                        help='Provide PATH for the temporary spill file '
+                        '(streaming mode)')
+    parser.add_argument('-mt',
+                        '--metrics',
+                        metavar='',
+                        required=False,
+                        help='Provide FILE PATH for json report of the stage '
+                        'timings, throughput and peak RSS')
+    parser.add_argument('-pf',
+                        '--profile',
+                        metavar='',
+                        required=False,
+                        help='Provide PATH for cProfile dumps of the stages')
     args = parser.parse_args()
+    if args.stream and table_format(args.merged_output) != 'csv':
+        parser.error('Streaming mode writes csv tables only')
 
     # Pipeline per so
+    metrics = PipelineMetrics(args.metrics, args.profile)
     typer.secho('Reading jsonl files with extracted fields of interests',
                 bold=True)
     # Init TabulateData class
     record = TabulateData(args.meta_input, args.pdf_input, args.merged_output)
-    # Read files (metadata, pdf_parse)
-    pdf_data = record.read_jsonl(record.extract_pdf)
-    tbl_meta = record.read_jsonl(record.extract_meta)
-    merged_tb = record.merge_df(tbl_meta, pdf_data)
-    # Write to a csv table
-    record.write_table(merged_tb)
+    with metrics.stage('tabulate') as stats:
+        if args.stream:
+            # Join and write batch by batch
+            stats['records'] = record.stream_table(args.batch_size,
+                                                   args.spill_dir)
+        else:
+            # Read files (metadata, pdf_parse)
+            pdf_data = record.read_jsonl(record.extract_pdf)
+            tbl_meta = record.read_jsonl(record.extract_meta)
+            merged_tb = record.merge_df(tbl_meta, pdf_data)
+            # Write to a csv table
+            record.write_table(merged_tb)
+            stats['records'] = len(merged_tb)
+        stats['bytes'] = files_size(args.meta_input, args.pdf_input)
+        stats['output_bytes'] = files_size(args.merged_output)
     typer.secho('Merged table has been merged', bold=True)
+    metrics.write()
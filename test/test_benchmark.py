@@ -0,0 +1,46 @@
+from module.benchmark import PipelineBenchmark, ShardGenerator, STAGES
+from module.benchmark import store_results
+import jsonlines  # type: ignore
+import gzip
+import json
+
+
+def test_shard_generator(tmp_path):
+    pmids = ShardGenerator(tmp_path, n_shards=2, records=20,
+                           hit_rate=0.5).generate()
+    assert sorted(p.name for p in (tmp_path / 'metadata').iterdir()) == [
+        'metadata_0.jsonl.gz', 'metadata_1.jsonl.gz'
+    ]
+    with gzip.open(tmp_path / 'metadata' / 'metadata_0.jsonl.gz') as f:
+        metadata = list(jsonlines.Reader(f))
+    with gzip.open(tmp_path / 'pdf_parse' / 'pdf_parses_0.jsonl.gz') as f:
+        pdf_parse = list(jsonlines.Reader(f))
+    assert len(metadata) == 20
+    assert {entry['paper_id']
+            for entry in pdf_parse} == {
+                entry['paper_id']
+                for entry in metadata if entry['has_pdf_parse']
+            }
+    with gzip.open(tmp_path / 'metadata' / 'metadata_1.jsonl.gz') as f:
+        metadata += list(jsonlines.Reader(f))
+    assert pmids and set(pmids) <= {entry['pubmed_id'] for entry in metadata}
+    with open(tmp_path / 'sizes.json') as f:
+        assert json.load(f)['metadata'][0] == 40
+
+
+def test_pipeline_benchmark(tmp_path, blank_model):
+    data_dir = tmp_path / 'data'
+    ShardGenerator(data_dir, n_shards=2, records=20,
+                   hit_rate=0.5).generate()
+    results = PipelineBenchmark(data_dir,
+                                tmp_path / 'work',
+                                n_workers=1,
+                                core_model=blank_model,
+                                isolate=False).run()
+    assert list(results) == STAGES
+    assert all(result['records'] > 0 for result in results.values())
+    assert (tmp_path / 'work' / 'merged_tbl.csv').exists()
+    scale = {'records': 20}
+    assert store_results(tmp_path / 'results.jsonl', scale, results) is None
+    assert store_results(tmp_path / 'results.jsonl', scale,
+                         results)['stages'] == results
@@ -0,0 +1,23 @@
+from module.get_terms import SynTax
+
+
+def test_get_lexicon(tmp_path):
+    tax = SynTax(str(tmp_path))
+    lexicon = tax.get_lexicon('Bacteria', 'genus')
+    assert lexicon == frozenset(tax.get_descendants('Bacteria', 'genus'))
+    assert len(list(tmp_path.glob('Bacteria_genus_*.pkl'))) == 1
+
+
+def test_get_lexicon_from_cache(tmp_path):
+    lexicon = SynTax(str(tmp_path)).get_lexicon('Bacteria', 'phylum')
+    assert SynTax(str(tmp_path)).get_lexicon('Bacteria', 'phylum') == lexicon
+
+
+def test_get_lexicon_invalidated(tmp_path):
+    tax = SynTax(str(tmp_path))
+    tax.get_lexicon('Bacteria', 'genus')
+    stale = next(tmp_path.glob('Bacteria_genus_*.pkl'))
+    stale.rename(tmp_path / 'Bacteria_genus_0-0.pkl')
+    SynTax(str(tmp_path)).get_lexicon('Bacteria', 'genus')
+    assert [p.name for p in tmp_path.glob('Bacteria_genus_*.pkl')
+            ] == [stale.name]
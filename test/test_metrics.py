@@ -0,0 +1,54 @@
+from module.metrics import PipelineMetrics, count_records, files_size
+import json
+
+
+def test_pipeline_metrics(tmp_path):
+    metrics = PipelineMetrics(tmp_path / 'metrics.json',
+                              tmp_path / 'profile',
+                              script='test')
+    with metrics.stage('count') as stats:
+        assert list(count_records(range(5), stats)) == list(range(5))
+        stats['bytes'] = 2 * 1024**2
+        stats['hits_per_shard'] = {'shard_0': 5}
+    metrics.write()
+    with open(tmp_path / 'metrics.json') as f:
+        report = json.load(f)
+    stage = report['stages']['count']
+    assert report['script'] == 'test'
+    assert stage['records'] == 5
+    assert stage['hits_per_shard'] == {'shard_0': 5}
+    assert {'wall_sec', 'cpu_sec', 'peak_rss_mb'} <= set(stage)
+    assert stage['records_per_sec'] > 0 and stage['mb_per_sec'] > 0
+    assert (tmp_path / 'profile' / 'count.prof').exists()
+
+
+def test_pipeline_metrics_disabled(tmp_path):
+    metrics = PipelineMetrics()
+    with metrics.stage('count') as stats:
+        stats['records'] = 1
+    metrics.write()
+    assert metrics.stages == {'count': {'records': 1}}
+    assert list(tmp_path.iterdir()) == []
+
+
+def test_files_size(tmp_path):
+    (tmp_path / 'shards').mkdir()
+    (tmp_path / 'shards' / 'a.gz').write_bytes(b'12345')
+    (tmp_path / 'shards' / 'b.txt').write_bytes(b'123')
+    (tmp_path / 'c.jsonl').write_bytes(b'12')
+    assert files_size(tmp_path / 'shards', pattern='**/*.gz') == 5
+    assert files_size(tmp_path / 'shards', tmp_path / 'c.jsonl', None) == 10
+    assert files_size(tmp_path / 'missing') == 0
+
+
+def test_stage_peak_rss():
+    metrics = PipelineMetrics(report_file='unused.json')
+    with metrics.stage('heavy'):
+        block = bytearray(200 * 1024**2)
+        del block
+    with metrics.stage('light'):
+        pass
+    # Peak RSS of a stage, not the high-water mark of the process so far
+    heavy, light = (metrics.stages[stage]['peak_rss_mb']
+                    for stage in ['heavy', 'light'])
+    assert heavy - light > 150
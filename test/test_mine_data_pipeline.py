@@ -0,0 +1,187 @@
+from module.mine_data_pipeline import MineData, SectionFilter, read_batch
+from module.mine_data_pipeline import parse_section_filter
+from module.extract_data import project_body_text
+from module.term_matrix import TermMatrix
+from module import mv_data_mine
+from multiprocessing import Pool
+import pandas as pd
+import pytest
+
+TERMINOLOGIES = {
+    'chemistry': {
+        'methane': ['methane'],
+        'sulfate': ['sulfate']
+    },
+    'mv': {
+        'mud_volcano': ['mud volcano'],
+        'gas': ['gas']
+    }
+}
+
+
+def mining_record(tmp_path, blank_model, texts, output, **kwargs):
+    input_table = tmp_path / 'merged.csv'
+    pd.DataFrame({
+        's2orc_id': list(texts),
+        'text': list(texts.values()),
+        **kwargs.pop('columns', dict())
+    }).to_csv(input_table, index=False)
+    (tmp_path / output).mkdir(exist_ok=True)
+    record = MineData(input_table, tmp_path / output / 'mv', '', **kwargs)
+    record.load_mining
+    record.record.core_model = blank_model
+    return record
+
+
+def mine_incremental(record, terminologies):
+    mined_ids = []
+
+    def mine(ids):
+        mined_ids.append(sorted(ids))
+        return record.count_all_data('text', terminologies, ids)
+
+    record.mine_incremental('text', terminologies,
+                            {prefix: prefix
+                             for prefix in terminologies}, record.mv_out,
+                            mine)
+    return mined_ids
+
+
+def test_mine_incremental(tmp_path, blank_model, mine_df):
+    texts = dict(zip(mine_df['s2orc_id'], mine_df['text']))
+    args = (tmp_path, blank_model)
+    assert mine_incremental(mining_record(*args, texts, 'incremental'),
+                            TERMINOLOGIES) == [['11', '12', '13']]
+    # Only new and changed texts are mined
+    texts.update({12: 'Sulfate and gas.', 14: 'Methane mud volcano.'})
+    del texts[13]
+    record = mining_record(*args, texts, 'incremental')
+    assert mine_incremental(record, TERMINOLOGIES) == [['12', '14']]
+    assert mine_incremental(record, TERMINOLOGIES) == []
+    full = mining_record(*args, texts, 'full')
+    for prefix, df in full.mine_all_data('text', TERMINOLOGIES).items():
+        full.write_data(df, prefix, full.mv_out)
+        assert (tmp_path / 'incremental' / f'{prefix}.csv').read_text() == (
+            tmp_path / 'full' / f'{prefix}.csv').read_text()
+    # Terminology change rebuilds the tables
+    terminologies = {**TERMINOLOGIES, 'mv': {'gas': ['gas', 'seep']}}
+    assert mine_incremental(record, terminologies) == [['11', '12', '14']]
+
+
+def test_section_filters(tmp_path, blank_model):
+    articles = [{
+        'paper_id': '11',
+        'body_text': [{
+            'text': 'Methane seep.',
+            'section': 'Materials and Methods'
+        }, {
+            'text': 'Sulfate and gas.',
+            'section': 'Results'
+        }, {
+            'text': 'Methane gas.',
+            'section': None
+        }]
+    }, {
+        'paper_id': '12',
+        'body_text': [{
+            'text': 'Sulfate mud volcano.',
+            'section': 'Discussion'
+        }]
+    }]
+    entries = [project_body_text(article) for article in articles]
+    assert entries[1] == {
+        's2orc_id': '12',
+        'text': 'Sulfate mud volcano.',
+        'sections': '["Discussion"]'
+    }
+    texts = {int(entry['s2orc_id']): entry['text'] for entry in entries}
+    sections = [entry['sections'] for entry in entries]
+    prefix, section_filter = parse_section_filter('chemistry:Method,result')
+    assert prefix == 'chemistry'
+    assert [section_filter.selects(name) for name in
+            ['Materials and Methods', 'RESULTS', 'Discussion', '']] == [
+                True, True, False, False]
+    assert SectionFilter(exclude=['discussion']).selects('')
+    with pytest.raises(ValueError):
+        parse_section_filter('bacteria:method')
+    section_filters = {
+        'chemistry': section_filter,
+        'mv': SectionFilter(exclude=['discussion'])
+    }
+    record = mining_record(tmp_path,
+                           blank_model,
+                           texts,
+                           'filtered',
+                           columns={'sections': sections},
+                           section_filters=section_filters)
+    mined = {
+        prefix: matrix.to_frame()
+        for prefix, matrix in record.count_all_data(
+            'text', record.chemical_terminologies).items()
+    }
+    assert mined['chemistry'][['s2orc_id', 'methane',
+                               'sulfate']].to_dict('list') == {
+        's2orc_id': [11, 12],
+        'methane': [['methane (1)'], '-'],
+        'sulfate': [['sulfate (1)'], '-']
+    }
+    assert SectionFilter(exclude=['discussion']).select(
+        texts[11], sections[0]) == texts[11]
+    # Filters of the other levels are ignored
+    assert record._filter_groups(['chemistry', 'mv'], 'abstract') == [
+        (None, ['chemistry', 'mv'])
+    ]
+    # Streamed batches are filtered the same way
+    batch = read_batch(
+        pd.read_csv(tmp_path / 'merged.csv').to_csv(index=False), 'text')
+    assert record.mine_stream([batch], 'text', {}) == 2
+    (tmp_path / 'whole').mkdir()
+    for prefix, df in mined.items():
+        record.write_data(df, prefix, tmp_path / 'whole' / 'mv')
+        assert (tmp_path / 'filtered' / f'{prefix}.csv').read_text() == (
+            tmp_path / 'whole' / f'{prefix}.csv').read_text()
+
+
+def test_chunk_size(tmp_path, blank_model, mine_df):
+    texts = dict(zip(mine_df['s2orc_id'], mine_df['text']))
+    whole = mining_record(tmp_path, blank_model, texts, 'whole')
+    chunked = mining_record(tmp_path, blank_model, texts, 'chunked',
+                            chunk_size=2)
+    assert [len(chunk) for chunk in chunked.record.iter_text('text', 2)
+            ] == [2, 1]
+    for record in [whole, chunked]:
+        record.mine_chemical_data('text')
+    for prefix in whole.chemical_terminologies:
+        assert (tmp_path / 'chunked' / f'{prefix}.csv').read_text() == (
+            tmp_path / 'whole' / f'{prefix}.csv').read_text()
+    with pytest.raises(ValueError):
+        MineData('', '', '', incremental=True, chunk_size=2)
+
+
+def test_chunk_size_workers(tmp_path, blank_model, mine_df, monkeypatch):
+    texts = dict(zip(mine_df['s2orc_id'], mine_df['text']))
+    whole = mining_record(tmp_path, blank_model, texts, 'whole')
+    chunked = mining_record(tmp_path, blank_model, texts, 'chunked',
+                            workers=2, chunk_size=1)
+    pools = []
+
+    def counted_pool(*args, **kwargs):
+        pools.append(args)
+        return Pool(*args, **kwargs)
+
+    monkeypatch.setattr(mv_data_mine, 'Pool', counted_pool)
+    for record in [whole, chunked]:
+        record.mine_chemical_data('text')
+    # One worker pool for all the chunks
+    assert len(pools) == 1
+    for prefix in whole.chemical_terminologies:
+        assert (tmp_path / 'chunked' / f'{prefix}.csv').read_bytes() == (
+            tmp_path / 'whole' / f'{prefix}.csv').read_bytes()
+        chunked_matrix, whole_matrix = [
+            TermMatrix.load(tmp_path / name / f'{prefix}.npz')
+            for name in ['chunked', 'whole']
+        ]
+        assert chunked_matrix.terms == whole_matrix.terms
+        assert chunked_matrix.s2orc_ids.tolist(
+        ) == whole_matrix.s2orc_ids.tolist()
+        assert (chunked_matrix.counts != whole_matrix.counts).nnz == 0
@@ -1,6 +1,12 @@
 from hypothesis import given, strategies as st
 from unittest import mock
 from typing import List, Dict
+from module.get_dict_terms import SynChemDict, SynMudDict, SynMethodDict
+from module.mv_data_mine import ExtractData
+from module.extract_data import PARAGRAPH_SEPARATOR
+from functools import reduce
+from numpy import nan as NA
+import pandas as pd
 import pytest
 
 
@@ -32,3 +38,169 @@ def test_mv_data_mine_3(cls_mv_data_mine, tab_df_merged, text_type):
 def test_mv_data_mine_4(cls_mv_data_mine, tab_df_merged, text_type):
     texts, pmids = cls_mv_data_mine.get_data(tab_df_merged, text_type)
     assert isinstance(pmids[0], int)
+
+
+def test_get_all_mv_data(cls_mv_miner, mine_df):
+    cls_mv_miner.get_data(mine_df, 'text')
+    terminologies = {
+        'chemistry': SynChemDict().chemistry,
+        'mv': SynMudDict().mud
+    }
+    mined = cls_mv_miner.get_all_mv_data(terminologies)
+    for prefix, terminology in terminologies.items():
+        for key, terms in terminology.items():
+            assert mined[prefix][key] == list(
+                cls_mv_miner.get_mv_data(terms, key))
+
+
+def test_nlp_loaded_once(cls_mv_miner, mine_df):
+    assert cls_mv_miner.nlp is cls_mv_miner.nlp
+    docs = list(cls_mv_miner.stream_docs(mine_df['text']))
+    assert len(docs) == len(mine_df)
+    assert cls_mv_miner.docs_per_sec > 0
+
+
+def test_get_all_mv_data_workers(blank_model, mine_df):
+    terminologies = {'chemistry': SynChemDict().chemistry}
+    results = []
+    for workers in (1, 2):
+        record = ExtractData('', '', '', blank_model, workers=workers)
+        record.get_data(mine_df, 'text')
+        results.append(record.get_all_mv_data(terminologies))
+    assert results[0] == results[1]
+
+
+def test_get_all_taxonomy(cls_mv_miner, taxa_df):
+    cls_mv_miner.get_data(taxa_df, 'text')
+    domains, taxa_ranks = ['Bacteria', 'Archaea'], ['phylum', 'genus']
+    mined = cls_mv_miner.get_all_taxonomy(domains, taxa_ranks)
+    for domain in domains:
+        for taxa_rank in taxa_ranks:
+            assert mined[domain][taxa_rank] == list(
+                cls_mv_miner.get_taxonomy(taxa_rank, domain))
+
+
+def test_multi_token_terms(cls_mv_miner):
+    cls_mv_miner.get_data(
+        pd.DataFrame({
+            's2orc_id': [31],
+            'text': ['X-ray diffraction, GC-MS and Western  blot; GC-MS.'],
+        }), 'text')
+    mined = cls_mv_miner.get_all_mv_data({'methods': SynMethodDict().methods})
+    assert mined['methods']['mineralogy'] == [{
+        'mineralogy': ['x-ray diffraction (1)']
+    }]
+    assert mined['methods']['chromatography'] == [{
+        'chromatography': ['gc (2)', 'gc-ms (2)']
+    }]
+    assert mined['methods']['blots'] == [{'blots': ['western blot (1)']}]
+
+
+def test_taxonomy_single_token(cls_mv_miner):
+    cls_mv_miner.get_data(
+        pd.DataFrame({
+            's2orc_id': [24],
+            'text': ['Escherichia coli and Escherichia.'],
+        }), 'text')
+    mined = cls_mv_miner.get_all_taxonomy(['Bacteria'], ['genus', 'species'])
+    # Taxa are matched token by token, binomials are not counted
+    assert mined['Bacteria'] == {
+        'genus': [{
+            'genus': ['Escherichia (2)']
+        }],
+        'species': [{
+            'species': None
+        }]
+    }
+    counted = cls_mv_miner.count_taxonomy(['Bacteria'], ['species'])
+    assert counted['Bacteria'].counts.nnz == 0
+
+
+def test_paragraphs(blank_model):
+    texts = pd.DataFrame({
+        's2orc_id': [31, 32],
+        'text': [
+            PARAGRAPH_SEPARATOR.join(
+                ['GC-MS of methane', '', 'methane and mud']),
+            'western blot'
+        ],
+    })
+    terminologies = {
+        'methods': SynMethodDict().methods,
+        'mv': {
+            'mud_volcano': ['mud volcano'],
+            'gas': ['methane']
+        }
+    }
+    mined = []
+    for workers in (1, 2):
+        record = ExtractData('',
+                             '',
+                             '',
+                             blank_model,
+                             workers=workers,
+                             paragraphs=True)
+        record.get_data(texts, 'text')
+        mined.append(record.get_all_mv_data(terminologies))
+        assert record.docs_mined == 3
+    assert mined[0] == mined[1]
+    assert mined[0]['mv']['gas'] == [{'gas': ['methane (2)']}, {'gas': None}]
+    assert mined[0]['methods']['blots'][1] == {'blots': ['western blot (1)']}
+    # Paragraphs are independent docs, a term never spans two of them
+    record.get_data(
+        pd.DataFrame({
+            's2orc_id': [33],
+            'text': [PARAGRAPH_SEPARATOR.join(['mud', 'volcano'])]
+        }), 'text')
+    assert record.get_all_mv_data(terminologies)['mv']['mud_volcano'] == [{
+        'mud_volcano': None
+    }]
+
+
+def test_doc_cache(blank_model, mine_df, tmp_path):
+    terminologies = {'chemistry': SynChemDict().chemistry}
+    record = ExtractData('', '', '', blank_model)
+    record.get_data(mine_df, 'text')
+    expected = record.get_all_mv_data(terminologies)
+    for workers, counts in ((1, (0, 3)), (1, (3, 0)), (2, (3, 0))):
+        record = ExtractData('',
+                             '',
+                             '',
+                             blank_model,
+                             workers=workers,
+                             cache_dir=tmp_path)
+        record.get_data(mine_df, 'text')
+        assert record.get_all_mv_data(terminologies) == expected
+        assert (record.doc_cache.hits, record.doc_cache.misses) == counts
+        record.close_cache()
+    # Size limit evicts the least recently used docs
+    record = ExtractData('', '', '', blank_model, cache_dir=tmp_path,
+                         cache_size=1)
+    record.close_cache()
+    record.get_data(mine_df, 'text')
+    record.get_all_mv_data(terminologies)
+    assert (record.doc_cache.hits, record.doc_cache.misses) == (0, 3)
+    # Cached texts are read batch by batch, as nlp.pipe reads them
+    read = []
+    record = ExtractData('', '', '', blank_model, batch_size=2,
+                         cache_dir=tmp_path)
+    docs = record.stream_docs(read.append(text) or text
+                              for text in mine_df['text'])
+    next(docs)
+    assert len(read) == 2
+    record.close_cache()
+
+
+@given(ids=st.lists(st.lists(st.integers(0, 20), unique=True), min_size=1,
+                    max_size=5))
+def test_merge_dfs(cls_mv_data_mine, ids):
+    dfs = [
+        pd.DataFrame({
+            's2orc_id': df_ids,
+            f'key_{i}': [[f'term ({n})'] if n % 2 else None for n in df_ids]
+        }).replace(NA, '-') for i, df_ids in enumerate(ids)
+    ]
+    merged = reduce(
+        lambda left, right: pd.merge(left, right, on='s2orc_id', how='outer'),
+        dfs).fillna('-')
+    pd.testing.assert_frame_equal(cls_mv_data_mine.merge_dfs(*dfs), merged)
@@ -0,0 +1,171 @@
+from module.query_archives import ArchiveFilter, ArchiveIndex, ArchiveScanner
+from module.query_archives import PairedScanner, ScanManifest, pair_archives
+from module.extract_data import project_body_text, project_metadata
+import shutil
+import gzip
+import json
+
+ARTICLES = [
+    {'paper_id': '1', 'pubmed_id': '101', 'title': 'a "pubmed_id": "102"'},
+    {'paper_id': '2', 'pubmed_id': None},
+    {'paper_id': '3', 'pubmed_id': '102'},
+    {'paper_id': '4', 'bib_entries': {'b0': {'pubmed_id': '103'}}},
+]
+
+
+def test_archive_filter():
+    lines = [json.dumps(article).encode() for article in ARTICLES]
+    id_filter = ArchiveFilter('pubmed_id', ['102', '103', None])
+    assert [a['paper_id'] for a in id_filter.select(lines)] == ['3']
+
+
+def test_archive_filter_projection():
+    lines = [json.dumps(article).encode() for article in ARTICLES]
+    id_filter = ArchiveFilter('pubmed_id', ['101'], project_metadata)
+    assert [json.loads(line) for line in id_filter.select_lines(lines)] == [{
+        's2orc_id': '1',
+        'title': 'a "pubmed_id": "102"',
+        'abstract': None,
+        'authors': '',
+        'year': None,
+        'doi': None,
+        'pmid': '101'
+    }]
+
+
+def test_archive_filter_rejects_before_decoding():
+    id_filter = ArchiveFilter('paper_id', ['7'])
+    assert not id_filter.is_candidate(b'{"paper_id": "8", broken json')
+    assert id_filter.is_candidate(b'{"paper_id":"7"}')
+
+
+def test_archive_scanner(tmp_path):
+    archives = []
+    for shard in range(3):
+        archive = tmp_path / f'shard_{shard}.jsonl.gz'
+        with gzip.open(archive, 'wt') as f:
+            for article in range(5):
+                f.write(json.dumps({'paper_id': f'{shard}{article}'}) + '\n')
+        archives.append(archive)
+    output_file = tmp_path / 'out.jsonl'
+    id_filter = ArchiveFilter('paper_id', ['21', '03', '04', '12'])
+    hits = ArchiveScanner(reversed(archives), id_filter, output_file, 2).run()
+    assert list(hits.values()) == [2, 1, 1]
+    with open(output_file) as f:
+        assert [json.loads(line)['paper_id']
+                for line in f] == ['03', '04', '12', '21']
+    assert not list(tmp_path.glob('*.tmp'))
+
+
+def test_archive_index(tmp_path):
+    archives = tmp_path / 'archives'
+    archives.mkdir()
+    articles = [{
+        'paper_id': str(i),
+        'pubmed_id': str(100 + i) if i % 2 else None,
+        'doi': f'10.1/{i}'
+    } for i in range(10)]
+    with gzip.open(archives / 'shard_0.jsonl.gz', 'wt') as f:
+        f.writelines(json.dumps(article) + '\n' for article in articles)
+    index = ArchiveIndex(tmp_path / 'index')
+    assert index.build(archives, n_workers=1, block_lines=3) == 10
+    # Seekable shards are still plain gzip files
+    with gzip.open(tmp_path / 'index' / 'shards' / 'shard_0.jsonl.gz') as f:
+        assert [json.loads(line) for line in f] == articles
+    fetched = [json.loads(line) for line in index.fetch('pubmed_id',
+                                                        ['107', '101'])]
+    assert fetched == [articles[1], articles[7]]
+    assert list(index.fetch('doi', ['10.1/4'])) == [
+        (json.dumps(articles[4]) + '\n').encode()
+    ]
+    # Corrupt archive is marked invalid, the others are still indexed
+    (archives / 'shard_1.jsonl.gz').write_bytes(b'not gzip data')
+    index = ArchiveIndex(tmp_path / 'index_corrupt')
+    assert index.build(archives, n_workers=2, block_lines=3) == 10
+
+
+def test_pair_archives():
+    pairs = pair_archives(['m/metadata_10.jsonl.gz', 'm/metadata_2.jsonl.gz'],
+                          ['p/pdf_parses_2.jsonl.gz'])
+    assert pairs == [('m/metadata_10.jsonl.gz', None),
+                     ('m/metadata_2.jsonl.gz', 'p/pdf_parses_2.jsonl.gz')]
+
+
+def test_paired_scanner(tmp_path):
+    meta_archives, pdf_archives = [], []
+    for shard in range(2):
+        meta_archive = tmp_path / f'metadata_{shard}.jsonl.gz'
+        pdf_archive = tmp_path / f'pdf_parses_{shard}.jsonl.gz'
+        with gzip.open(meta_archive, 'wt') as f_meta, gzip.open(
+                pdf_archive, 'wt') as f_pdf:
+            for article in range(4):
+                paper_id = f'{shard}{article}'
+                f_meta.write(
+                    json.dumps({
+                        'paper_id': paper_id,
+                        'pubmed_id': f'9{paper_id}'
+                    }) + '\n')
+                f_pdf.write(json.dumps({'paper_id': paper_id}) + '\n')
+        meta_archives.append(meta_archive)
+        pdf_archives.append(pdf_archive)
+    id_filter = ArchiveFilter('pubmed_id', ['901', '910', '913'])
+    hits = PairedScanner(meta_archives, pdf_archives, id_filter,
+                         tmp_path / 'meta.jsonl', tmp_path / 'pdf.jsonl',
+                         2).run()
+    assert list(hits.values()) == [(1, 1), (2, 2)]
+    with open(tmp_path / 'pdf.jsonl') as f:
+        assert [json.loads(line)['paper_id']
+                for line in f] == ['01', '10', '13']
+    # Projected scan, pdf entries are still paired by paper_id
+    id_filter = ArchiveFilter('pubmed_id', ['901', '910', '913'],
+                              project_metadata)
+    PairedScanner(meta_archives, pdf_archives, id_filter,
+                  tmp_path / 'meta_p.jsonl', tmp_path / 'pdf_p.jsonl', 2,
+                  project_body_text).run()
+    with open(tmp_path / 'pdf_p.jsonl') as f:
+        assert [json.loads(line) for line in f] == [{
+            's2orc_id': paper_id,
+            'text': '',
+            'sections': '[]'
+        } for paper_id in ['01', '10', '13']]
+
+
+def test_archive_scanner_resume(tmp_path):
+    archives = []
+    for shard in range(3):
+        archive = tmp_path / f'shard_{shard}.jsonl.gz'
+        with gzip.open(archive, 'wt') as f:
+            f.write(json.dumps({'paper_id': f'{shard}'}) + '\n')
+        archives.append(archive)
+    # Truncated archive is quarantined, the scan goes on
+    archives[1].write_bytes(archives[1].read_bytes()[:-10])
+    output_file = tmp_path / 'out.jsonl'
+    id_filter = ArchiveFilter('paper_id', ['0', '1', '2'])
+    scanner = ArchiveScanner(archives, id_filter, output_file, 2)
+    assert list(scanner.run().values()) == [1, 1]
+    manifest = json.loads(
+        (tmp_path / 'out.jsonl.parts' / 'manifest.json').read_text())
+    assert list(manifest['quarantined']) == [str(archives[1])]
+    # Resumed scan keeps the quarantined archives listed until retried
+    ScanManifest(tmp_path / 'out.jsonl.parts').start(
+        True, scanner.manifest.fingerprint)
+    manifest = json.loads(
+        (tmp_path / 'out.jsonl.parts' / 'manifest.json').read_text())
+    assert list(manifest['quarantined']) == [str(archives[1])]
+    # Scan with another setup (e.g. other ids) discards the previous scan
+    other_dir = tmp_path / 'other.parts'
+    shutil.copytree(tmp_path / 'out.jsonl.parts', other_dir)
+    other = ScanManifest(other_dir)
+    other.start(True, ArchiveFilter('paper_id', ['9']).fingerprint)
+    assert other.done == [] and other.quarantined == dict()
+    # Finished archives are skipped, partial output is dropped
+    with gzip.open(archives[0], 'wt') as f:
+        f.write(json.dumps({'paper_id': '9'}) + '\n')
+    with gzip.open(archives[1], 'wt') as f:
+        f.write(json.dumps({'paper_id': '1'}) + '\n')
+    (tmp_path / 'out.jsonl.parts' / 'stale.hits.jsonl.tmp').write_text('x')
+    assert list(scanner.run(resume=True).values()) == [1, 1, 1]
+    with open(output_file) as f:
+        assert [json.loads(line)['paper_id'] for line in f] == ['0', '1', '2']
+    # Nothing left to resume, the checkpoints are removed
+    assert not (tmp_path / 'out.jsonl.parts').exists()
@@ -0,0 +1,95 @@
+from module.query_metadata import GettingPMID
+from http.server import BaseHTTPRequestHandler, HTTPServer
+from urllib.parse import parse_qs
+from threading import Thread
+import socket
+from pytest import fixture
+import module.query_metadata as query_metadata
+
+PMIDS = [str(i) for i in range(1000, 1025)]
+ESEARCH = '''<?xml version="1.0" encoding="UTF-8" ?>
+<!DOCTYPE eSearchResult PUBLIC "-//NLM//DTD esearch 20060628//EN"
+"https://eutils.ncbi.nlm.nih.gov/eutils/dtd/20060628/esearch.dtd">
+<eSearchResult><Count>{}</Count><RetMax>0</RetMax><RetStart>0</RetStart>
+<QueryKey>1</QueryKey><WebEnv>MCID_test</WebEnv><IdList></IdList>
+<TranslationSet/><QueryTranslation>test</QueryTranslation></eSearchResult>
+'''
+
+
+class EntrezStandIn(BaseHTTPRequestHandler):
+    requests = []
+
+    def do_POST(self):
+        length = int(self.headers['Content-Length'])
+        params = parse_qs(self.rfile.read(length).decode())
+        self.requests.append((self.path, params))
+        if self.path.endswith('esearch.fcgi'):
+            body = ESEARCH.format(len(PMIDS))
+        else:
+            start, size = int(params['retstart'][0]), int(params['retmax'][0])
+            body = '\n'.join(PMIDS[start:start + size]) + '\n'
+        self.send_response(200)
+        self.end_headers()
+        self.wfile.write(body.encode())
+
+    def log_message(self, *args):
+        pass
+
+
+@fixture
+def entrez_url(monkeypatch):
+    monkeypatch.setattr(query_metadata, 'ENTREZ_INTERVAL', 0)
+    server = HTTPServer(('127.0.0.1', 0), EntrezStandIn)
+    Thread(target=server.serve_forever, daemon=True).start()
+    EntrezStandIn.requests.clear()
+    yield f'http://127.0.0.1:{server.server_port}/'
+    server.shutdown()
+
+
+def test_get_pmid_paged(entrez_url, tmp_path):
+    entrez = GettingPMID('me@mail.org', str(tmp_path), 'out.jsonl', 'mud',
+                         entrez_url, str(tmp_path / 'cache'), page_size=10)
+    assert entrez.get_pmid == PMIDS
+    paths = [path for path, _ in EntrezStandIn.requests]
+    assert paths == ['/esearch.fcgi'] + ['/efetch.fcgi'] * 3
+    assert EntrezStandIn.requests[1][1]['WebEnv'] == ['MCID_test']
+
+
+def test_get_pmid_cached(entrez_url, tmp_path):
+    entrez = GettingPMID('me@mail.org', str(tmp_path), 'out.jsonl', 'mud',
+                         entrez_url, str(tmp_path / 'cache'))
+    assert entrez.get_pmid == PMIDS
+    EntrezStandIn.requests.clear()
+    assert entrez.get_pmid == PMIDS
+    assert EntrezStandIn.requests == []
+
+
+def test_get_pmid_offline(entrez_url, tmp_path):
+    cache_dir = str(tmp_path / 'cache')
+    entrez = GettingPMID('me@mail.org', str(tmp_path), 'out.jsonl', 'mud',
+                         entrez_url, cache_dir)
+    entrez.get_pmid
+    cache_file = next((tmp_path / 'cache').glob('*.json'))
+    cache_file.rename(cache_file.with_name(
+        cache_file.name.split('_')[0] + '_2000-01-01.json'))
+    offline = GettingPMID('me@mail.org', str(tmp_path), 'out.jsonl', 'mud',
+                          'http://127.0.0.1:9/', cache_dir)
+    assert offline.get_pmid == PMIDS
+
+
+def test_get_pmid_stalled(entrez_url, tmp_path, monkeypatch):
+    cache_dir = str(tmp_path / 'cache')
+    GettingPMID('me@mail.org', str(tmp_path), 'out.jsonl', 'mud', entrez_url,
+                cache_dir).get_pmid
+    cache_file = next((tmp_path / 'cache').glob('*.json'))
+    cache_file.rename(cache_file.with_name(
+        cache_file.name.split('_')[0] + '_2000-01-01.json'))
+    # Server accepts the connection, but never answers
+    monkeypatch.setattr(query_metadata, 'ENTREZ_TIMEOUT', 0.2)
+    with socket.socket() as stalled:
+        stalled.bind(('127.0.0.1', 0))
+        stalled.listen()
+        url = f'http://127.0.0.1:{stalled.getsockname()[1]}/'
+        entrez = GettingPMID('me@mail.org', str(tmp_path), 'out.jsonl',
+                             'mud', url, cache_dir)
+        assert entrez.get_pmid == PMIDS
@@ -0,0 +1,62 @@
+from module.benchmark import PipelineBenchmark, ShardGenerator
+from module.mine_data_pipeline import MineData
+from module.stream_pipeline import StreamPipeline
+from module import mv_data_mine
+from multiprocessing import Pool
+import filecmp
+import pytest
+
+
+@pytest.mark.parametrize('mine_workers', [1, 2])
+def test_stream_pipeline(tmp_path, blank_model, monkeypatch, mine_workers):
+    data_dir, work_dir = tmp_path / 'data', tmp_path / 'work'
+    pmids = ShardGenerator(data_dir, n_shards=3, records=30,
+                           hit_rate=0.5).generate()
+    # Five-step flow
+    PipelineBenchmark(data_dir,
+                      work_dir,
+                      n_workers=1,
+                      core_model=blank_model,
+                      taxonomy=True,
+                      isolate=False).run()
+    stream_dir = tmp_path / 'stream'
+    stream_dir.mkdir()
+    record = MineData('', stream_dir / 'mv', stream_dir / 'taxa',
+                      workers=mine_workers,
+                      core_model=blank_model)
+    record.load_mining
+    pools = []
+
+    def counted_pool(*args, **kwargs):
+        pools.append(args)
+        return Pool(*args, **kwargs)
+
+    monkeypatch.setattr(mv_data_mine, 'Pool', counted_pool)
+    checkpoints = {
+        'pdf_raw': stream_dir / 'pdf_raw.jsonl',
+        'meta_extracted': stream_dir / 'meta_extracted.jsonl',
+        'pdf_extracted': stream_dir / 'pdf_extracted.jsonl',
+        'merged_table': stream_dir / 'merged_tbl.csv'
+    }
+    stats = StreamPipeline(pmids, (data_dir / 'metadata').glob('*.gz'),
+                           (data_dir / 'pdf_parse').glob('*.gz'),
+                           record,
+                           n_workers=2,
+                           checkpoints=checkpoints,
+                           queue_size=1,
+                           mine_batch=7).run()
+    assert len(stats['hits_per_shard']) == 3
+    # One mining pool for all the batches
+    assert len(pools) == (mine_workers > 1)
+    assert stats['tabulated'] == sum(
+        hits['metadata'] for hits in stats['hits_per_shard'].values())
+    for name in ['pdf_raw.jsonl', 'meta_extracted.jsonl',
+                 'pdf_extracted.jsonl']:
+        assert filecmp.cmp(stream_dir / name, work_dir / name, shallow=False)
+    mined = sorted(path.name for path in (work_dir / 'mining').glob('*.csv'))
+    assert mined == sorted(path.name for path in stream_dir.glob('*.csv')
+                           if path.name != 'merged_tbl.csv')
+    for name in mined:
+        assert filecmp.cmp(stream_dir / name,
+                           work_dir / 'mining' / name,
+                           shallow=False)
@@ -1,3 +1,5 @@
+from module.tabulate_data import TabulateData
+from module.mv_data_mine import ExtractData
 import pandas as pd
 import pytest
 
@@ -10,3 +12,34 @@ def test_merge_df(cls_tabulate, tab_df_1, tab_df_2, tab_df_merged):
 def test_merge_df_2(cls_tabulate, tab_df_1):
     with pytest.raises(ValueError):
         assert cls_tabulate.merge_df(tab_df_1, tab_df_1)
+
+
+def test_stream_table(tmp_path, tab_df_1, tab_df_2):
+    meta, pdf = tmp_path / 'meta.jsonl', tmp_path / 'pdf.jsonl'
+    tab_df_1.to_json(meta, orient='records', lines=True)
+    # Duplicated and missing pdf_parse entries
+    pd.concat([tab_df_2, tab_df_2.iloc[[0]].assign(text='txt4')]).drop(
+        index=2).to_json(pdf, orient='records', lines=True)
+    in_memory = TabulateData(meta, pdf, tmp_path / 'in_memory.csv')
+    in_memory.write_table(
+        in_memory.merge_df(in_memory.read_jsonl(meta),
+                           in_memory.read_jsonl(pdf)))
+    streamed = TabulateData(meta, pdf, tmp_path / 'streamed.csv')
+    assert streamed.stream_table(batch_size=2) == 4
+    assert (tmp_path / 'streamed.csv').read_text() == (
+        tmp_path / 'in_memory.csv').read_text()
+
+
+@pytest.mark.parametrize('suffix', ['csv', 'parquet', 'arrow'])
+def test_write_table_formats(tmp_path, tab_df_merged, suffix):
+    if suffix != 'csv':
+        pytest.importorskip('pyarrow')
+    merged_tbl = tmp_path / f'merged.{suffix}'
+    TabulateData('', '', merged_tbl).write_table(tab_df_merged)
+    miner = ExtractData(merged_tbl, '', '')
+    table = miner.read_text('text')
+    assert list(table.columns) == ['s2orc_id', 'text']
+    assert miner.get_data(table, 'text') == (['txt1', 'txt2', 'txt3'],
+                                             [1, 2, 3])
+    # Read once per ExtractData
+    assert miner.read_text('text') is table
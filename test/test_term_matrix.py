@@ -0,0 +1,70 @@
+from module.term_matrix import MatrixRun, MatrixWriter, TermMatrix
+from module.term_matrix import merge_runs
+import numpy as np
+
+HITS = [
+    {'genus': ['Vibrio', 'Escherichia', 'Vibrio'], 'phylum': []},
+    {'genus': [], 'phylum': []},
+    {'genus': ['Escherichia'], 'phylum': ['Proteobacteria']},
+]
+
+
+def test_from_hits():
+    matrix = TermMatrix.from_hits([3, 1, 2], HITS, ['phylum', 'genus'])
+    assert matrix.terms == [('phylum', 'Proteobacteria'),
+                            ('genus', 'Escherichia'), ('genus', 'Vibrio')]
+    assert matrix.counts.toarray().tolist() == [[0, 1, 2], [0, 0, 0],
+                                                [1, 1, 0]]
+    # Cells keep the order of the first mention
+    frame = matrix.sort_rows().to_frame()
+    assert frame.to_dict('list') == {
+        's2orc_id': [1, 2, 3],
+        'phylum': ['-', ['Proteobacteria (1)'], '-'],
+        'genus': ['-', ['Escherichia (1)'], ['Vibrio (2)', 'Escherichia (1)']]
+    }
+
+
+def test_save_and_stack(tmp_path):
+    matrix = TermMatrix.from_hits([3, 1, 2], HITS, ['phylum', 'genus'])
+    matrix.save(tmp_path / 'genus.npz')
+    loaded = TermMatrix.load(tmp_path / 'genus.npz')
+    assert loaded.to_frame().equals(matrix.to_frame())
+    update = TermMatrix.from_hits([2, 4], [{
+        'genus': ['Methanosarcina']
+    }, {
+        'genus': ['Vibrio']
+    }], ['phylum', 'genus'])
+    stacked = TermMatrix.stack(
+        [loaded.select(loaded.s2orc_ids != 2), update]).sort_rows()
+    assert stacked.s2orc_ids.tolist() == [1, 2, 3, 4]
+    genus = [i for i, (category, _) in enumerate(stacked.terms)
+             if category == 'genus']
+    assert np.asarray(stacked.counts[:, genus].sum(axis=1)).ravel().tolist(
+    ) == [0, 1, 3, 1]
+
+
+def test_merge_runs(tmp_path):
+    categories = ['phylum', 'genus']
+    matrix = TermMatrix.from_hits(['3', '1', '2'], HITS, categories)
+    update = TermMatrix.from_hits(['2', '4'], [{
+        'genus': ['Methanosarcina']
+    }, {
+        'genus': ['Vibrio']
+    }], categories)
+    runs = [
+        MatrixRun.spill(run, tmp_path / f'run-{i}')
+        for i, run in enumerate([matrix, update])
+    ]
+    for run in runs:
+        run.sort(lambda s2orc_ids: s2orc_ids.astype(int))
+    terms, blocks = merge_runs(runs, categories, block_rows=3)
+    with MatrixWriter(tmp_path / 'genus.npz', terms, categories) as writer:
+        for block in blocks:
+            writer.append(block)
+    # A repeated s2orc_id keeps the row of the last run, like stack does
+    stacked = TermMatrix.stack([matrix, update]).sort_rows()
+    merged = TermMatrix.load(tmp_path / 'genus.npz')
+    assert merged.terms == stacked.terms
+    assert merged.s2orc_ids.tolist() == [1, 2, 3, 4]
+    assert merged.to_frame().equals(stacked.to_frame().astype(
+        {'s2orc_id': int}))